@@ -1,5 +1,53 @@
-from bashlex import parser, tokenizer
+import sys
 
-parse = parser.parse
-parsesingle = parser.parsesingle
-split = parser.split
+# public name -> module that defines it
+_exports = {
+    'parse' : 'parser',
+    'parsesingle' : 'parser',
+    'split' : 'parser',
+    'split_many' : 'parser',
+    'tokenize' : 'tokenizer',
+    'needs_more_input' : 'parser',
+    'validate' : 'parser',
+    'commands' : 'parser',
+    'Script' : 'script',
+    'parse_incremental' : 'incremental',
+    'lineparser' : 'stream',
+    'follower' : 'follow',
+    'iterparse' : 'events',
+}
+
+if sys.version_info < (3, 7):
+    import importlib
+
+    from bashlex import parser, tokenizer
+
+    for _name, _module in _exports.items():
+        globals()[_name] = getattr(importlib.import_module('bashlex.' + _module), _name)
+else:
+    import importlib
+
+    # building the parser tables takes most of the time it takes to import
+    # bashlex, so we only do it when something actually needs the parser
+    # (e.g. the client in bashlex.server doesn't if a daemon is running).
+    # the submodules are imported when they're first used as well, like
+    # importing them by name would
+    def __getattr__(name):
+        if name in _exports:
+            module = importlib.import_module('bashlex.' + _exports[name])
+            value = globals()[name] = getattr(module, name)
+            return value
+        if not name.startswith('_'):
+            try:
+                return importlib.import_module('bashlex.' + name)
+            except ImportError as e:
+                # only if it's the submodule that's missing, not something
+                # it imports
+                if e.name != 'bashlex.' + name:
+                    raise
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+    def __dir__():
+        import pkgutil
+        submodules = [name for finder, name, ispkg in pkgutil.iter_modules(__path__)]
+        return sorted(set(globals()) | set(_exports) | set(submodules))
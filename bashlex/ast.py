@@ -1,3 +1,5 @@
+from bashlex import utils
+
 class node(object):
     """
     This class represents a node in the AST built while parsing command lines.
@@ -28,6 +30,55 @@ class node(object):
     def __hash__(self):
         return hash(tuple(sorted(self.__dict__)))
 
+class heredocnode(node):
+    '''a heredoc node that only cuts its value out of the input (stripping
+    the leading tabs of <<-) when it's first used, until then it holds on
+    to the input rather than a copy of the here document'''
+    __slots__ = ('_source',)
+
+    def __init__(self, source, start, end, killleading, **kwargs):
+        object.__setattr__(self, '_source', None)
+        node.__init__(self, kind='heredoc', **kwargs)
+        self._source = (source, start, end, killleading)
+
+    def __getattribute__(self, name):
+        if name == 'value' or name == '__dict__':
+            source = object.__getattribute__(self, '_source')
+            if source is not None:
+                object.__setattr__(self, '_source', None)
+                object.__getattribute__(self, '__dict__')['value'] = _heredocvalue(*source)
+        return object.__getattribute__(self, name)
+
+    def __getstate__(self):
+        # pickle (and copy) the value rather than the whole input
+        return self.__dict__
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_source', None)
+        object.__getattribute__(self, '__dict__').update(state)
+
+    def materialize(self):
+        '''cut the value out of the input now, for when the positions stop
+        being relative to it'''
+        return self.value
+
+    def rebase(self, source, offset):
+        '''source[offset:] is the input the value is in, hold on to source
+        instead'''
+        current = object.__getattribute__(self, '_source')
+        if current is not None:
+            s, start, end, killleading = current
+            self._source = (source, start + offset, end + offset, killleading)
+
+def _heredocvalue(s, start, end, killleading):
+    value = s[start:end]
+    if killleading:
+        value = '\n'.join([line.lstrip('\t') for line in value.split('\n')])
+    return value
+
+def _func(method):
+    return getattr(method, '__func__', method)
+
 class nodevisitor(object):
     def _visitnode(self, n, *args, **kwargs):
         k = n.kind
@@ -35,14 +86,29 @@ class nodevisitor(object):
         return getattr(self, 'visit%s' % k)(n, *args, **kwargs)
 
     def visit(self, n):
+        # with a stack rather than recursion, so how deep the tree is isn't
+        # limited by the recursion limit. (n,) is a node whose children were
+        # visited
+        stack = [n]
+        while stack:
+            n = stack.pop()
+            if type(n) is tuple:
+                self.visitnodeend(n[0])
+                continue
+            children = self._visitchildren(n)
+            stack.append((n,))
+            if children:
+                stack.extend(reversed(children))
+
+    def _visitchildren(self, n):
+        '''call the visit methods for n, returns the children to visit'''
         k = n.kind
         if k == 'operator':
             self._visitnode(n, n.op)
         elif k == 'list':
             dochild = self._visitnode(n, n.parts)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
+                return n.parts
         elif k == 'reservedword':
             self._visitnode(n, n.word)
         elif k == 'pipe':
@@ -50,56 +116,55 @@ class nodevisitor(object):
         elif k == 'pipeline':
             dochild = self._visitnode(n, n.parts)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
+                return n.parts
         elif k == 'compound':
             dochild = self._visitnode(n, n.list, n.redirects)
             if dochild is None or dochild:
-                for child in n.list:
-                    self.visit(child)
-                for child in n.redirects:
-                    self.visit(child)
+                return list(n.list) + list(n.redirects)
         elif k in ('if', 'for', 'while', 'until', 'case', 'pattern'):
             dochild = self._visitnode(n, n.parts)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
+                return n.parts
         elif k == 'command':
             dochild = self._visitnode(n, n.parts)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
+                return n.parts
         elif k == 'function':
             dochild = self._visitnode(n, n.name, n.body, n.parts)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
+                return n.parts
         elif k == 'redirect':
             dochild = self._visitnode(n, n.input, n.type, n.output, n.heredoc)
             if dochild is None or dochild:
+                children = []
                 if isinstance(n.output, node):
-                    self.visit(n.output)
+                    children.append(n.output)
                 if n.heredoc:
-                    self.visit(n.heredoc)
+                    children.append(n.heredoc)
+                return children
         elif k in ('word', 'assignment'):
             dochild = self._visitnode(n, n.word)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
-        elif k in ('parameter', 'tilde', 'heredoc'):
+                return n.parts
+        elif k in ('parameter', 'tilde'):
             self._visitnode(n, n.value)
+        elif k == 'heredoc':
+            # don't make a heredocnode cut its value out of the input unless
+            # it's going to be used
+            if _func(self.visitheredoc) is _func(nodevisitor.visitheredoc):
+                self._visitnode(n, None)
+            else:
+                self._visitnode(n, n.value)
         elif k in ('commandsubstitution', 'processsubstitution'):
             dochild = self._visitnode(n, n.command)
             if dochild is None or dochild:
-                self.visit(n.command)
+                return [n.command]
         elif k == 'unimplemented':
             dochild = self._visitnode(n, n.parts)
             if dochild is None or dochild:
-                for child in n.parts:
-                    self.visit(child)
+                return n.parts
         else:
             raise ValueError('unknown node kind %r' % k)
-        self.visitnodeend(n)
 
     def visitnode(self, n):
         pass
@@ -153,7 +218,13 @@ class nodevisitor(object):
         pass
 
 
+# the attributes that hold a sequence of children
+_childlists = ('parts', 'list', 'redirects')
+
 def _dump(tree, indent='  '):
+    # _format adds the text of n to out, and yields _format for the values
+    # in it rather than calling it (see utils.run)
+    out = []
     def _format(n, level=0):
         if isinstance(n, node):
             d = dict(n.__dict__)
@@ -163,40 +234,48 @@ def _dump(tree, indent='  '):
             fields = []
             v = d.pop('s', None)
             if v:
-                fields.append(('s', _format(v, level)))
+                fields.append(('s', v))
             for k, v in sorted(d.items()):
                 if not v or k == 'parts':
                     continue
-                llevel = level
-                if isinstance(v, node):
-                    llevel += 1
-                    fields.append((k, '\n' + (indent * llevel) + _format(v, llevel)))
-                else:
-                    fields.append((k, _format(v, level)))
-            if kind == 'function':
-                fields = [f for f in fields if f[0] not in ('name', 'body')]
+                if kind == 'function' and k in ('name', 'body'):
+                    continue
+                if k in _childlists:
+                    # trim makes them tuples, which are otherwise values
+                    # (e.g. pos)
+                    v = list(v)
+                fields.append((k, v))
             v = d.pop('parts', None)
             if v:
-                fields.append(('parts', _format(v, level)))
-            return ''.join([
-                '%sNode' % kind.title(),
-                '(',
-                ', '.join(('%s=%s' % field for field in fields)),
-                ')'])
+                fields.append(('parts', list(v)))
+
+            out.append('%sNode(' % kind.title())
+            for i, (k, v) in enumerate(fields):
+                if i:
+                    out.append(', ')
+                out.append('%s=' % k)
+                if isinstance(v, node) and k != 's':
+                    out.append('\n' + indent * (level + 1))
+                    yield _format(v, level + 1)
+                else:
+                    yield _format(v, level)
+            out.append(')')
         elif isinstance(n, list):
-            lines = ['[']
-            lines.extend((indent * (level + 1) + _format(x, level + 1) + ','
-                         for x in n))
-            if len(lines) > 1:
-                lines.append(indent * (level) + ']')
-            else:
-                lines[-1] += ']'
-            return '\n'.join(lines)
-        return repr(n)
+            out.append('[')
+            for x in n:
+                out.append('\n' + indent * (level + 1))
+                yield _format(x, level + 1)
+                out.append(',')
+            if n:
+                out.append('\n' + indent * level)
+            out.append(']')
+        else:
+            out.append(repr(n))
 
     if not isinstance(tree, node):
         raise TypeError('expected node, got %r' % tree.__class__.__name__)
-    return _format(tree)
+    utils.run(_format(tree))
+    return ''.join(out)
 
 def findfirstkind(parts, kind):
     for i, node in enumerate(parts):
@@ -214,9 +293,127 @@ class posconverter(nodevisitor):
         node.s = self.string[start:end]
 
 class posshifter(nodevisitor):
-    def __init__(self, count):
+    def __init__(self, count, source=None):
         self.count = count
+        # the input the positions are shifted into, if heredocnodes should
+        # refer to it rather than to the part of it they were parsed from
+        self.source = source
 
     def visitnode(self, node):
         #assert node.pos[1] + base <= endlimit
         node.pos = (node.pos[0] + self.count, node.pos[1] + self.count)
+        if self.source is not None and type(node) is heredocnode:
+            node.rebase(self.source, self.count)
+
+class _shiftednode(node):
+    '''a node whose positions, and those of the nodes under it, are off by
+    _delta. they're shifted and it turns back into a plain node when it's
+    first used, see shiftlater'''
+    def _materialize(self):
+        d = object.__getattribute__(self, '__dict__')
+        object.__setattr__(self, '__class__', node)
+        posshifter(d.pop('_delta')).visit(self)
+
+    def __getattribute__(self, name):
+        _shiftednode._materialize(self)
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        _shiftednode._materialize(self)
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        _shiftednode._materialize(self)
+        object.__delattr__(self, name)
+
+def shiftlater(n, count):
+    '''like posshifter(count).visit(n), but only when n is first used. the
+    cost of shifting a tree nobody looks at again is then one assignment'''
+    if type(n) is _shiftednode:
+        object.__getattribute__(n, '__dict__')['_delta'] += count
+    elif type(n) is node:
+        n.__dict__['_delta'] = count
+        n.__class__ = _shiftednode
+    else:
+        posshifter(count).visit(n)
+
+class posmapper(nodevisitor):
+    '''change every position with f (end positions with fend if it's given),
+    e.g. tokenizer.positionmap'''
+    def __init__(self, f, fend=None):
+        self.f = f
+        self.fend = fend or f
+
+    def visitnode(self, node):
+        node.pos = (self.f(node.pos[0]), self.fend(node.pos[1]))
+
+# node kinds that trim drops, they're spelled out by the grammar so their
+# text is what's between the children that are kept
+noisekinds = frozenset(['reservedword', 'operator', 'pipe'])
+
+def trim(tree, keep=()):
+    '''remove the nodes whose kind is in noisekinds but not in keep from
+    tree, and make the children of every node (parts, list and redirects) a
+    tuple. tree is changed in place and returned
+
+    >>> from bashlex import parser
+    >>> tree = parser.parse('if a; then b | c; fi')[0]
+    >>> [n.kind for n in tree.list[0].parts]
+    ['reservedword', 'list', 'reservedword', 'list', 'reservedword']
+    >>> [n.kind for n in trim(tree).list[0].parts]
+    ['list', 'list']
+    >>> tree.list[0].parts[1].parts[0].parts
+    (CommandNode(parts=(WordNode(parts=() pos=(11, 12) word='b'),) pos=(11, 12)), CommandNode(parts=(WordNode(parts=() pos=(15, 16) word='c'),) pos=(15, 16)))
+
+    the removed nodes' positions aren't lost: every node keeps its pos, so
+    a keyword or operator is the text between two children (or a child and
+    the edge of its parent) that isn't whitespace. a list whose operators
+    matter (; & && ||) can keep them with keep=('operator',), likewise
+    keep=('reservedword',) for a pipeline negated with !.'''
+    drop = noisekinds.difference(keep)
+    stack = [tree]
+    while stack:
+        n = stack.pop()
+        if n.kind == 'heredoc':
+            continue
+        d = n.__dict__
+        for k in ('parts', 'list', 'redirects'):
+            children = d.get(k)
+            if children is not None:
+                children = d[k] = tuple([child for child in children
+                                         if child.kind not in drop])
+                stack.extend(children)
+        # function.name and function.body are also in its parts
+        for k in ('output', 'heredoc', 'command'):
+            child = d.get(k)
+            if isinstance(child, node):
+                stack.append(child)
+    return tree
+
+def todict(n):
+    '''convert n to plain dicts and lists so it can be serialized (e.g. with
+    json or marshal) and sent to another process, use fromdict to get the
+    node back'''
+    if isinstance(n, node):
+        d = {}
+        for k, v in n.__dict__.items():
+            d[k] = todict(v)
+        return d
+    elif isinstance(n, (list, tuple)):
+        return [todict(x) for x in n]
+    return n
+
+def fromdict(d):
+    '''the reverse of todict'''
+    if isinstance(d, dict):
+        kwargs = {}
+        for k, v in d.items():
+            if k == 'pos':
+                v = tuple(v)
+            else:
+                v = fromdict(v)
+            kwargs[k] = v
+        return node(**kwargs)
+    elif isinstance(d, list):
+        return [fromdict(x) for x in d]
+    return d
@@ -6,3 +6,8 @@ class ParsingError(Exception):
 
         assert position <= len(s)
         super(ParsingError, self).__init__('%s (position %d)' % (message, position))
+
+    def __reduce__(self):
+        # so errors can be sent to other processes, subclasses have their
+        # own constructor arguments so they arrive as a plain ParsingError
+        return (ParsingError, (self.message, self.s, self.position))
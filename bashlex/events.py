@@ -0,0 +1,106 @@
+'''generate events for the nodes of the input instead of returning trees
+
+    >>> for e in iterparse('a >f'):
+    ...     print('%s %s %s %s' % (e.type, e.kind, e.pos, sorted((e.fields or {}).items())))
+    start command (0, 4) []
+    start word (0, 1) [('word', 'a')]
+    end word (0, 1) []
+    start redirect (2, 4) [('input', None), ('type', '>')]
+    start word (3, 4) [('word', 'f')]
+    end word (3, 4) []
+    end redirect (2, 4) []
+    end command (0, 4) []
+
+every node produces a start event, then the events of its children, then an
+end event, in the order ast.nodevisitor visits them. the fields of a start
+event are the attributes of the node other than its position and children
+(e.g. word for words, op for operators, input/type for redirects, and
+output too when it's a file descriptor rather than a word).
+
+the parser is bottom up so a node only exists once all of its children were
+parsed, which means a whole top level command has to be parsed before the
+first event for it can be generated. after its events were consumed it's
+thrown away, so the memory used is that of the largest top level command
+rather than that of the whole input.
+'''
+
+import collections
+
+from bashlex import ast, parser, stream
+
+event = collections.namedtuple('event', ['type', 'kind', 'pos', 'fields'])
+
+# the attributes that hold children, in the order they're visited. a
+# function's name and body are also in its parts
+_children = ('parts', 'list', 'redirects', 'output', 'heredoc', 'command')
+_skip = frozenset(['kind', 'pos', 'name', 'body'])
+
+def _events(tree):
+    stack = [(tree, False)]
+    while stack:
+        n, visited = stack.pop()
+        if visited:
+            yield event('end', n.kind, n.pos, None)
+            continue
+
+        d = n.__dict__
+        children = []
+        fields = {}
+        for k, v in d.items():
+            if k in _skip:
+                continue
+            if k in _children and (v is None or isinstance(v, (ast.node, list, tuple))):
+                continue
+            fields[k] = v
+        for k in _children:
+            v = d.get(k)
+            if isinstance(v, ast.node):
+                children.append(v)
+            elif isinstance(v, (list, tuple)):
+                children.extend(v)
+
+        yield event('start', n.kind, n.pos, fields)
+        stack.append((n, True))
+        stack.extend([(child, False) for child in reversed(children)])
+
+def _trees(source, strictmode, proceedonerror):
+    if hasattr(source, 'splitlines'):
+        # a string
+        return parser._parsefrom(source, 0, strictmode, proceedonerror)
+    return _streamtrees(source, strictmode, proceedonerror)
+
+def _streamtrees(source, strictmode, proceedonerror):
+    p = stream.lineparser(strictmode=strictmode, proceedonerror=proceedonerror)
+    for data in source:
+        for tree in p.feed(data):
+            yield tree
+    for tree in p.close():
+        yield tree
+
+def iterparse(source, strictmode=True, proceedonerror=False):
+    '''generate the events for source, which is either a string or an
+    iterable of strings (e.g. a file, or anything else that reads the input
+    as it arrives) that are parsed with a bashlex.lineparser, so events
+    for a command are generated as soon as the lines that complete it were
+    read. positions are relative to the start of the input'''
+    for tree in _trees(source, strictmode, proceedonerror):
+        for e in _events(tree):
+            yield e
+
+class handler(object):
+    '''the callbacks parse calls, override the ones that are needed'''
+    def start(self, kind, pos, fields):
+        pass
+
+    def end(self, kind, pos):
+        pass
+
+def parse(source, handler, strictmode=True, proceedonerror=False):
+    '''call handler.start and handler.end for the events of source (see
+    iterparse)'''
+    start, end = handler.start, handler.end
+    for e in iterparse(source, strictmode, proceedonerror):
+        if e.type == 'start':
+            start(e.kind, e.pos, e.fields)
+        else:
+            end(e.kind, e.pos)
@@ -0,0 +1,208 @@
+'''parse the commands appended to a file as it grows
+
+    >>> import os, tempfile
+    >>> d = tempfile.mkdtemp()
+    >>> log, state = os.path.join(d, 'audit.log'), os.path.join(d, 'audit.state')
+    >>> with open(log, 'w') as f:
+    ...     _ = f.write('a; b\\nif x; then\\n')
+    >>> f = follower(log, state)
+    >>> [n.kind for n in f.poll()]
+    ['list']
+    >>> f.save()
+    >>> with open(log, 'a') as f2:
+    ...     _ = f2.write('  y\\nfi\\n')
+    >>> f = follower(log, state)
+    >>> [(n.kind, n.pos) for n in f.poll()]
+    [('compound', (5, 22))]
+    >>> import shutil; shutil.rmtree(d)
+
+a follower reads what was appended to the file since the last poll and
+feeds it to a bashlex.lineparser, so a command that isn't complete yet (the
+writer is in the middle of it, or of a here document) is held back until
+it is. the nodes returned are the same as bashlex.parse on the whole file
+returns, positions are offsets in the whole file as well.
+
+the checkpoint that save writes is the byte offset in the file where the
+first command that wasn't returned yet starts, and its position for the
+nodes. a follower that's created with that checkpoint reads the file from
+there, which gets the parser back to the state it was in (including any
+partial command), without reading the commands before it again.
+'''
+
+import codecs, io, json, os, tempfile, time
+
+from bashlex import errors, stream
+
+_version = 1
+
+def _replace(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        # python 2, which overwrites dst on posix
+        os.rename(src, dst)
+
+def writecheckpoint(path, state):
+    '''write state to path as json, atomically: readers see either the old
+    checkpoint or the new one, even if we crash in the middle'''
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def readcheckpoint(path):
+    '''the state saved in path, or None if there isn't one'''
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (IOError, OSError):
+        if os.path.exists(path):
+            raise
+        return None
+    if state.get('version') != _version:
+        raise ValueError('unknown checkpoint version in %r' % path)
+    return state
+
+class follower(object):
+    '''follows the file at path, poll returns the top level commands that
+    were completed since the previous call
+
+    checkpoint is the path of the file that save writes the checkpoint to,
+    if it exists the follower picks up from it. if the file was truncated or
+    replaced (it's a different inode) since then, it's read from the start.
+    strictmode and proceedonerror are as in bashlex.parse.'''
+    def __init__(self, path, checkpoint=None, encoding='utf-8', strictmode=True,
+                 proceedonerror=False):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.encoding = encoding
+        self._strictmode = strictmode
+        self._proceedonerror = proceedonerror
+        self._error = None
+
+        state = readcheckpoint(checkpoint) if checkpoint else None
+        if state is not None and os.path.abspath(state['path']) != os.path.abspath(path):
+            raise ValueError('checkpoint %r is for %r' % (checkpoint, state['path']))
+        self._start(state)
+
+    def _start(self, state):
+        state = state or {'offset' : 0, 'position' : 0, 'inode' : None}
+        self._inode = state['inode']
+        # how far we read the file, and what we read but didn't feed the
+        # parser yet
+        self._read = state['offset']
+        self._text = ''
+        self._decoder = codecs.getincrementaldecoder(self.encoding)()
+        self._parser = stream.lineparser(strictmode=self._strictmode,
+                                         proceedonerror=self._proceedonerror,
+                                         offset=state['position'])
+
+    @property
+    def state(self):
+        '''the checkpoint: where the first command that wasn't returned yet
+        starts in the file, in bytes (offset) and in characters (position)'''
+        unparsed = self._parser.buffered + self._text
+        pending = self._decoder.getstate()[0]
+        return {'version' : _version,
+                'path' : self.path,
+                'inode' : self._inode,
+                'offset' : self._read - len(pending) - len(unparsed.encode(self.encoding)),
+                'position' : self._parser.offset}
+
+    def save(self):
+        '''write the checkpoint, call this once the commands returned by
+        poll have been dealt with'''
+        if not self.checkpoint:
+            raise ValueError('no checkpoint path to save to')
+        writecheckpoint(self.checkpoint, self.state)
+
+    def poll(self):
+        '''read what was appended to the file and return the commands it
+        completed
+
+        a ParsingError is raised for a command that can't be parsed, which is
+        then skipped. commands that were completed before it are returned
+        first, and the error is raised by the next call.'''
+        if self._error is not None:
+            e, self._error = self._error, None
+            raise e
+
+        try:
+            f = io.open(self.path, 'rb')
+        except (IOError, OSError):
+            if os.path.exists(self.path):
+                raise
+            # it's being rotated
+            return []
+        with f:
+            st = os.fstat(f.fileno())
+            if self._inode is None:
+                self._inode = st.st_ino
+            elif st.st_ino != self._inode or st.st_size < self._read:
+                self._start(None)
+                self._inode = st.st_ino
+            f.seek(self._read)
+            data = f.read()
+
+        self._read += len(data)
+        self._text += self._decoder.decode(data)
+        return self._feed()
+
+    def _feed(self):
+        # feed a line at a time so that an error only throws away the
+        # command it's in
+        result = []
+        text = self._text
+        index = 0
+        try:
+            while True:
+                end = text.find('\n', index) + 1
+                if not end:
+                    break
+                line = text[index:end]
+                index = end
+                result.extend(self._parser.feed(line))
+        except errors.ParsingError as e:
+            if not result:
+                self._text = text[index:]
+                raise
+            self._error = e
+        else:
+            # a partial line goes to the parser too, it holds on to it
+            # until the rest of it is appended
+            result.extend(self._parser.feed(text[index:]))
+            index = len(text)
+        self._text = text[index:]
+        return result
+
+    def close(self):
+        '''stop following, the command at the end of the file is returned
+        even if it isn't terminated by a newline. raises ParsingError if the
+        file ends in the middle of a command'''
+        self._text, text = '', self._text
+        self._parser.feed(text)
+        return self._parser.close()
+
+def follow(path, checkpoint=None, interval=1.0, **kwargs):
+    '''generate the commands of the file at path as it grows, forever
+
+    the checkpoint is saved before reading more of the file, that is after
+    the commands that were read before were consumed. so when the generator
+    is restarted with the same checkpoint, a command is generated again if
+    consuming it was interrupted, but never skipped.'''
+    f = follower(path, checkpoint, **kwargs)
+    while True:
+        nodes = f.poll()
+        for node in nodes:
+            yield node
+        if checkpoint:
+            f.save()
+        if not nodes:
+            time.sleep(interval)
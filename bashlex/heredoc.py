@@ -1,6 +1,19 @@
 from bashlex import ast, errors
 
+class HeredocError(errors.ParsingError):
+    '''the input ended before the delimiter of a here document'''
+    def __init__(self, message, s, position, redirnode):
+        super(HeredocError, self).__init__(message, s, position)
+        self.redirnode = redirnode
+
 def gatherheredocuments(tokenizer):
+    if tokenizer.redirstack and tokenizer._profile is not None:
+        with tokenizer._profile.phase('heredoc'):
+            _gather(tokenizer)
+    else:
+        _gather(tokenizer)
+
+def _gather(tokenizer):
     # if we're at the end of the input and we're not strict, allow skipping
     # reading the heredoc
     while tokenizer.redirstack:
@@ -8,10 +21,52 @@ def gatherheredocuments(tokenizer):
             tokenizer._shell_input_line_index += 1
             return
 
-        redirnode, killleading = tokenizer.redirstack.pop(0)
+        redirnode, killleading = tokenizer.redirstack.popleft()
         makeheredoc(tokenizer, redirnode, 0, killleading)
 
+def _finddelimiter(s, index, delimiter, killleading):
+    '''the index of the newline that ends the line in s starting at index
+    that is delimiter, -1 if there isn't one, or None if a line ends with a
+    backslash (which joins it with the next line) and the heredoc has to be
+    read a character at a time'''
+    while index < len(s):
+        end = s.find('\n', index)
+        if end == -1:
+            return None
+        line = s[index:end]
+        if line.endswith('\\'):
+            return None
+        if killleading:
+            line = line.lstrip('\t')
+        if line == delimiter:
+            return end
+        index = end + 1
+    return -1
+
 def makeheredoc(tokenizer, redirnode, lineno, killleading):
+    # redirword = string_quote_removal(redirectnode.word)
+    redirword = redirnode.output.word
+    startpos = tokenizer._shell_input_line_index
+
+    end = None
+    if tokenizer._eol_ungetc_lookahead is None:
+        end = _finddelimiter(tokenizer._shell_input_line, startpos, redirword, killleading)
+    if end is None:
+        return _readheredoc(tokenizer, redirnode, lineno, killleading)
+
+    if end == -1:
+        tokenizer._shell_input_line_index = len(tokenizer._shell_input_line)
+        raise HeredocError("here-document at line %d delimited by end-of-file (wanted %r)" % (lineno, redirword), tokenizer._shell_input_line, tokenizer._shell_input_line_index, redirnode)
+
+    tokenizer._shell_input_line_index = end + 1
+    redirnode.heredoc = ast.heredocnode(tokenizer._shell_input_line, startpos, end,
+                                        killleading, pos=(startpos, end))
+
+    # if the heredoc immediately follows this node, fix its end pos
+    if redirnode.pos[1] + 1 == startpos:
+        redirnode.pos = (redirnode.pos[0], end)
+
+def _readheredoc(tokenizer, redirnode, lineno, killleading):
     # redirword = string_quote_removal(redirectnode.word)
     redirword = redirnode.output.word
     document = []
@@ -38,7 +93,7 @@ def makeheredoc(tokenizer, redirnode, lineno, killleading):
         fullline = tokenizer.readline(False)
 
     if not fullline:
-        raise errors.ParsingError("here-document at line %d delimited by end-of-file (wanted %r)" % (lineno, redirword), tokenizer._shell_input_line, tokenizer._shell_input_line_index)
+        raise HeredocError("here-document at line %d delimited by end-of-file (wanted %r)" % (lineno, redirword), tokenizer._shell_input_line, tokenizer._shell_input_line_index, redirnode)
 
     document = ''.join(document)
     endpos = tokenizer._shell_input_line_index - 1
@@ -0,0 +1,154 @@
+'''reparse a script after it was edited, reusing the nodes that weren't
+
+    >>> import bashlex
+    >>> old = 'a\\nb\\nc\\n'
+    >>> tree = bashlex.parse(old)
+    >>> new = 'a\\nb "x"\\nc\\n'
+    >>> newtree = parse_incremental(tree, old, new, [(3, 3, 7)])
+    >>> newtree == bashlex.parse(new), newtree[0] is tree[0], newtree[2] is tree[2]
+    (True, True, True)
+
+bashlex.parse parses top level nodes one after the other, each one starting
+right after the previous one ended (after its heredocs, if it has any). a
+node that ends before the edited region is reused as is, and so is any node
+that starts after it at a position the parser would also start a node at in
+the new source. only the nodes in between are parsed again. the nodes after them are only
+shifted to their new positions when they're first used (see
+ast.shiftlater), so an edit costs about as much as parsing the commands it
+touched, however long the rest of the script is.
+'''
+
+from bashlex import ast
+
+def _commonprefix(a, b):
+    '''length of the common prefix of a and b'''
+    lo, hi = 0, min(len(a), len(b))
+    # compare slices rather than characters, which keeps this fast for
+    # large inputs
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _commonsuffix(a, b, limit):
+    '''length of the common suffix of a and b, up to limit characters'''
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def damage(oldsource, newsource, edits=None):
+    '''return (start, oldend, newend) such that oldsource[start:oldend] was
+    replaced by newsource[start:newend], or None if the sources are equal
+
+    edits is a list of (start, oldend, newend) edits that were applied in
+    order to oldsource to get newsource, each one in terms of the source as
+    it was before that edit (like the changes an editor reports). when it's
+    None, the region is found by comparing the sources.'''
+    if edits is None:
+        if oldsource == newsource:
+            return None
+        start = _commonprefix(oldsource, newsource)
+        suffix = _commonsuffix(oldsource, newsource,
+                               min(len(oldsource), len(newsource)) - start)
+        return start, len(oldsource) - suffix, len(newsource) - suffix
+
+    region = None
+    for start, oldend, newend in edits:
+        if not start <= oldend or not start <= newend:
+            raise ValueError('bad edit %r' % ((start, oldend, newend),))
+        if region is None:
+            region = start, oldend, newend
+            continue
+
+        # merge the edit with the region edited so far, which is at
+        # [a, b) in the current source and at [a, c) in the old one
+        a, c, b = region
+        end = max(b, oldend)
+        region = min(a, start), end - (b - c), end + (newend - oldend)
+
+    if region is None:
+        return None
+    if len(oldsource) - region[1] != len(newsource) - region[2]:
+        raise ValueError("edits don't match the difference between the sources")
+    return region
+
+def parse_incremental(oldtree, oldsource, newsource, edits=None, strictmode=True,
+                      expansionlimit=None, proceedonerror=False):
+    '''parse newsource, given that oldtree is what bashlex.parse returned
+    for oldsource (with the same arguments and without convertpos)
+
+    edits describes how oldsource was changed to get newsource, see
+    damage(). the returned list is the same as bashlex.parse(newsource),
+    but nodes that weren't affected by the edits are taken from oldtree.
+    the positions of the ones after the edits are shifted in place (when
+    they're first used), so oldtree shouldn't be used with oldsource
+    afterwards.'''
+    from bashlex import parser
+
+    region = damage(oldsource, newsource, edits)
+    if region is None:
+        return list(oldtree)
+    start, oldend, newend = region
+    delta = newend - oldend
+
+    if oldtree and not hasattr(oldtree[0], 'pos'):
+        raise ValueError("can't reuse a tree that was parsed with convertpos")
+
+    # find the first node that might be affected: nodes that end before the
+    # edit are kept, including the newline (and heredocs) that end them
+    k = _bisectstart(oldtree, start)
+    while k > 0 and parser._nextindex(oldtree[k - 1]) >= start:
+        k -= 1
+    index = parser._nextindex(oldtree[k - 1]) if k else 0
+
+    parts = oldtree[:k]
+
+    # j is the old node that we can pick up from if the new source has a
+    # node starting at oldstart + delta
+    j = k
+    oldstart = index
+    while index < len(newsource):
+        if index >= newend:
+            while j < len(oldtree) and oldstart + delta < index:
+                oldstart = parser._nextindex(oldtree[j])
+                j += 1
+            if j < len(oldtree) and oldstart + delta == index and oldstart >= oldend:
+                if delta:
+                    for node in oldtree[j:]:
+                        ast.shiftlater(node, delta)
+                parts.extend(oldtree[j:])
+                return parts
+
+        if index == 0:
+            part = parser._parser(newsource, strictmode=strictmode, expansionlimit=expansionlimit,
+                                  proceedonerror=proceedonerror).parse()
+        else:
+            part = parser._parser(newsource[index:], strictmode=strictmode,
+                                  proceedonerror=proceedonerror).parse()
+            if not isinstance(part, ast.node):
+                break
+            ast.posshifter(index).visit(part)
+
+        parts.append(part)
+        index = parser._nextindex(part)
+
+    return parts
+
+def _bisectstart(tree, offset):
+    '''index of the first node in tree that starts at or after offset'''
+    lo, hi = 0, len(tree)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if tree[mid].pos[0] < offset:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
@@ -0,0 +1,103 @@
+'''parse a single large script in several processes
+
+this is what bashlex.parse(s, workers=N) uses. the input is cut into chunks
+at the top level command boundaries found by bashlex.scanner, each chunk is
+parsed in a pool of processes and the positions of the resulting nodes are
+shifted back to offsets in the whole input.
+
+the scanner is a heuristic, so a chunk is only used if parsing it ends
+where the chunk ends (give or take trailing blanks and comments). chunks that fail to parse or that don't line
+up are parsed again sequentially by bashlex.parse, which means the result
+(or the error raised) is always the same as what parsing without workers
+gives.
+'''
+
+import multiprocessing
+
+from bashlex import ast, scanner
+
+# inputs are cut into chunks of at least this many characters, smaller
+# inputs aren't worth the cost of starting processes
+_minchunk = 64 * 1024
+
+def chunks(s, workers):
+    '''return a list of (start, end) ranges of s to parse separately, each
+    starting where bashlex.parse starts a new top level node'''
+    target = max(len(s) // (workers * 4), _minchunk)
+    if len(s) < target * 2:
+        return [(0, len(s))]
+
+    result = []
+    start = 0
+    for end in scanner.boundaries(s, '\n'):
+        if end - start >= target:
+            result.append((start, end))
+            start = end
+    if start < len(s):
+        if result and len(s) - start < target // 2:
+            # fold a short tail into the previous chunk
+            result[-1] = (result[-1][0], len(s))
+        else:
+            result.append((start, len(s)))
+    return result
+
+def _parsechunk(job):
+    from bashlex import parser
+
+    s, start, final, strictmode, expansionlimit, proceedonerror, shallow = job
+
+    # a chunk other than the last one shouldn't have a heredoc that runs
+    # into its end, so parse those strictly: if that raises, the chunk
+    # didn't end where the scanner thought it does
+    if not final:
+        strictmode = True
+    try:
+        if start == 0:
+            p = parser._parser(s, strictmode=strictmode, expansionlimit=expansionlimit,
+                               proceedonerror=proceedonerror, shallow=shallow)
+            parts = [p.parse()]
+        else:
+            parts = []
+        parts.extend(parser._parsefrom(s, parser._nextindex(parts[0]) if parts else 0,
+                                       strictmode, proceedonerror, shallow=shallow))
+    except Exception:
+        return None
+
+    if not parts:
+        return None
+    index = parser._nextindex(parts[-1])
+    if not final:
+        # the chunk ends after the blanks and comments that follow its last
+        # command, parse would skip them before the next one
+        if index > len(s) or not scanner.skippable(s, index, len(s)):
+            return None
+        index = len(s)
+
+    if start:
+        shifter = ast.posshifter(start)
+        for part in parts:
+            shifter.visit(part)
+    return parts, start + index
+
+def parsechunks(s, workers, strictmode=True, expansionlimit=None, proceedonerror=False,
+                shallow=False):
+    '''parse the chunks of s in workers processes, returns a dict that maps
+    the start of each chunk that parsed cleanly to (nodes, nextindex)'''
+    ranges = chunks(s, workers)
+    if len(ranges) < 2:
+        return {}
+
+    jobs = [(s[start:end], start, end == len(s), strictmode, expansionlimit,
+             proceedonerror, shallow) for start, end in ranges]
+    pool = multiprocessing.Pool(min(workers, len(jobs)))
+    try:
+        results = pool.map(_parsechunk, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    parsed = {}
+    for (start, end), result in zip(ranges, results):
+        if result is not None:
+            parsed[start] = result
+    return parsed
@@ -1,6 +1,7 @@
-import os, copy
+import os, re, copy, collections, itertools
 
-from bashlex import yacc, tokenizer, state, ast, subst, flags, errors, heredoc
+from bashlex import yacc, tokenizer, state, ast, subst, flags, errors, heredoc, utils
+from bashlex import profile as profiling
 
 def _partsspan(parts):
     return parts[0].pos[0], parts[-1].pos[1]
@@ -14,7 +15,7 @@ precedence = (
 
 def handleNotImplemented(p, type):
     if p.context._proceedonerror:
-        parts = _makeparts(p)
+        parts = yield _makeparts(p)
         p[0] = ast.node(kind='unimplemented', parts=parts, pos=_partsspan(parts))
         return
     if len(p) == 2:
@@ -46,10 +47,10 @@ def p_word_list(p):
                  | word_list WORD'''
     parserobj = p.context
     if len(p) == 2:
-        p[0] = [_expandword(parserobj, p.slice[1])]
+        p[0] = [(yield _expandword(parserobj, p.slice[1]))]
     else:
         p[0] = p[1]
-        p[0].append(_expandword(parserobj, p.slice[2]))
+        p[0].append((yield _expandword(parserobj, p.slice[2])))
 
 def p_redirection_heredoc(p):
     '''redirection : LESS_LESS WORD
@@ -118,18 +119,25 @@ def p_redirection(p):
     if len(p) == 3:
         output = p[2]
         if p.slice[2].ttype == tokenizer.tokentype.WORD:
-            output = _expandword(parserobj, p.slice[2])
+            output = yield _expandword(parserobj, p.slice[2])
         p[0] = ast.node(kind='redirect', input=None, type=p[1], heredoc=None,
                         output=output, pos=(p.lexpos(1), p.endlexpos(2)))
     else:
         output = p[3]
         if p.slice[3].ttype == tokenizer.tokentype.WORD:
-            output = _expandword(parserobj, p.slice[3])
+            output = yield _expandword(parserobj, p.slice[3])
         p[0] = ast.node(kind='redirect', input=p[1], type=p[2], heredoc=None,
                         output=output, pos=(p.lexpos(1), p.endlexpos(3)))
 
 def _expandword(parser, tokenword):
-    if parser._expansionlimit == -1:
+    # a generator that returns the node for tokenword (see utils.run), the
+    # substitutions in the word are parsed by the generators it yields
+    if parser._shallow:
+        quoted = bool(tokenword.flags & flags.word.QUOTED)
+        doublequoted = quoted and tokenword.value[0] == '"'
+        yield ast.node(kind='word', word=subst._expandwordshallow(tokenword, doublequoted),
+                       pos=(tokenword.lexpos, tokenword.endlexpos), parts=[])
+    elif parser._expansionlimit == -1:
         # we enter this branch in the following conditions:
         # - currently parsing a substitution as a result of an expansion
         # - the previous expansion had limit == 0
@@ -140,15 +148,21 @@ def _expandword(parser, tokenword):
         # (the reason we even expand when limit == 0 is to get quote removal)
         node = ast.node(kind='word', word=tokenword,
                         pos=(tokenword.lexpos, tokenword.endlexpos), parts=[])
-        return node
+        yield node
     else:
         quoted = bool(tokenword.flags & flags.word.QUOTED)
         doublequoted = quoted and tokenword.value[0] == '"'
 
         # TODO set qheredocument
-        parts, expandedword = subst._expandwordinternal(parser,
-                                                        tokenword, 0,
-                                                        doublequoted, 0, 0)
+        if parser._profile is not None:
+            parser._profile.enter('expand')
+        try:
+            parts, expandedword = yield subst._expandwordinternal(parser,
+                                                                  tokenword, 0,
+                                                                  doublequoted, 0, 0)
+        finally:
+            if parser._profile is not None:
+                parser._profile.exit()
 
         # limit reached, don't include substitutions (still expanded to get
         # quote removal though)
@@ -157,7 +171,7 @@ def _expandword(parser, tokenword):
 
         node = ast.node(kind='word', word=expandedword,
                         pos=(tokenword.lexpos, tokenword.endlexpos), parts=parts)
-        return node
+        yield node
 
 def p_simple_command_element(p):
     '''simple_command_element : WORD
@@ -168,7 +182,7 @@ def p_simple_command_element(p):
         return
 
     parserobj = p.context
-    p[0] = [_expandword(parserobj, p.slice[1])]
+    p[0] = [(yield _expandword(parserobj, p.slice[1]))]
 
     # change the word node to an assignment if necessary
     if p.slice[1].ttype == tokenizer.tokentype.ASSIGNMENT_WORD:
@@ -225,7 +239,7 @@ def p_shell_command(p):
         # while or until
         handleAssert(p, p[2].kind == 'list')
 
-        parts = _makeparts(p)
+        parts = yield _makeparts(p)
         kind = parts[0].word
         assert kind in ('while', 'until')
         p[0] = ast.node(kind='compound',
@@ -245,14 +259,14 @@ def _makeparts(p):
         elif isinstance(p.slice[i], tokenizer.token):
             if p.slice[i].ttype == tokenizer.tokentype.WORD:
                 parserobj = p.context
-                parts.append(_expandword(parserobj, p.slice[i]))
+                parts.append((yield _expandword(parserobj, p.slice[i])))
             else:
                 parts.append(ast.node(kind='reservedword', word=p[i],
                                       pos=p.lexspan(i)))
         else:
             pass
 
-    return parts
+    yield parts
 
 def p_for_command(p):
     '''for_command : FOR WORD newline_list DO compound_list DONE
@@ -263,7 +277,7 @@ def p_for_command(p):
                    | FOR WORD newline_list IN word_list list_terminator newline_list LEFT_CURLY compound_list RIGHT_CURLY
                    | FOR WORD newline_list IN list_terminator newline_list DO compound_list DONE
                    | FOR WORD newline_list IN list_terminator newline_list LEFT_CURLY compound_list RIGHT_CURLY'''
-    parts = _makeparts(p)
+    parts = yield _makeparts(p)
     # find the operatornode that we might have there due to
     # list_terminator/newline_list and convert it to a reservedword so its
     # considered as part of the for loop
@@ -282,7 +296,7 @@ def p_arith_for_command(p):
                          | FOR ARITH_FOR_EXPRS list_terminator newline_list LEFT_CURLY compound_list RIGHT_CURLY
                          | FOR ARITH_FOR_EXPRS DO compound_list DONE
                          | FOR ARITH_FOR_EXPRS LEFT_CURLY compound_list RIGHT_CURLY'''
-    handleNotImplemented(p, 'arithmetic for')
+    return handleNotImplemented(p, 'arithmetic for')
 
 def p_select_command(p):
     '''select_command : SELECT WORD newline_list DO list DONE
@@ -291,13 +305,13 @@ def p_select_command(p):
                       | SELECT WORD SEMICOLON newline_list LEFT_CURLY list RIGHT_CURLY
                       | SELECT WORD newline_list IN word_list list_terminator newline_list DO list DONE
                       | SELECT WORD newline_list IN word_list list_terminator newline_list LEFT_CURLY list RIGHT_CURLY'''
-    handleNotImplemented(p, 'select command')
+    return handleNotImplemented(p, 'select command')
 
 def p_case_command(p):
     '''case_command : CASE WORD newline_list IN newline_list ESAC
                     | CASE WORD newline_list IN case_clause_sequence newline_list ESAC
                     | CASE WORD newline_list IN case_clause ESAC'''
-    parts = _makeparts(p)
+    parts = yield _makeparts(p)
     p[0] = ast.node(kind='compound',
                     redirects=[],
                     list=[ast.node(kind='case', parts=parts, pos=_partsspan(parts))],
@@ -307,7 +321,7 @@ def p_function_def(p):
     '''function_def : WORD LEFT_PAREN RIGHT_PAREN newline_list function_body
                     | FUNCTION WORD LEFT_PAREN RIGHT_PAREN newline_list function_body
                     | FUNCTION WORD newline_list function_body'''
-    parts = _makeparts(p)
+    parts = yield _makeparts(p)
     body = parts[-1]
     name = parts[ast.findfirstkind(parts, 'word')]
 
@@ -339,7 +353,7 @@ def p_coproc(p):
               | COPROC WORD shell_command
               | COPROC WORD shell_command redirection_list
               | COPROC simple_command'''
-    handleNotImplemented(p, 'coproc')
+    return handleNotImplemented(p, 'coproc')
 
 def p_if_command(p):
     '''if_command : IF compound_list THEN compound_list FI
@@ -348,7 +362,7 @@ def p_if_command(p):
     # we currently don't distinguish the various lists that make up the
     # command, because it's not needed later on. if there will be a need
     # we can always add different nodes for elif/else.
-    parts = _makeparts(p)
+    parts = yield _makeparts(p)
     p[0] = ast.node(kind='compound',
                     redirects=[],
                     list=[ast.node(kind='if', parts=parts, pos=_partsspan(parts))],
@@ -364,11 +378,11 @@ def p_group_command(p):
 
 def p_arith_command(p):
     '''arith_command : ARITH_CMD'''
-    handleNotImplemented(p, 'arithmetic command')
+    return handleNotImplemented(p, 'arithmetic command')
 
 def p_cond_command(p):
     '''cond_command : COND_START COND_CMD COND_END'''
-    handleNotImplemented(p, 'cond command')
+    return handleNotImplemented(p, 'cond command')
 
 def p_elif_clause(p):
     '''elif_clause : ELIF compound_list THEN compound_list
@@ -432,11 +446,11 @@ def p_pattern(p):
 
     parserobj = p.context
     if len(p) == 2:
-        p[0] = [_expandword(parserobj, p.slice[1])]
+        p[0] = [(yield _expandword(parserobj, p.slice[1]))]
     else:
         p[0] = p[1]
         p[0].append(ast.node(kind='reservedword', word=p[2], pos=p.lexspan(2)))
-        p[0].append(_expandword(parserobj, p.slice[3]))
+        p[0].append((yield _expandword(parserobj, p.slice[3])))
 
 def p_list(p):
     '''list : newline_list list0'''
@@ -472,6 +486,10 @@ def p_list1(p):
              | list1 SEMICOLON newline_list list1
              | list1 NEWLINE newline_list list1
              | pipeline_command'''
+    # the operators are left associative (see precedence) so p[1] is the
+    # list so far and p[len(p) - 1] is usually a single node, only a
+    # command after an operator of higher precedence than the ones before
+    # it is more than that (a; b && c), so the list is built in linear time
     if len(p) == 2:
         p[0] = [p[1]]
     else:
@@ -524,6 +542,7 @@ def p_simple_list1(p):
                     | simple_list1 AMPERSAND simple_list1
                     | simple_list1 SEMICOLON simple_list1
                     | pipeline_command'''
+    # left associative, see p_list1
     if len(p) == 2:
         p[0] = [p[1]]
     else:
@@ -541,8 +560,9 @@ def p_pipeline_command(p):
         if len(p[1]) == 1:
             p[0] = p[1][0]
         else:
-            p[0] = ast.node(kind='pipeline', parts=p[1],
-                            pos=(p[1][0].pos[0], p[1][-1].pos[1]))
+            parts = p[1][::-1]
+            p[0] = ast.node(kind='pipeline', parts=parts,
+                            pos=(parts[0].pos[0], parts[-1].pos[1]))
     else:
         # XXX timespec
         node = ast.node(kind='reservedword', word='!', pos=p.lexspan(1))
@@ -558,18 +578,22 @@ def p_pipeline(p):
     '''pipeline : pipeline BAR newline_list pipeline
                 | pipeline BAR_AND newline_list pipeline
                 | command'''
+    # pipes are right associative so p[len(p) - 1] is the rest of the
+    # pipeline and p[1] a single command. the parts are kept in reverse
+    # order (and put back in p_pipeline_command) to append to the rest
+    # rather than copy it for every pipe
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = p[1]
+        p[0] = p[len(p) - 1]
         p[0].append(ast.node(kind='pipe', pipe=p[2], pos=p.lexspan(2)))
-        p[0].extend(p[len(p) - 1])
+        p[0].extend(reversed(p[1]))
 
 def p_timespec(p):
     '''timespec : TIME
                 | TIME TIMEOPT
                 | TIME TIMEOPT TIMEIGN'''
-    handleNotImplemented(p, 'time command')
+    return handleNotImplemented(p, 'time command')
 
 def p_empty(p):
     '''empty :'''
@@ -616,16 +640,132 @@ yaccparser.action[states[0]]['RIGHT_PAREN'] = -155
 yaccparser.action[states[1]]['RIGHT_PAREN'] = -148
 yaccparser.action[states[2]]['RIGHT_PAREN'] = -154
 
-def parsesingle(s, strictmode=True, expansionlimit=None, convertpos=False, proceedonerror=False):
+# a parser that runs the same tables but doesn't build any nodes, used by
+# needs_more_input. reductions that affect the tokenizer (reading heredocs)
+# or where parsing stops are kept, the rest do nothing
+def _recognize_inputunit(p):
+    if p.lexer._parserstate & flags.parser.CMDSUBST:
+        p.lexer._parserstate.add(flags.parser.EOFTOKEN)
+    if p.slice[1].type == 'simple_list':
+        p.accept()
+
+def _recognize_simple_list(p):
+    heredoc.gatherheredocuments(p.lexer)
+
+def _recognize(p):
+    pass
+
+_recognizeractions = {
+    'p_inputunit' : _recognize_inputunit,
+    'p_simple_list' : _recognize_simple_list,
+    'p_redirection_heredoc' : p_redirection_heredoc,
+}
+
+def _recognizerproduction(production):
+    production = copy.copy(production)
+    if production.callable is not None:
+        production.callable = _recognizeractions.get(production.func, _recognize)
+    return production
+
+recognizer = copy.copy(yaccparser)
+recognizer.productions = tuple(_recognizerproduction(production)
+                               for production in yaccparser.productions)
+
+# the parser used by validate. on top of what the recognizer does, it
+# expands the words that have substitutions in them (which are parsed as
+# well), raises for unimplemented constructs and keeps track of where the
+# input unit ends, which is where parse picks up from for the next one
+def _validate_inputunit(p):
+    if p.slice[1].type == 'simple_list':
+        # the end of the node parse would return for it
+        p.context.end = p.lexer._last_read_token.endlexpos
+    _recognize_inputunit(p)
+
+def _validate_redirection_heredoc(p):
+    p_redirection_heredoc(p)
+    p.context.heredocs.append(p[0])
+
+def _validatewords(indices):
+    '''an action that expands the words at indices in the production'''
+    def action(p):
+        for i in indices:
+            value = p.slice[i].value
+            if '(' in value or '`' in value or '$[' in value:
+                yield _expandword(p.context, p.slice[i])
+    return action
+
+_validatoractions = dict(_recognizeractions)
+_validatoractions.update({
+    'p_inputunit' : _validate_inputunit,
+    'p_redirection_heredoc' : _validate_redirection_heredoc,
+    # these raise NotImplementedError
+    'p_arith_for_command' : p_arith_for_command,
+    'p_select_command' : p_select_command,
+    'p_coproc' : p_coproc,
+    'p_timespec' : p_timespec,
+    'p_arith_command' : p_arith_command,
+    'p_cond_command' : p_cond_command,
+})
+
+def _validatorproduction(production):
+    production = copy.copy(production)
+    if production.callable is not None:
+        action = _validatoractions.get(production.func)
+        if action is None:
+            indices = [i + 1 for i, name in enumerate(production.prod)
+                       if name in ('WORD', 'ASSIGNMENT_WORD')]
+            action = _validatewords(indices) if indices else _recognize
+        production.callable = action
+    return production
+
+validator = copy.copy(yaccparser)
+validator.productions = tuple(_validatorproduction(production)
+                              for production in yaccparser.productions)
+
+def parsesingle(s, strictmode=True, expansionlimit=None, convertpos=False, proceedonerror=False,
+                shallow=False):
     '''like parse, but only consumes a single top level node, e.g. parsing
     'a\nb' will only return a node for 'a', leaving b unparsed'''
-    p = _parser(s, strictmode=strictmode, expansionlimit=expansionlimit, proceedonerror=proceedonerror)
+    p = _parser(s, strictmode=strictmode, expansionlimit=expansionlimit, proceedonerror=proceedonerror,
+                shallow=shallow)
     tree = p.parse()
     if convertpos:
         ast.posconverter(s).visit(tree)
     return tree
 
-def parse(s, strictmode=True, expansionlimit=None, convertpos=False, proceedonerror=False):
+# input that can only be simple commands of plain words, one per line: no
+# quotes, expansions, escapes, comments, operators, redirections or braces
+_simpleinput = re.compile(r'''[^\\'"`$~<>()|;&#{}]*\Z''')
+
+# how many times parse built the tree of plain simple commands directly
+# (hit) rather than running the parser (miss)
+fastpath = {'hit' : 0, 'miss' : 0}
+
+def _parsesimple(s):
+    '''the nodes parse returns for s if it's only simple commands of plain
+    words, otherwise None'''
+    if not _simpleinput.match(s):
+        return None
+    parts = []
+    lineoffset = 0
+    for line in s.split('\n'):
+        words = []
+        for m in _plainwords.finditer(line):
+            word = m.group()
+            if word in tokenizer.valid_reserved_first_command:
+                return None
+            words.append(ast.node(kind='word', word=word, parts=[],
+                                  pos=(lineoffset + m.start(), lineoffset + m.end())))
+        if words:
+            if '=' in words[0].word:
+                # it might be an assignment
+                return None
+            parts.append(ast.node(kind='command', parts=words, pos=_partsspan(words)))
+        lineoffset += len(line) + 1
+    return parts or None
+
+def parse(s, strictmode=True, expansionlimit=None, convertpos=False, proceedonerror=False,
+          workers=None, shallow=False, keep=None, profile=False, removecontinuations=False):
     '''parse the input string, returning a list of nodes
 
     top level node kinds are:
@@ -645,37 +785,145 @@ def parse(s, strictmode=True, expansionlimit=None, convertpos=False, proceedoner
     command substitutions found during word expansion.
 
     when proceedonerror set, the parser will return AST nodes for unimplemented features, etc. (e.g., rather than throwing a NotImplementedError)
+
+    when workers is greater than 1, large inputs are cut into chunks at top
+    level command boundaries that are parsed concurrently in that many
+    processes (see bashlex.parallel). the result is the same as parsing
+    sequentially.
+
+    when shallow is set, words aren't expanded: their parts are always
+    empty (substitutions and parameters aren't parsed) and the word is the
+    same string as it is without shallow. this is a lot cheaper when all
+    that's needed is the commands and their arguments (see also commands).
+    arithmetic ($(( and $[) raises NotImplementedError as it does without
+    shallow, but only outside of substitutions, which aren't looked into.
+
+    when keep is given, the trees are trimmed: reservedword, operator and
+    pipe nodes are left out unless their kind is in keep, and children are
+    stored in tuples rather than lists (see ast.trim). e.g. keep=() gives
+    the smallest trees, keep=('operator',) keeps the operators of lists.
+
+    when profile is set, parse returns the list of nodes and a
+    bashlex.profile.stats with the time spent in each phase of parsing.
+    workers is ignored then.
+
+    when removecontinuations is set, the line continuations (backslash
+    newline) are taken out of s in one pass before parsing it where that can
+    be done without tokenizing (see tokenizer.removecontinuations), and the
+    positions are mapped back to s. it isn't faster, but the positions of
+    the nodes in a substitution that a continuation runs through are right
+    (without it, they're off by the continuations before them in the
+    word). on a ParsingError s is parsed again as is, so the error is the
+    same either way. the other functions that parse (Script,
+    parse_incremental, iterparse, lineparser...) don't do this, their
+    results are the same as parse without it.
     '''
-    p = _parser(s, strictmode=strictmode, expansionlimit=expansionlimit, proceedonerror=proceedonerror)
-    parts = [p.parse()]
+    stats = None
+    if profile:
+        stats = profiling.stats()
+        stats.enter('other')
+        workers = None
+
+    parts = _parsesimple(s)
+    if parts is not None:
+        fastpath['hit'] += 1
+        if keep is not None:
+            parts = [ast.trim(tree, keep) for tree in parts]
+    else:
+        fastpath['miss'] += 1
+        normalized = None
+        if removecontinuations:
+            normalized = tokenizer.removecontinuations(s)
+        if normalized is not None and normalized[1]:
+            normalized, removed = normalized
+            try:
+                parts = _parse(normalized, strictmode, expansionlimit, proceedonerror,
+                               workers, shallow, keep, stats)
+            except errors.ParsingError:
+                # the position of an error is relative to the start of the
+                # command it's in, so let the original input raise it
+                parts = None
+            else:
+                mapper = ast.posmapper(tokenizer.positionmap(removed),
+                                       tokenizer.positionmap(removed, end=True))
+                for tree in parts:
+                    mapper.visit(tree)
+        if parts is None:
+            parts = _parse(s, strictmode, expansionlimit, proceedonerror, workers, shallow,
+                           keep, stats)
 
-    class endfinder(ast.nodevisitor):
-        def __init__(self):
-            self.end = -1
-        def visitheredoc(self, node, value):
-            self.end = node.pos[1]
+    if convertpos:
+        if stats is not None:
+            stats.enter('convertpos')
+        for tree in parts:
+            ast.posconverter(s).visit(tree)
+        if stats is not None:
+            stats.exit()
+
+    if stats is not None:
+        stats.exit()
+        return parts, stats
+    return parts
+
+def _parse(s, strictmode, expansionlimit, proceedonerror, workers, shallow, keep,
+           profile=None):
+    parsed = {}
+    if workers is not None and workers > 1:
+        from bashlex import parallel
+        parsed = parallel.parsechunks(s, workers, strictmode=strictmode,
+                                      expansionlimit=expansionlimit,
+                                      proceedonerror=proceedonerror, shallow=shallow)
+
+    if 0 in parsed:
+        parts, index = parsed[0]
+        parts = list(parts)
+    else:
+        p = _parser(s, strictmode=strictmode, expansionlimit=expansionlimit, proceedonerror=proceedonerror,
+                    shallow=shallow, profile=profile)
+        parts = [p.parse()]
+        index = _nextindex(parts[-1])
+
+    if keep is None:
+        parts.extend(_parsefrom(s, index, strictmode, proceedonerror, parsed, shallow,
+                                profile))
+    else:
+        # trim as we go so the full trees don't pile up
+        parts = [ast.trim(tree, keep) for tree in parts]
+        for tree in _parsefrom(s, index, strictmode, proceedonerror, parsed, shallow,
+                               profile):
+            parts.append(ast.trim(tree, keep))
+    return parts
 
+def _nextindex(part):
+    '''the index at which the top level node that follows part starts'''
     # find the 'real' end incase we have a heredoc in there
     ef = _endfinder()
-    ef.visit(parts[-1])
-    index = max(parts[-1].pos[1], ef.end) + 1
+    ef.visit(part)
+    return max(part.pos[1], ef.end) + 1
+
+def _parsefrom(s, index, strictmode=True, proceedonerror=False, parsed=None, shallow=False,
+               profile=None):
+    '''generate the top level nodes of s, starting with the one at index
+
+    parsed optionally maps indices to (nodes, nextindex) for stretches of s
+    that were already parsed, profile is the profile.stats to add to'''
     while index < len(s):
-        part = _parser(s[index:], strictmode=strictmode, proceedonerror=proceedonerror).parse()
+        if parsed and index in parsed:
+            nodes, index = parsed[index]
+            for part in nodes:
+                yield part
+            continue
+
+        profiling.counters['bytessliced'] += len(s) - index
+        part = _parser(s[index:], strictmode=strictmode, proceedonerror=proceedonerror,
+                       shallow=shallow, profile=profile).parse()
 
         if not isinstance(part, ast.node):
             break
 
-        ast.posshifter(index).visit(part)
-        parts.append(part)
-        ef = _endfinder()
-        ef.visit(parts[-1])
-        index = max(parts[-1].pos[1], ef.end) + 1
-
-    if convertpos:
-        for tree in parts:
-            ast.posconverter(s).visit(tree)
-
-    return parts
+        ast.posshifter(index, s).visit(part)
+        yield part
+        index = _nextindex(part)
 
 def split(s):
     '''a utility function that mimics shlex.split but handles more
@@ -693,12 +941,278 @@ def split(s):
         if t.ttype == tokenizer.tokentype.WORD:
             quoted = bool(t.flags & flags.word.QUOTED)
             doublequoted = quoted and t.value[0] == '"'
-            parts, expandedword = subst._expandwordinternal(p, t, 0,
-                                                            doublequoted, 0, 0)
+            parts, expandedword = utils.run(
+                subst._expandwordinternal(p, t, 0, doublequoted, 0, 0))
             yield expandedword
         else:
             yield s[t.lexpos:t.endlexpos]
 
+# lines made of words that have nothing for split to expand (no quotes,
+# substitutions, escapes or operators): split just splits them on blanks
+_plainline = re.compile(r'''[^\\'"`$<>()|;&#\n]*\Z''')
+_plainwords = re.compile(r'[^ \t]+')
+
+# split_many gives lines to each worker process in batches this big
+_splitbatch = 2048
+
+def _splitlines(lines):
+    result = []
+    for line in lines:
+        try:
+            result.append(list(split(line)))
+        except Exception as e:
+            result.append(e)
+    return result
+
+def split_many(lines, workers=None):
+    '''split every line in lines, returns a list with the result of split
+    for each line in order, or the exception it raised
+
+    >>> split_many(['a b', 'a "b c"', 'a "b', 'a b'])[:2]
+    [['a', 'b'], ['a', 'b c']]
+    >>> split_many(['a b', 'a "b c"', 'a "b', 'a b'])[2].position
+    4
+
+    this is a lot cheaper than calling split for each line when most lines
+    are plain words separated by blanks, which are split without the
+    tokenizer, and when lines repeat (e.g. shell history), which are only
+    split once. when workers is greater than 1, the lines that do need the
+    tokenizer are split in that many processes, exceptions are then
+    ParsingErrors rather than the specific subclass.'''
+    lines = list(lines)
+    memo = {}
+    pending = []
+    for line in lines:
+        if line in memo:
+            continue
+        if _plainline.match(line):
+            memo[line] = _plainwords.findall(line)
+        else:
+            memo[line] = None
+            pending.append(line)
+
+    if workers is not None and workers > 1 and len(pending) > _splitbatch:
+        import multiprocessing
+
+        batches = [pending[i:i + _splitbatch] for i in range(0, len(pending), _splitbatch)]
+        pool = multiprocessing.Pool(min(workers, len(batches)))
+        try:
+            results = itertools.chain.from_iterable(pool.imap(_splitlines, batches))
+            for line, result in zip(pending, results):
+                memo[line] = result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for line, result in zip(pending, _splitlines(pending)):
+            memo[line] = result
+
+    # repeated lines get their own copy of the list
+    return [list(result) if isinstance(result, list) else result
+            for result in (memo[line] for line in lines)]
+
+# node kinds whose parts can contain commands
+_commandcontainers = frozenset(['list', 'pipeline', 'if', 'for', 'while', 'until',
+                                'case', 'unimplemented'])
+
+def _simplecommands(tree):
+    '''generate the command nodes in tree, in order, without looking inside
+    words'''
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        kind = node.kind
+        if kind == 'command':
+            yield node
+        elif kind in _commandcontainers:
+            stack.extend(reversed(node.parts))
+        elif kind == 'compound':
+            stack.extend(reversed(node.list))
+        elif kind == 'function':
+            stack.append(node.body)
+
+def commands(s, strictmode=True, proceedonerror=False):
+    '''generate an (argv, redirects, span) tuple for every simple command in
+    s, including the ones in compound commands and function bodies but not
+    the ones in substitutions
+
+    argv is the list of the command's words (after quote removal), without
+    the assignments that precede it. redirects is a list of (input, type,
+    output) tuples, the output of a redirection to a file is the word as a
+    string. span is (start, end) of the command in s.
+
+    this parses s in shallow mode (see parse), so it's a lot cheaper than
+    walking the AST parse returns.
+
+    >>> for command in commands('a "b c" >f; if d; then X=1 e 2>&1; fi'):
+    ...     print(command)
+    (['a', 'b c'], [(None, '>', 'f')], (0, 10))
+    (['d'], [], (15, 16))
+    (['e'], [(2, '>&', 1)], (23, 33))
+    '''
+    p = _parser(s, strictmode=strictmode, proceedonerror=proceedonerror, shallow=True)
+    tree = p.parse()
+    if not isinstance(tree, ast.node):
+        return
+
+    trees = itertools.chain([tree], _parsefrom(s, _nextindex(tree), strictmode,
+                                               proceedonerror, shallow=True))
+    for tree in trees:
+        for node in _simplecommands(tree):
+            argv = []
+            redirects = []
+            for part in node.parts:
+                if part.kind == 'word':
+                    argv.append(part.word)
+                elif part.kind == 'redirect':
+                    output = part.output
+                    if isinstance(output, ast.node):
+                        output = output.word
+                    redirects.append((part.input, part.type, output))
+            yield argv, redirects, node.pos
+
+def validate(s, strictmode=True, expansionlimit=None, proceedonerror=False):
+    '''check that s parses, without building the AST. returns None if it
+    does, otherwise the ParsingError that parse(s) raises (with the same
+    message and position)
+
+    this runs the tokenizer and the parser's state machine like parse, but
+    the only words that are expanded are those that have substitutions in
+    them, since the commands inside those have to be valid too. like parse,
+    it raises NotImplementedError for constructs that bashlex doesn't
+    support, unless proceedonerror is set.
+
+    >>> validate('a; if b; then c; fi') is None
+    True
+    >>> e = validate('a\\nb; ;')
+    >>> e.message, e.position
+    ("unexpected token ';'", 3)
+    >>> validate('echo $(a; ;)').position
+    3
+    '''
+    index = 0
+    while index < len(s):
+        p = _parser(s[index:] if index else s, strictmode=strictmode,
+                    expansionlimit=None if index else expansionlimit,
+                    proceedonerror=proceedonerror)
+        p.end = None
+        p.heredocs = []
+        try:
+            copy.copy(validator).parse(lexer=p.tok, context=p)
+        except errors.ParsingError as e:
+            return e
+
+        if p.end is None:
+            # nothing but blank lines and comments
+            break
+
+        # the same as _nextindex on the node parse returns
+        end = p.end
+        for redirnode in p.heredocs:
+            if redirnode.heredoc is not None:
+                end = max(end, redirnode.heredoc.pos[1])
+        index += end + 1
+
+# what needs_more_input returns
+incomplete = collections.namedtuple('incomplete', ['kind', 'expected', 'position'])
+
+# tokens that start a compound command mapped to the token that ends it
+# and how it's written
+_openers = {
+    'IF' : ('FI', 'fi'),
+    'CASE' : ('ESAC', 'esac'),
+    'FOR' : ('DONE', 'done'),
+    'SELECT' : ('DONE', 'done'),
+    'WHILE' : ('DONE', 'done'),
+    'UNTIL' : ('DONE', 'done'),
+    'LEFT_CURLY' : ('RIGHT_CURLY', '}'),
+    'LEFT_PAREN' : ('RIGHT_PAREN', ')'),
+}
+
+class _unexpectedeof(Exception):
+    def __init__(self, stack):
+        self.stack = stack
+
+def _unclosed(stack):
+    '''return the innermost compound command opening token in the symbol
+    stack that isn't closed'''
+    opened = []
+    for sym in stack:
+        if sym.type in _openers:
+            opened.append(sym)
+        elif opened and _openers[opened[-1].type][0] == sym.type:
+            opened.pop()
+    if opened:
+        return opened[-1]
+
+def needs_more_input(s):
+    '''check if s is an incomplete command that an interactive shell would
+    prompt for more input for (e.g. it has an unclosed quote or an if without
+    a fi). returns None if s is complete, or if it has an error that more
+    input can't fix (parse it to get the error), otherwise an incomplete
+    namedtuple of (kind, expected, position) where kind is one of:
+
+    - delimiter - a quote, substitution or bracket isn't closed, expected is
+      the character that closes it
+    - heredoc - the input ended inside a here document, expected is its
+      delimiter
+    - keyword - a compound command isn't closed, expected is the keyword (or
+      } or ) for subshells) that closes it
+    - continuation - the last line ends with a backslash
+    - command - the input ends with an operator (| && etc.) or a keyword
+      that has to be followed by a command
+
+    position is where the incomplete construct starts in s.
+
+    this runs the tokenizer and the parser without building any nodes or
+    expanding words, so it doesn't look inside command substitutions.
+
+    >>> needs_more_input('echo "a b')
+    incomplete(kind='delimiter', expected='"', position=5)
+    >>> needs_more_input('if a; then\\n  b\\n')
+    incomplete(kind='keyword', expected='fi', position=0)
+    >>> needs_more_input('a; b') is None
+    True
+    '''
+    index = 0
+    while index < len(s):
+        p = _parser(s[index:] if index else s)
+        theparser = copy.copy(recognizer)
+
+        def unexpectedtoken(t):
+            if t.ttype != tokenizer.tokentype.EOF:
+                p_error(t)
+            raise _unexpectedeof(list(theparser.symstack))
+        theparser.errorfunc = unexpectedtoken
+
+        try:
+            theparser.parse(lexer=p.tok, context=p)
+        except tokenizer.MatchedPairError as e:
+            return incomplete('delimiter', e.close, index + e.start)
+        except heredoc.HeredocError as e:
+            return incomplete('heredoc', e.redirnode.output.word, index + e.redirnode.pos[0])
+        except _unexpectedeof as e:
+            if p.tok.redirstack:
+                # the heredoc is only read after the next newline
+                redirnode = p.tok.redirstack[0][0]
+                return incomplete('heredoc', redirnode.output.word, index + redirnode.pos[0])
+
+            line = s[:-1] if s.endswith('\n') else s
+            if (len(line) - len(line.rstrip('\\'))) % 2:
+                return incomplete('continuation', None, len(line) - 1)
+
+            opener = _unclosed(e.stack)
+            if opener is not None:
+                return incomplete('keyword', _openers[opener.type][1], index + opener.lexpos)
+            tokens = [sym for sym in e.stack
+                      if isinstance(sym, tokenizer.token) and sym.type != 'NEWLINE']
+            position = tokens[-1].lexpos if tokens else 0
+            return incomplete('command', None, index + position)
+        except (errors.ParsingError, NotImplementedError):
+            return None
+
+        index += p.tok._shell_input_line_index
+
 class _parser(object):
     '''
     this class is mainly used to provide context to the productions
@@ -706,13 +1220,17 @@ class _parser(object):
     YaccProduction context attribute to make it accessible.
     '''
     def __init__(self, s, strictmode=True, expansionlimit=None, tokenizerargs=None,
-                 proceedonerror=None):
+                 proceedonerror=None, shallow=False, profile=None):
         assert expansionlimit is None or isinstance(expansionlimit, int)
 
         self.s = s
         self._strictmode = strictmode
         self._expansionlimit = expansionlimit
         self._proceedonerror = proceedonerror
+        self._shallow = shallow
+        # the profile.stats to add to, or None
+        self._profile = profile
+        profiling.counters['parsers'] += 1
 
         if tokenizerargs is None:
             tokenizerargs = {}
@@ -725,14 +1243,40 @@ class _parser(object):
 
         self.redirstack = self.tok.redirstack
 
+        if profile is not None:
+            # rather than checking whether we're profiling for every token
+            self.tok._profile = profile
+            token = self.tok.token
+            def profiledtoken():
+                profile.enter('tokenize')
+                try:
+                    return token()
+                finally:
+                    profile.exit()
+            self.tok.token = profiledtoken
+
     def parse(self):
+        return utils.run(self.parsegen())
+
+    def parsegen(self):
+        '''parse as a generator for utils.run'''
         # yacc.yacc returns a parser object that is not reentrant, it has
         # some mutable state. we make a shallow copy of it so no
         # state spills over to the next call to parse on it
         theparser = copy.copy(yaccparser)
-        tree = theparser.parse(lexer=self.tok, context=self)
-
-        return tree
+        profiling.counters['yacccopies'] += 1
+        gen = theparser.parsegen(lexer=self.tok, context=self)
+        if self._profile is None:
+            return gen
+        return self._profiled(gen)
+
+    def _profiled(self, gen):
+        self._profile.enter('parse')
+        try:
+            tree = yield gen
+        finally:
+            self._profile.exit()
+        yield tree
 
 class _endfinder(ast.nodevisitor):
     '''helper class to find the "real" end pos of a node that contains
@@ -741,5 +1285,8 @@ class _endfinder(ast.nodevisitor):
     a different line'''
     def __init__(self):
         self.end = -1
-    def visitheredoc(self, node, value):
-        self.end = node.pos[1]
+    def visitnode(self, node):
+        # rather than visitheredoc, which would cut the heredoc's value out
+        # of the input
+        if node.kind == 'heredoc':
+            self.end = node.pos[1]
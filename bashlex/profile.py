@@ -0,0 +1,251 @@
+'''where the time of a parse goes
+
+bashlex.parse(s, profile=True) returns the trees and a stats object with
+the time spent and the number of calls in each phase of parsing, split by
+how deeply nested in substitutions it was:
+
+- tokenize - reading tokens (tokenizer.token)
+- parse - the LR loop and the grammar's actions
+- expand - expanding words (subst._expandwordinternal), minus the
+  substitutions in them
+- substitution - setting up the parse of a substitution and moving its
+  positions into place (the parse itself is one level deeper)
+- heredoc - reading here documents
+- convertpos - posconverter, when convertpos is set
+- other - the rest of bashlex.parse (cutting the input into top level
+  commands, building plain commands without the parser, ...)
+
+the time of a phase doesn't include the phases it calls into, so they add
+up to the total. profiling costs a function call around every token, when
+it's off the only cost is checking whether it's on once per word.
+
+    $ python -m bashlex.profile script.sh
+
+this module also keeps counters for the whole process, which counts()
+returns as a dict:
+
+- tokens - tokens read, by tokentype name
+- reductions - reductions, by the p_* function of the rule
+- getc, ungetc - calls to tokenizer._getc and _ungetc
+- parsers - _parser instances, recursiveparsers are the ones made to parse
+  a substitution
+- yacccopies - copies of the yacc parser (one per parse)
+- bytessliced - the length of the slices of the input the parsers were
+  given (the rest of the input after a top level command or a substitution)
+- fastpath - parser.fastpath
+
+the ones that change once per parser are always kept, the ones for every
+character, token and reduction only between counting() and
+counting(False), which wrap the functions that count them. parse's
+workers count in their own process.
+'''
+
+import collections, contextlib, time
+
+timer = getattr(time, 'perf_counter', time.time)
+
+phases = ('tokenize', 'parse', 'expand', 'substitution', 'heredoc', 'convertpos',
+          'other')
+
+counters = collections.defaultdict(int)
+tokens = collections.defaultdict(int)
+reductions = collections.defaultdict(int)
+
+# (object, attribute, original value) for everything counting() replaced
+_counted = []
+
+def _counter(name, f):
+    def counted(*args, **kwargs):
+        counters[name] += 1
+        return f(*args, **kwargs)
+    return counted
+
+def _tokencounter(f):
+    def token(self):
+        t = f(self)
+        tokens[t.ttype.name if t.ttype is not None else 'None'] += 1
+        return t
+    return token
+
+def _reductioncounter(name, f):
+    def action(p):
+        reductions[name] += 1
+        return f(p)
+    return action
+
+def counting(enable=True):
+    '''start (or with enable=False stop) counting tokens, reductions and
+    calls to _getc and _ungetc'''
+    from bashlex import parser, tokenizer
+
+    if enable and not _counted:
+        cls = tokenizer.tokenizer
+        # the plain functions, not the (python 2) unbound methods
+        replace = [(cls, '_getc', _counter('getc', cls.__dict__['_getc'])),
+                   (cls, '_ungetc', _counter('ungetc', cls.__dict__['_ungetc'])),
+                   (cls, 'token', _tokencounter(cls.__dict__['token']))]
+        for production in parser.yaccparser.productions:
+            if production.callable is not None:
+                replace.append((production, 'callable',
+                                _reductioncounter(production.func, production.callable)))
+        for obj, attr, value in replace:
+            _counted.append((obj, attr, obj.__dict__[attr]))
+            setattr(obj, attr, value)
+    elif not enable:
+        while _counted:
+            obj, attr, value = _counted.pop()
+            setattr(obj, attr, value)
+
+def counts():
+    '''the counters as a dict'''
+    from bashlex import parser
+
+    d = {'tokens' : dict(tokens), 'reductions' : dict(reductions),
+         'fastpath' : dict(parser.fastpath)}
+    for name in ('getc', 'ungetc', 'parsers', 'recursiveparsers', 'yacccopies',
+                 'bytessliced'):
+        d[name] = counters[name]
+    return d
+
+def resetcounts():
+    '''set the counters (and parser.fastpath) back to 0'''
+    from bashlex import parser
+
+    counters.clear()
+    tokens.clear()
+    reductions.clear()
+    for key in parser.fastpath:
+        parser.fastpath[key] = 0
+
+class stats(object):
+    '''seconds and calls for each (phase, level), level is the substitution
+    nesting level (0 is the input itself)'''
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.total = 0.0
+        self.level = 0
+        self._stack = []
+
+    def enter(self, phase):
+        '''start timing phase at the current level, pausing the phase it's
+        called from'''
+        now = timer()
+        if self._stack:
+            current = self._stack[-1]
+            self.seconds[current[0], current[1]] += now - current[2]
+        else:
+            self._start = now
+        self._stack.append([phase, self.level, now])
+        self.calls[phase, self.level] += 1
+
+    def exit(self):
+        '''stop timing the current phase, resuming the one it was called from'''
+        now = timer()
+        phase, level, start = self._stack.pop()
+        self.seconds[phase, level] += now - start
+        if self._stack:
+            self._stack[-1][2] = now
+        else:
+            self.total += now - self._start
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def update(self, other):
+        '''add the stats of another (finished) parse'''
+        for key, seconds in other.seconds.items():
+            self.seconds[key] += seconds
+            self.calls[key] += other.calls[key]
+        self.total += other.total
+
+    def byphase(self):
+        '''phase -> seconds, over all levels'''
+        d = collections.defaultdict(float)
+        for (phase, level), seconds in self.seconds.items():
+            d[phase] += seconds
+        return dict(d)
+
+    def todict(self):
+        '''the stats as plain dicts, for json'''
+        levels = {}
+        for (phase, level), seconds in self.seconds.items():
+            levels.setdefault(level, {})[phase] = {
+                'seconds' : seconds, 'calls' : self.calls[phase, level]}
+        return {'total' : self.total, 'phases' : self.byphase(), 'levels' : levels}
+
+    def report(self):
+        '''a table of the stats'''
+        lines = ['%-13s %5s %10s %10s %6s' % ('phase', 'level', 'calls', 'seconds', '%')]
+        for (phase, level) in sorted(self.seconds, key=lambda k: (phases.index(k[0]), k[1])):
+            seconds = self.seconds[phase, level]
+            lines.append('%-13s %5d %10d %10.4f %6.1f' % (
+                phase, level, self.calls[phase, level], seconds,
+                100 * seconds / self.total if self.total else 0))
+        lines.append('%-13s %5s %10s %10.4f' % ('total', '', '', self.total))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return 'stats(total=%.4f, %s)' % (self.total, ', '.join(
+            '%s=%.4f' % (phase, seconds) for phase, seconds in sorted(self.byphase().items())))
+
+def main(argv=None):
+    import argparse, json, sys
+    from bashlex import parser
+
+    argparser = argparse.ArgumentParser(prog='python -m bashlex.profile',
+                                        description='show where the time parsing a file goes')
+    argparser.add_argument('file', help="the script to parse, '-' for stdin")
+    argparser.add_argument('--convertpos', action='store_true',
+                           help='also convert positions (parse(convertpos=True))')
+    argparser.add_argument('--repeat', type=int, default=1,
+                           help='parse this many times and add up the stats')
+    argparser.add_argument('--json', action='store_true', help='print the stats as json')
+    argparser.add_argument('--counts', action='store_true',
+                           help='also count tokens, reductions and so on (see counts)')
+    args = argparser.parse_args(argv)
+
+    if args.file == '-':
+        s = sys.stdin.read()
+    else:
+        with open(args.file) as f:
+            s = f.read()
+
+    if args.counts:
+        resetcounts()
+        counting()
+    total = stats()
+    try:
+        for i in range(args.repeat):
+            trees, st = parser.parse(s, convertpos=args.convertpos, profile=True)
+            total.update(st)
+    finally:
+        counting(False)
+
+    if args.json:
+        d = total.todict()
+        if args.counts:
+            d['counts'] = counts()
+        print(json.dumps(d, indent=2, sort_keys=True))
+    else:
+        print(total.report())
+        if args.counts:
+            c = counts()
+            for name in ('tokens', 'reductions'):
+                print('')
+                for key, count in sorted(c.pop(name).items(), key=lambda kv: -kv[1]):
+                    print('%-34s %10d' % (key, count))
+            print('')
+            for name, count in sorted(c.items()):
+                print('%-34s %10s' % (name, count))
+
+if __name__ == '__main__':
+    # the main of bashlex.profile, not of __main__, which has counters of its
+    # own that the parser doesn't add to
+    from bashlex import profile
+    profile.main()
@@ -0,0 +1,292 @@
+'''run bashlex.parse on untrusted input in a pool of worker processes
+
+each worker is a long lived process that imports bashlex once (so the yacc
+tables are built once per worker) and then serves parse jobs sent to it over
+a pipe. a worker that takes longer than the job timeout is killed and
+replaced, and every worker can only grow its address space by so much, so a
+pathological input can't take the whole machine down with it.
+
+    >>> with pool(workers=2, timeout=5) as p:       # doctest: +SKIP
+    ...     p.parse('echo $(foo)')
+    {'ok': True, 'trees': [{'kind': 'command', ...}]}
+
+results are plain dicts that can be passed to json.dumps as is. on success
+'trees' holds the parsed nodes as returned by ast.todict (use ast.fromdict to
+get nodes back), otherwise 'error' is a dict with a 'type' and a 'message',
+and for syntax errors also the 'position' of the error in the input.
+
+error types are:
+
+- ParsingError - the input isn't valid
+- NotImplementedError - the input uses a construct bashlex doesn't support
+- timeout - the job took longer than the timeout, the worker was killed
+- memory - the worker ran out of memory, it was replaced
+- crash - the worker died while parsing, it was replaced
+- error - any other exception raised by the parser
+
+this module relies on fork/kill semantics and resource.setrlimit, so it's
+only supported on Linux.
+'''
+
+import collections, multiprocessing, threading
+
+try:
+    import queue
+except ImportError:
+    # Python 2 fallback
+    import Queue as queue
+
+from bashlex import ast, errors
+
+def _vmsize():
+    '''the address space of this process in bytes'''
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmSize:'):
+                return int(line.split()[1]) * 1024
+
+def _limitmemory(memlimit):
+    '''let this process grow its address space by memlimit bytes
+
+    the limit is relative since a forked worker starts out with the
+    address space of the process that made the pool, which can be anything'''
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = _vmsize() + memlimit
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _error(type_, message, position=None):
+    e = {'type' : type_, 'message' : message}
+    if position is not None:
+        e['position'] = position
+    return {'ok' : False, 'error' : e}
+
+def _run(s, kwargs):
+    from bashlex import parser
+    try:
+        trees = parser.parse(s, **kwargs)
+        return {'ok' : True, 'trees' : [ast.todict(tree) for tree in trees]}
+    except errors.ParsingError as e:
+        return _error('ParsingError', e.message, e.position)
+    except NotImplementedError as e:
+        return _error('NotImplementedError', str(e))
+    except MemoryError:
+        return _error('memory', 'worker ran out of memory')
+    except Exception as e:
+        return _error('error', '%s: %s' % (e.__class__.__name__, e))
+
+def _serve(conn, memlimit):
+    # build the tables before the first job comes in (and before limiting
+    # memory, so they don't count towards it)
+    from bashlex import parser
+
+    if memlimit:
+        _limitmemory(memlimit)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+
+        s, kwargs = job
+        result = _run(s, kwargs)
+        try:
+            conn.send(result)
+        except MemoryError:
+            result = _error('memory', 'worker ran out of memory')
+            conn.send(result)
+
+        # after a MemoryError the heap is in an unknown state, let the
+        # pool replace us
+        if result['ok'] is False and result['error']['type'] == 'memory':
+            break
+
+class _worker(object):
+    def __init__(self, ctx, memlimit):
+        self.conn, childconn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(childconn, memlimit))
+        self.process.daemon = True
+        self.process.start()
+        childconn.close()
+        self.jobs = 0
+
+    def kill(self):
+        try:
+            self.process.kill()
+        except AttributeError:
+            # Python < 3.7
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+class pool(object):
+    '''a pool of worker processes that parse with bashlex.parse
+
+    workers is the number of processes to run, timeout is the number of
+    seconds a single job can take (None to wait forever) and memlimit is the
+    number of bytes each worker can grow its address space by once it's
+    ready to parse (None to not limit it). maxjobs recycles a worker after it
+    served that many jobs. context is the multiprocessing start method
+    (Python 3 only).
+
+    the pool is thread safe, concurrent calls to parse are spread among the
+    workers. closing it stops the idle workers, the busy ones are stopped
+    when they finish their job.'''
+    def __init__(self, workers=None, timeout=10, memlimit=512 * 1024 * 1024,
+                 maxjobs=None, context=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        assert workers > 0
+        assert memlimit is None or memlimit > 0
+
+        self.timeout = timeout
+        self.memlimit = memlimit
+        self.maxjobs = maxjobs
+        if hasattr(multiprocessing, 'get_context'):
+            self._ctx = multiprocessing.get_context(context)
+        else:
+            # Python 2, which only forks
+            assert context is None
+            self._ctx = multiprocessing
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = collections.Counter()
+
+        for i in range(workers):
+            self._spawn()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _spawn(self):
+        w = _worker(self._ctx, self.memlimit)
+        with self._lock:
+            if not self._closed:
+                self._workers.add(w)
+                self._idle.put(w)
+                return
+        w.stop()
+
+    def _replace(self, w, reason):
+        w.kill()
+        with self._lock:
+            self._workers.discard(w)
+            self.stats[reason] += 1
+            closed = self._closed
+        if not closed:
+            self._spawn()
+
+    def _release(self, w):
+        '''give back a worker taken from _idle'''
+        with self._lock:
+            if not self._closed:
+                self._idle.put(w)
+                return
+            self._workers.discard(w)
+        w.stop()
+
+    def parse(self, s, timeout=None, **parserargs):
+        '''parse s in one of the workers, parserargs are passed to
+        bashlex.parse. timeout overrides the pool's timeout for this job'''
+        if self._closed:
+            raise ValueError('pool is closed')
+        if timeout is None:
+            timeout = self.timeout
+
+        w = self._idle.get()
+        if w is None:
+            # close woke us up, wake up the next one
+            self._idle.put(None)
+            raise ValueError('pool is closed')
+        try:
+            try:
+                w.conn.send((s, parserargs))
+                if not w.conn.poll(timeout):
+                    self._replace(w, 'timeout')
+                    w = None
+                    return _error('timeout', 'parsing took more than %ss' % timeout)
+                result = w.conn.recv()
+            except (EOFError, IOError, OSError):
+                self._replace(w, 'crash')
+                w = None
+                return _error('crash', 'worker died while parsing')
+
+            # w is ours until it's released, only stats is shared
+            w.jobs += 1
+            with self._lock:
+                self.stats['jobs'] += 1
+            if not result['ok'] and result['error']['type'] == 'memory':
+                self._replace(w, 'memory')
+                w = None
+            elif self.maxjobs and w.jobs >= self.maxjobs:
+                self._replace(w, 'recycled')
+                w = None
+            return result
+        finally:
+            if w is not None:
+                self._release(w)
+
+    def map(self, sources, **parserargs):
+        '''parse each string in sources concurrently, returning a list of
+        results in the same order'''
+        sources = list(sources)
+        results = [None] * len(sources)
+        jobs = queue.Queue()
+        for i, s in enumerate(sources):
+            jobs.put((i, s))
+
+        def drain():
+            while True:
+                try:
+                    i, s = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                results[i] = self.parse(s, **parserargs)
+
+        with self._lock:
+            n = len(self._workers)
+        threads = [threading.Thread(target=drain) for i in range(min(n, len(sources)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def close(self):
+        '''stop the idle workers, the busy ones stop when their job is done'''
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._workers.difference_update(idle)
+            # wake up the calls to parse waiting for a worker
+            self._idle.put(None)
+        for w in idle:
+            w.stop()
@@ -0,0 +1,507 @@
+'''a fast pre-scanner that finds where top level commands end
+
+boundaries() walks the input once, keeping track of quotes, substitutions,
+compound commands (if/case/loops, { } and subshells) and here documents, and
+returns the offsets at which each top level command ends. it doesn't build
+tokens or run the parser, so it's cheap enough to run on huge scripts to
+count commands, to index them for random access or to cut the input into
+chunks that can be parsed independently.
+
+the quoting rules are the ones the tokenizer uses, and here documents follow
+heredoc.gatherheredocuments: bodies start after the newline that ends the
+line with the redirection and end at a line that matches the delimiter as it
+was written (a line ending in a backslash is joined with the next one, and
+leading tabs are dropped for <<-).
+
+    >>> list(boundaries('a; b && c\\nif x; then y; fi\\n'))
+    [2, 10, 27]
+    >>> list(boundaries('a; b && c\\nif x; then y; fi\\n', separators='\\n'))
+    [10, 27]
+
+this is a heuristic, the parser is the authority on what the input means.
+on input that doesn't parse the offsets are still well defined, but may not
+correspond to anything the parser would do.
+'''
+
+import array, re
+
+from bashlex import tokenizer
+
+# characters that end a word, taken from the tokenizer's syntax table
+_breakchars = frozenset(c for c, syntax in tokenizer.sh_syntaxtab.items()
+                        if 'break' in syntax)
+
+# a run of characters that can't start anything interesting
+_plainrun = re.compile(r'''[^ \t\n;&|()<>'"`$\\#{}]+''')
+_dquoterun = re.compile(r'[^"\\$`]+')
+_blanks = re.compile(r'[ \t]+')
+# what can come after a top level command before its boundary
+_filler = re.compile(r'(?:[ \t\n]+|#[^\n]*)*')
+
+# frames on the scanner's stack, each one is closed by something different
+_PAREN = ')'        # ( ... ), $( ... ), <( ... )
+_BRACE = '}'        # { ...; }
+_PARAM = '${'       # ${ ... }
+_DQUOTE = '"'       # " ... "
+_BACKTICK = '`'     # ` ... `
+_ARITH = '(('       # (( ... )) and $(( ... ))
+_ARITHPAREN = '('   # parens nested inside arithmetic
+_FI = 'fi'
+_DONE = 'done'
+_CASE = 'case'      # case WORD before 'in'
+_CASEPAT = 'casep'  # reading the patterns of a case clause
+_CASEBODY = 'caseb' # reading the commands of a case clause
+
+class _state(object):
+    __slots__ = ('stack', 'cmdpos', 'content', 'continued', 'heredocs',
+                 'funcname', 'forword')
+
+    def __init__(self, stack=None):
+        self.stack = stack or []
+        # the next word is in a position where reserved words are recognized
+        self.cmdpos = True
+        # we saw something other than blanks and comments since the last
+        # boundary
+        self.content = False
+        # the line ended with an operator that expects another command
+        self.continued = False
+        # here documents waiting for the next newline, (delimiter, striptabs)
+        self.heredocs = []
+        self.funcname = False
+        self.forword = False
+
+def _skipsinglequoted(s, i, n):
+    '''i is after the opening quote, returns the index after the closing
+    one'''
+    j = s.find("'", i)
+    if j == -1:
+        return n
+    return j + 1
+
+def _skipansiquoted(s, i, n):
+    '''like _skipsinglequoted for $'...', where backslash escapes'''
+    while i < n:
+        c = s[i]
+        if c == '\\':
+            i += 2
+        elif c == "'":
+            return i + 1
+        else:
+            i += 1
+    return n
+
+def _readheredocs(s, i, n, heredocs):
+    '''i is after the newline that starts the bodies, returns the index
+    after the last delimiter line'''
+    for delimiter, striptabs in heredocs:
+        while i < n:
+            end = s.find('\n', i)
+            if end == -1:
+                end = n
+            # readline removes quoted newlines, so a line ending in a
+            # backslash continues on the next one
+            while end < n and end > i and s[end-1] == '\\':
+                nextend = s.find('\n', end + 1)
+                end = n if nextend == -1 else nextend
+            line = s[i:end]
+            if '\\\n' in line:
+                line = line.replace('\\\n', '')
+            if striptabs:
+                line = line.lstrip('\t')
+            i = end + 1
+            if line == delimiter:
+                break
+    del heredocs[:]
+    return min(i, n)
+
+def _skipnested(s, i, n):
+    '''i is on a ", ` or $, returns the index after the construct that
+    starts there'''
+    st = _state([None])
+    c = s[i]
+    if c == '$':
+        i = _dollar(s, i, n, st)
+        if len(st.stack) == 1:
+            return i
+    else:
+        st.stack.append(_DQUOTE if c == '"' else _BACKTICK)
+        i += 1
+    return _scan(s, i, n, st, None, None, untilempty=True)
+
+def _readword(s, i, n):
+    '''returns the index after the word starting at i, skipping over
+    quotes and substitutions inside it'''
+    while i < n:
+        c = s[i]
+        if c in _breakchars:
+            return i
+        if c == '\\':
+            i += 2
+        elif c == "'":
+            i = _skipsinglequoted(s, i + 1, n)
+        elif c == '"' or c == '`' or c == '$':
+            i = _skipnested(s, i, n)
+        else:
+            i += 1
+    return n
+
+def _dollar(s, i, n, st):
+    '''i is on a $, pushes whatever it opens and returns the new index'''
+    c = s[i+1] if i + 1 < n else ''
+    if c == '(':
+        if s.startswith('((', i + 1):
+            st.stack.append(_ARITH)
+            return i + 3
+        st.stack.append(_PAREN)
+        st.cmdpos = True
+        return i + 2
+    elif c == '{':
+        st.stack.append(_PARAM)
+        return i + 2
+    elif c == "'":
+        return _skipansiquoted(s, i + 2, n)
+    elif c == '"':
+        st.stack.append(_DQUOTE)
+        return i + 2
+    elif c:
+        # $#, $$ and friends, don't let the next char be mistaken for
+        # something else (e.g. the start of a comment)
+        return i + 2
+    return i + 1
+
+def _keyword(word, st):
+    '''handle a plain word seen in a position where reserved words are
+    recognized'''
+    stack = st.stack
+    top = stack[-1]
+    if word in ('then', 'else', 'elif', 'do', '!', 'time'):
+        st.cmdpos = True
+    elif word == 'if':
+        stack.append(_FI)
+        st.cmdpos = True
+    elif word in ('while', 'until'):
+        stack.append(_DONE)
+        st.cmdpos = True
+    elif word in ('for', 'select'):
+        stack.append(_DONE)
+        st.cmdpos = False
+        st.forword = True
+    elif word == 'case':
+        stack.append(_CASE)
+        st.cmdpos = False
+    elif word == '{':
+        stack.append(_BRACE)
+        st.cmdpos = True
+    elif word == 'function':
+        st.cmdpos = False
+        st.funcname = True
+    elif word == 'fi' and top == _FI:
+        stack.pop()
+        st.cmdpos = False
+    elif word == 'done' and top == _DONE:
+        stack.pop()
+        st.cmdpos = False
+    elif word == 'esac' and top in (_CASEPAT, _CASEBODY):
+        stack.pop()
+        st.cmdpos = False
+    elif word == '}' and top == _BRACE:
+        stack.pop()
+        st.cmdpos = False
+    else:
+        st.cmdpos = False
+
+def _boundary(i, st, result):
+    if st.content and len(st.stack) == 1:
+        result.append(i)
+        st.content = False
+
+def _scan(s, i, n, st, separators, result, untilempty=False):
+    '''the scanner's main loop, runs from i to n appending boundaries to
+    result. when untilempty is set, returns as soon as the frame at the
+    top of the stack when we started is closed'''
+    stack = st.stack
+    base = len(stack) - 1 if untilempty else 0
+
+    while i < n:
+        if untilempty and len(stack) == base:
+            return i
+        top = stack[-1]
+        c = s[i]
+
+        if top == _DQUOTE:
+            m = _dquoterun.match(s, i)
+            if m:
+                i = m.end()
+                continue
+            if c == '"':
+                stack.pop()
+                i += 1
+            elif c == '\\':
+                i += 2
+            elif c == '$':
+                i = _dollar(s, i, n, st)
+            else:
+                stack.append(_BACKTICK)
+                i += 1
+            continue
+
+        if top == _BACKTICK:
+            if c == '\\':
+                i += 2
+            elif c == '`':
+                stack.pop()
+                i += 1
+            else:
+                j = s.find('`', i)
+                k = s.find('\\', i)
+                if j == -1:
+                    i = n
+                elif k != -1 and k < j:
+                    i = k
+                else:
+                    i = j
+            continue
+
+        if top == _PARAM:
+            if c == '}':
+                stack.pop()
+                i += 1
+            elif c == '\\':
+                i += 2
+            elif c == "'":
+                i = _skipsinglequoted(s, i + 1, n)
+            elif c == '"':
+                stack.append(_DQUOTE)
+                i += 1
+            elif c == '`':
+                stack.append(_BACKTICK)
+                i += 1
+            elif c == '$':
+                i = _dollar(s, i, n, st)
+            else:
+                i += 1
+            continue
+
+        if top == _ARITH or top == _ARITHPAREN:
+            if c == '(':
+                stack.append(_ARITHPAREN)
+                i += 1
+            elif c == ')':
+                stack.pop()
+                if top == _ARITH and s.startswith(')', i + 1):
+                    i += 2
+                else:
+                    i += 1
+            elif c == '\\':
+                i += 2
+            elif c == "'":
+                i = _skipsinglequoted(s, i + 1, n)
+            elif c == '"':
+                stack.append(_DQUOTE)
+                i += 1
+            elif c == '`':
+                stack.append(_BACKTICK)
+                i += 1
+            elif c == '$':
+                i = _dollar(s, i, n, st)
+            else:
+                i += 1
+            continue
+
+        # everything else is a command context
+        if c == ' ' or c == '\t':
+            i = _blanks.match(s, i).end()
+        elif c == '\n':
+            i += 1
+            if st.heredocs:
+                i = _readheredocs(s, i, n, st.heredocs)
+            if not st.continued and separators is not None and '\n' in separators:
+                _boundary(i, st, result)
+            st.cmdpos = True
+        elif c == '#' and (i == 0 or s[i-1] in _breakchars):
+            j = s.find('\n', i)
+            i = n if j == -1 else j
+        elif c == '\\':
+            if s.startswith('\n', i + 1):
+                # line continuation
+                i += 2
+            else:
+                i = _readword(s, i, n)
+                st.content = True
+                st.continued = st.cmdpos = False
+        elif c == ';':
+            if s.startswith(';', i + 1):
+                i += 3 if s.startswith('&', i + 2) else 2
+                if top == _CASEBODY:
+                    stack[-1] = _CASEPAT
+            elif s.startswith('&', i + 1):
+                i += 2
+                if top == _CASEBODY:
+                    stack[-1] = _CASEPAT
+            else:
+                i += 1
+                if separators is not None and ';' in separators:
+                    _boundary(i, st, result)
+            st.cmdpos = True
+            st.continued = False
+        elif c == '&':
+            if s.startswith('&', i + 1):
+                i += 2
+                st.continued = True
+            elif s.startswith('>', i + 1):
+                i += 3 if s.startswith('>', i + 2) else 2
+                st.content = True
+                continue
+            else:
+                i += 1
+                st.continued = False
+                if separators is not None and '&' in separators:
+                    _boundary(i, st, result)
+            st.cmdpos = True
+        elif c == '|':
+            if top != _CASEPAT:
+                st.continued = True
+                st.cmdpos = True
+            i += 2 if s.startswith('|', i + 1) or s.startswith('&', i + 1) else 1
+        elif c == '(':
+            st.content = True
+            st.continued = False
+            if top == _CASEPAT:
+                # optional paren before a pattern
+                i += 1
+            elif s.startswith('(', i + 1) and (st.cmdpos or st.forword):
+                stack.append(_ARITH)
+                i += 2
+                st.forword = False
+            else:
+                stack.append(_PAREN)
+                i += 1
+                st.cmdpos = True
+        elif c == ')':
+            i += 1
+            if top == _CASEPAT:
+                stack[-1] = _CASEBODY
+            elif top == _PAREN:
+                stack.pop()
+            st.cmdpos = True
+        elif c == '<' or c == '>':
+            st.content = True
+            st.continued = False
+            nextc = s[i+1] if i + 1 < n else ''
+            if nextc == '(':
+                stack.append(_PAREN)
+                st.cmdpos = True
+                i += 2
+            elif c == '<' and nextc == '<':
+                if s.startswith('<', i + 2):
+                    # here string
+                    i += 3
+                else:
+                    striptabs = s.startswith('-', i + 2)
+                    i += 3 if striptabs else 2
+                    m = _blanks.match(s, i)
+                    if m:
+                        i = m.end()
+                    j = _readword(s, i, n)
+                    if j > i:
+                        st.heredocs.append((s[i:j], striptabs))
+                    i = j
+            elif nextc in '>&|' or (c == '<' and nextc == '>'):
+                i += 2
+            else:
+                i += 1
+        else:
+            st.content = True
+            st.continued = st.forword = False
+            m = _plainrun.match(s, i)
+            if m:
+                j = m.end()
+                if j == n or s[j] in _breakchars:
+                    word = s[i:j]
+                    if top == _CASE:
+                        if word == 'in':
+                            stack[-1] = _CASEPAT
+                    elif top == _CASEPAT:
+                        if word == 'esac':
+                            stack.pop()
+                            st.cmdpos = False
+                    elif st.cmdpos:
+                        _keyword(word, st)
+                    elif st.funcname:
+                        st.funcname = False
+                        st.cmdpos = True
+                    i = j
+                    continue
+                i = j
+            elif c == '{' or c == '}':
+                # braces that aren't a whole word, e.g. {a,b}
+                j = _readword(s, i, n)
+                if j == i + 1 and st.cmdpos and top != _CASEPAT:
+                    _keyword(c, st)
+                    i = j
+                    continue
+                i = j
+            elif c == '$':
+                i = _dollar(s, i, n, st)
+            elif c == "'":
+                i = _skipsinglequoted(s, i + 1, n)
+            elif c == '"':
+                stack.append(_DQUOTE)
+                i += 1
+            elif c == '`':
+                stack.append(_BACKTICK)
+                i += 1
+            else:
+                # '#' inside a word
+                i += 1
+            st.cmdpos = False
+
+    if untilempty and len(stack) == base:
+        return i
+    return n
+
+def boundaries(s, separators=';&\n'):
+    '''return an array of the offsets that end each top level command in s
+
+    a command ends after an unquoted separator from separators at the top
+    level (after the here document bodies that follow a newline), or at the
+    end of the input. offsets are only reported for stretches of the input
+    that contain something other than blanks and comments, so
+    len(boundaries(s)) is the number of top level commands and s[a:b] for
+    consecutive offsets a, b (starting from 0) is a single command, along
+    with any leading blanks and comments.
+
+    with separators='\\n' the offsets are where bashlex.parse starts parsing
+    a new top level node.'''
+    result = array.array('q')
+    st = _state([None])
+    _scan(s, 0, len(s), st, separators, result)
+    if st.content:
+        result.append(len(s))
+    return result
+
+def skippable(s, start, end):
+    '''whether s[start:end] is only blanks, newlines and comments
+
+    bashlex.parse picks up right after the last token of a top level
+    command, while its boundary is after the newline that ends it, so what
+    lies between the two is skippable when they agree, e.g. for 'a # c\\nb'
+
+    >>> skippable('a # c\\nb', 2, 6)
+    True
+    '''
+    return _filler.match(s, start, end).end() == end
+
+def count(s, separators=';&\n'):
+    '''the number of top level commands in s'''
+    return len(boundaries(s, separators))
+
+def skipsubstitution(s, i):
+    '''i is on the $ of a $( or ${, on the < or > of a process substitution
+    or on an opening backtick, return the index after the construct that
+    starts there'''
+    n = len(s)
+    if s[i] in '<>':
+        st = _state([None, _PAREN])
+        return _scan(s, i + 2, n, st, None, None, untilempty=True)
+    return _skipnested(s, i, n)
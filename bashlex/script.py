@@ -0,0 +1,196 @@
+'''random access to the top level commands of a script
+
+    >>> s = Script('a; b\\nif x; then\\n  y\\nfi\\nc\\n')
+    >>> len(s)
+    3
+    >>> s[1].kind
+    'compound'
+    >>> s.span(1)
+    (5, 23)
+    >>> [n.kind for n in s.lines(4, 5)]
+    ['compound', 'command']
+
+the source is indexed up front with bashlex.scanner, which is a lot cheaper
+than parsing it, and each command is parsed when it's first accessed. this
+is meant for tools that only look at a part of a (large) script, such as the
+command under the cursor in an editor.
+
+the nodes are the same ones bashlex.parse returns (script[i] is
+bashlex.parse(source)[i]), and a parsing error is raised when the command
+that contains it is accessed.
+'''
+
+import bisect, collections, io, os
+
+from bashlex import scanner
+
+def _ispath(source):
+    return hasattr(os, 'PathLike') and isinstance(source, os.PathLike)
+
+class Script(object):
+    '''a script whose top level commands are parsed on demand
+
+    source is the script itself, or an os.PathLike pointing to a file with
+    it (see also fromfile). strictmode, expansionlimit and proceedonerror
+    are as in bashlex.parse. at most cachesize parsed commands are kept in
+    memory, the least recently used ones are parsed again when needed.'''
+    def __init__(self, source, strictmode=True, expansionlimit=None,
+                 proceedonerror=False, cachesize=256):
+        if _ispath(source):
+            with io.open(os.fspath(source), encoding='utf-8') as f:
+                source = f.read()
+
+        self.source = source
+        self.cachesize = cachesize
+        self._strictmode = strictmode
+        self._expansionlimit = expansionlimit
+        self._proceedonerror = proceedonerror
+        self._cache = collections.OrderedDict()
+        self._lines = None
+
+        self._ends = list(scanner.boundaries(source, '\n'))
+        self._starts = [0] + self._ends[:-1]
+        # set once we know the boundaries are the parser's
+        self._exact = False
+
+    @classmethod
+    def fromfile(cls, path, encoding='utf-8', **kwargs):
+        with io.open(path, encoding=encoding) as f:
+            return cls(f.read(), **kwargs)
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __iter__(self):
+        # the length can change if the source gets reindexed
+        i = 0
+        while i < len(self):
+            yield self[i]
+            i += 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('command index out of range')
+
+        node = self._cache.pop(i, None)
+        if node is None:
+            node = self._parse(i)
+            if len(self._cache) >= self.cachesize > 0:
+                self._cache.popitem(last=False)
+        if self.cachesize > 0:
+            self._cache[i] = node
+        return node
+
+    def __repr__(self):
+        return '<Script with %d commands, %d characters>' % (len(self), len(self.source))
+
+    def span(self, i):
+        '''the (start, end) of the source of the i'th command, which
+        includes the blank lines and comments that precede it'''
+        if i < 0:
+            i += len(self)
+        return self._starts[i], self._ends[i]
+
+    def indexat(self, offset):
+        '''the index of the command whose span contains offset, or None'''
+        i = bisect.bisect_right(self._ends, offset)
+        if i < len(self):
+            return i
+
+    def at(self, offset):
+        '''the command whose span contains offset, or None'''
+        i = self.indexat(offset)
+        if i is not None:
+            return self[i]
+
+    def lines(self, first, last=None):
+        '''the commands that overlap the lines first through last (1-based,
+        inclusive)'''
+        if last is None:
+            last = first
+        if self._lines is None:
+            self._lines = [0]
+            index = self.source.find('\n')
+            while index != -1:
+                self._lines.append(index + 1)
+                index = self.source.find('\n', index + 1)
+
+        start = self._lines[max(first, 1) - 1] if first <= len(self._lines) else len(self.source)
+        end = self._lines[last] - 1 if last < len(self._lines) else len(self.source)
+
+        # skip commands that end before start or that only have their
+        # leading blanks and comments in range
+        result = []
+        i = self.indexat(start)
+        while i is not None and i < len(self) and self._starts[i] <= end:
+            node = self[i]
+            if node.pos[0] <= end:
+                result.append(node)
+            i += 1
+        return result
+
+    def _parse(self, i):
+        from bashlex import ast, parser
+
+        start, end = self._starts[i], self._ends[i]
+        last = end == len(self.source)
+        expansionlimit = self._expansionlimit if i == 0 else None
+
+        if self._exact:
+            s = self.source[start:] if start else self.source
+            node = parser._parser(s, strictmode=self._strictmode, expansionlimit=expansionlimit,
+                                  proceedonerror=self._proceedonerror).parse()
+            ast.posshifter(start).visit(node)
+            return node
+
+        # parse just this command. unless it's the last one, a heredoc
+        # that runs to the end of it means the scanner got it wrong, so
+        # it's parsed strictly
+        try:
+            node = parser._parser(self.source[start:end],
+                                  strictmode=self._strictmode or not last,
+                                  expansionlimit=expansionlimit,
+                                  proceedonerror=self._proceedonerror).parse()
+            ok = isinstance(node, ast.node)
+            if ok:
+                # the span ends after any blanks and comments that follow
+                # the command
+                index = start + parser._nextindex(node)
+                ok = ((index <= end and scanner.skippable(self.source, index, end)) or
+                      (last and index > end))
+        except Exception:
+            ok = False
+
+        if not ok:
+            # either the command is really broken (and parsing it as it
+            # appears in the source raises the same error bashlex.parse
+            # would), or the scanner disagrees with the parser
+            s = self.source[start:] if start else self.source
+            parser._parser(s, strictmode=self._strictmode, expansionlimit=expansionlimit,
+                           proceedonerror=self._proceedonerror).parse()
+            self._reindex()
+            if i >= len(self):
+                raise IndexError('command index out of range')
+            node = self._cache.get(i)
+            return node if node is not None else self._parse(i)
+
+        ast.posshifter(start).visit(node)
+        return node
+
+    def _reindex(self):
+        '''index the source with the parser instead of the scanner'''
+        from bashlex import parser
+
+        nodes = parser.parse(self.source, strictmode=self._strictmode,
+                             expansionlimit=self._expansionlimit,
+                             proceedonerror=self._proceedonerror)
+        self._starts = [0] + [parser._nextindex(node) for node in nodes[:-1]]
+        self._ends = self._starts[1:] + [len(self.source)]
+        self._exact = True
+        self._cache.clear()
+        for i, node in enumerate(nodes[:self.cachesize]):
+            self._cache[i] = node
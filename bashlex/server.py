@@ -0,0 +1,429 @@
+'''a local daemon that keeps the parser warm for short lived processes
+
+importing bashlex and building the yacc tables takes a lot longer than
+parsing a typical script, which is what editor plugins and git hooks that
+spawn a new interpreter per file end up paying for. running
+
+    $ python -m bashlex.server
+
+starts a daemon that listens on a unix domain socket and serves parse, split
+and validate requests from any number of concurrent clients. it exits after
+it has been idle for a while (--idle-timeout).
+
+only the user running the daemon can talk to it: the socket is in a
+directory only they can get into ($XDG_RUNTIME_DIR, or a bashlex-<uid>
+directory in the temp directory), and both ends check that the other one
+runs as the same user.
+
+clients use the client class (or the parse, split and validate functions of
+this module), which talk to the daemon if one is running and otherwise fall
+back to parsing in process:
+
+    >>> from bashlex import server
+    >>> server.split('a "b c"')
+    ['a', 'b c']
+
+importing this module doesn't build the parser tables, that only happens if
+we end up having to parse in process.
+
+the wire format is a 4 byte big endian length followed by that many bytes of
+compact json, in both directions. a request is a list of [op, string, args]
+and a response is [true, result] or [false, error] where error is a dict
+with the same keys as the errors of bashlex.sandbox.
+'''
+
+import errno, json, os, socket, stat, struct, sys, tempfile, threading, time
+
+from bashlex import ast, errors
+
+_header = struct.Struct('!I')
+
+# don't let a broken client make us allocate arbitrary amounts of memory
+_maxmessage = 256 * 1024 * 1024
+
+def _privatedir():
+    '''the directory for the socket when there's no XDG_RUNTIME_DIR, the temp
+    directory is shared so it's in a directory of its own'''
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), 'bashlex-%d' % uid)
+
+def defaultpath():
+    '''the socket the daemon listens on by default, can be overridden with
+    the BASHLEX_SOCKET environment variable'''
+    path = os.environ.get('BASHLEX_SOCKET')
+    if path:
+        return path
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if directory:
+        uid = os.getuid() if hasattr(os, 'getuid') else 0
+        return os.path.join(directory, 'bashlex-%d.sock' % uid)
+    return os.path.join(_privatedir(), 'bashlex.sock')
+
+def _notours(message):
+    return socket.error(errno.EPERM, message)
+
+def _checkdirectory(path, create):
+    '''when path is in _privatedir, make sure (creating it if create is set)
+    it's a directory that only we can get into'''
+    directory = os.path.dirname(path)
+    if directory != _privatedir():
+        return
+    if create:
+        try:
+            os.mkdir(directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    st = os.lstat(directory)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+            st.st_mode & 0o077):
+        raise _notours('%s must be a directory only we can access' % directory)
+
+def _checksocket(path):
+    '''raise unless path is a socket that belongs to us, returns False if
+    there's nothing there'''
+    try:
+        st = os.lstat(path)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return False
+        raise
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise _notours('%s is not a socket of ours' % path)
+    return True
+
+def _peeruid(sock):
+    '''the uid of the process at the other end of sock, or None if the
+    platform can't tell'''
+    peercred = getattr(socket, 'SO_PEERCRED', None)
+    if peercred is None:
+        return None
+    creds = struct.Struct('3i')
+    pid, uid, gid = creds.unpack(sock.getsockopt(socket.SOL_SOCKET, peercred, creds.size))
+    return uid
+
+def _recvexactly(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(min(n, 1024 * 1024))
+        if not chunk:
+            if chunks:
+                raise EOFError('connection closed in the middle of a message')
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+def _sendmessage(sock, obj):
+    data = json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    sock.sendall(_header.pack(len(data)) + data)
+
+def _recvmessage(sock):
+    header = _recvexactly(sock, _header.size)
+    if header is None:
+        return None
+    n, = _header.unpack(header)
+    if n > _maxmessage:
+        raise ValueError('message too large (%d bytes)' % n)
+    data = _recvexactly(sock, n)
+    if data is None:
+        raise EOFError('connection closed in the middle of a message')
+    return json.loads(data.decode('utf-8'))
+
+def _error(type_, message, position=None):
+    e = {'type' : type_, 'message' : message}
+    if position is not None:
+        e['position'] = position
+    return [False, e]
+
+def _validate(s, args):
+    '''bashlex.validate with the arguments of a parse request, returns the
+    ParsingError or None'''
+    from bashlex import parser
+    # these don't change whether s parses
+    args = dict((k, v) for k, v in args.items() if k not in ('convertpos', 'workers'))
+    return parser.validate(s, **args)
+
+def _dispatch(op, s, args):
+    '''run a single request in this process, returns the response that is
+    sent back to the client'''
+    from bashlex import parser
+    try:
+        if op == 'parse':
+            return [True, [ast.todict(tree) for tree in parser.parse(s, **args)]]
+        elif op == 'split':
+            return [True, list(parser.split(s))]
+        elif op == 'validate':
+            e = _validate(s, args)
+            if e is not None:
+                raise e
+            return [True, None]
+        else:
+            return _error('error', 'unknown op %r' % op)
+    except errors.ParsingError as e:
+        return _error('ParsingError', e.message, e.position)
+    except NotImplementedError as e:
+        return _error('NotImplementedError', str(e))
+    except Exception as e:
+        return _error('error', '%s: %s' % (e.__class__.__name__, e))
+
+class daemon(object):
+    '''serves requests on the unix socket at path until no request came in
+    for idletimeout seconds or stop() is called. connections that don't send
+    a request for that long are closed as well'''
+    def __init__(self, path=None, idletimeout=600):
+        self.path = path or defaultpath()
+        self.idletimeout = idletimeout
+        self._sock = None
+        self._lock = threading.Lock()
+        # the number of requests being served
+        self._active = 0
+        self._lastactivity = time.time()
+        self._stopped = threading.Event()
+
+    def _bind(self):
+        try:
+            _checkdirectory(self.path, True)
+        except socket.error as e:
+            raise RuntimeError(str(e))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # nobody else gets to connect in between bind and a chmod
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        except socket.error as e:
+            if e.errno != errno.EADDRINUSE:
+                sock.close()
+                raise
+            # a socket file exists, see if someone is listening on it or
+            # it's left over from a daemon that died. we only remove it if
+            # it's a socket of ours
+            try:
+                _checksocket(self.path)
+            except socket.error as e:
+                sock.close()
+                raise RuntimeError(str(e))
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except socket.error:
+                os.unlink(self.path)
+                sock.bind(self.path)
+            else:
+                sock.close()
+                raise RuntimeError('a daemon is already listening on %s' % self.path)
+            finally:
+                probe.close()
+        finally:
+            os.umask(umask)
+        sock.listen(64)
+        return sock
+
+    def _touch(self, delta):
+        with self._lock:
+            self._active += delta
+            self._lastactivity = time.time()
+
+    def _serveconnection(self, conn):
+        try:
+            uid = _peeruid(conn)
+            if uid is not None and uid != os.getuid():
+                return
+            while not self._stopped.is_set():
+                request = _recvmessage(conn)
+                if request is None:
+                    break
+                self._touch(1)
+                try:
+                    op, s, args = request
+                    _sendmessage(conn, _dispatch(op, s, args))
+                finally:
+                    self._touch(-1)
+        except (EOFError, ValueError, socket.error):
+            # socket.timeout included, the client was idle for too long
+            pass
+        finally:
+            conn.close()
+
+    def idle(self):
+        '''whether no request is being served and none came in for
+        idletimeout seconds'''
+        with self._lock:
+            return (self._active == 0 and
+                    time.time() - self._lastactivity >= self.idletimeout)
+
+    def serve(self):
+        # build the tables before accepting the first connection
+        from bashlex import parser
+
+        self._sock = self._bind()
+        if self.idletimeout is None:
+            self._sock.settimeout(1.0)
+        else:
+            self._sock.settimeout(min(1.0, self.idletimeout))
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn, address = self._sock.accept()
+                except socket.timeout:
+                    if self.idletimeout is not None and self.idle():
+                        break
+                    continue
+                conn.settimeout(self.idletimeout)
+                t = threading.Thread(target=self._serveconnection, args=(conn,))
+                t.daemon = True
+                t.start()
+        finally:
+            self._sock.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stopped.set()
+
+class client(object):
+    '''talks to the daemon listening on path, falling back to parsing in
+    this process when there isn't one (unless fallback is False, in which
+    case socket.error is raised)
+
+    the methods mirror the module level functions in bashlex.'''
+    def __init__(self, path=None, fallback=True, timeout=None):
+        self.path = path or defaultpath()
+        self.fallback = fallback
+        self.timeout = timeout
+        self._sock = None
+        self._local = False
+
+    def _connect(self):
+        # don't talk to a daemon someone else put there
+        _checkdirectory(self.path, False)
+        _checksocket(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+            uid = _peeruid(sock)
+            if uid is not None and uid != os.getuid():
+                raise _notours('the daemon on %s runs as uid %d' % (self.path, uid))
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _call(self, op, s, args, local):
+        if not self._local and self._sock is None:
+            try:
+                self._sock = self._connect()
+            except (socket.error, AttributeError):
+                # AttributeError: no AF_UNIX on this platform
+                if not self.fallback:
+                    raise
+                self._local = True
+
+        if self._local:
+            return local()
+
+        try:
+            _sendmessage(self._sock, [op, s, args])
+            response = _recvmessage(self._sock)
+            if response is None:
+                raise EOFError('daemon closed the connection')
+        except (socket.error, EOFError):
+            self.close()
+            if not self.fallback:
+                raise
+            # the daemon went away, don't try it again
+            self._local = True
+            return local()
+
+        ok, result = response
+        if ok:
+            return result
+        if result['type'] == 'ParsingError':
+            raise errors.ParsingError(result['message'], s, result['position'])
+        elif result['type'] == 'NotImplementedError':
+            raise NotImplementedError(result['message'])
+        raise RuntimeError(result['message'])
+
+    def parse(self, s, **parserargs):
+        '''like bashlex.parse'''
+        def local():
+            from bashlex import parser
+            return parser.parse(s, **parserargs)
+        trees = self._call('parse', s, parserargs, local)
+        if self._local:
+            return trees
+        return [ast.fromdict(tree) for tree in trees]
+
+    def split(self, s):
+        '''like bashlex.split, but returns a list'''
+        def local():
+            from bashlex import parser
+            return list(parser.split(s))
+        return self._call('split', s, {}, local)
+
+    def validate(self, s, **parserargs):
+        '''returns None if s parses, or the ParsingError otherwise'''
+        def local():
+            e = _validate(s, parserargs)
+            if e is not None:
+                raise e
+        try:
+            self._call('validate', s, parserargs, local)
+        except errors.ParsingError as e:
+            return e
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+_client = None
+
+def _defaultclient():
+    global _client
+    if _client is None:
+        _client = client()
+    return _client
+
+def parse(s, **parserargs):
+    return _defaultclient().parse(s, **parserargs)
+
+def split(s):
+    return _defaultclient().split(s)
+
+def validate(s, **parserargs):
+    return _defaultclient().validate(s, **parserargs)
+
+def main(argv=None):
+    import argparse
+
+    argparser = argparse.ArgumentParser(prog='python -m bashlex.server',
+                                        description='serve bashlex requests on a unix socket')
+    argparser.add_argument('--socket', dest='path', default=None,
+                           help='socket path (default: %s)' % defaultpath())
+    argparser.add_argument('--idle-timeout', type=float, default=600,
+                           help='exit after this many seconds without '
+                                'requests (default: %(default)s)')
+    args = argparser.parse_args(argv)
+
+    d = daemon(args.path, args.idle_timeout)
+    try:
+        d.serve()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
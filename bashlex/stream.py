@@ -0,0 +1,233 @@
+'''parse input that arrives a line at a time
+
+    >>> p = lineparser()
+    >>> p.feed('if a; then\\n')
+    []
+    >>> p.feed('  b\\n')
+    []
+    >>> [n.kind for n in p.feed('fi; c\\n')]
+    ['list']
+    >>> p.feed('d\\n')[0].pos
+    (21, 22)
+    >>> p.close()
+    []
+
+calling bashlex.parse on everything that was buffered every time a line
+comes in costs O(buffered input) per line, which adds up for long functions
+or here documents that are pasted in a line at a time. lineparser keeps the
+tokenizer and the parser's LR stacks of the command it's in the middle of,
+along with a snapshot of the tokenizer taken before each token. when a token
+can't be read because the input ran out (an unclosed quote, a line
+continuation, a here document with no delimiter yet), the tokenizer is rolled
+back to the snapshot and the parser picks up from there when more input
+arrives. lines that can't complete what's pending (a here document body
+line that isn't its delimiter, a line in a quoted string that doesn't have
+the closing quote) aren't tokenized at all until one that can shows up.
+
+the nodes returned are the same as bashlex.parse(everything fed) returns,
+with positions relative to the start of the input.
+'''
+
+import copy
+
+from bashlex import ast, errors, heredoc, tokenizer
+
+class _needinput(Exception):
+    def __init__(self, close=None, heredocs=None):
+        # the character that has to appear in the input before it's worth
+        # trying again, or the here documents we're waiting for
+        self.close = close
+        self.heredocs = heredocs
+
+class _lexer(object):
+    '''what the yacc parser reads tokens from, rolls the tokenizer back when
+    it runs out of input'''
+    def __init__(self, tok):
+        self.tok = tok
+
+    def __getattr__(self, name):
+        # the grammar actions use the tokenizer through p.lexer
+        return getattr(self.tok, name)
+
+    def token(self):
+        tok = self.tok
+        snapshot = tok.snapshot()
+        try:
+            t = tok.token()
+        except tokenizer.MatchedPairError as e:
+            tok.restore(snapshot)
+            raise _needinput(close=e.close)
+        except heredoc.HeredocError:
+            tok.restore(snapshot)
+            raise _needinput(heredocs=[(node.output.word, killleading)
+                                       for node, killleading in tok.redirstack])
+
+        if t is tokenizer.eoftoken or (t.ttype != tokenizer.tokentype.NEWLINE and
+                                       t.endlexpos >= len(tok._shell_input_line)):
+            # the token might continue on the next line
+            tok.restore(snapshot)
+            raise _needinput()
+        return t
+
+class lineparser(object):
+    '''parses input given to feed and returns the top level nodes that are
+    complete
+
+    only whole lines are parsed, a line that isn't terminated by a newline
+    is held back until the rest of it arrives or close is called. a
+    ParsingError is raised by feed as soon as the input can't be valid no
+    matter what follows, its position is relative to the start of the
+    command that has the error, which is discarded along with everything fed
+    before the error.
+
+    offset is added to the positions of the returned nodes, for input that
+    is the continuation of something parsed earlier.'''
+    def __init__(self, strictmode=True, proceedonerror=False, offset=0):
+        self._strictmode = strictmode
+        self._proceedonerror = proceedonerror
+        # the text of the command we're in the middle of, and where it
+        # starts in the input
+        self._buffer = ''
+        self._base = offset
+        # a partial line
+        self._pending = ''
+        self._closed = False
+        self._reset()
+
+    def _reset(self):
+        from bashlex import parser
+
+        self._p = parser._parser('', strictmode=True, proceedonerror=self._proceedonerror)
+        self._lexer = _lexer(self._p.tok)
+        self._yacc = copy.copy(parser.yaccparser)
+        self._started = False
+        # what we're waiting for, and where to look for it
+        self._waitclose = None
+        self._waitheredocs = None
+        self._scanned = 0
+
+    @property
+    def buffered(self):
+        '''the input that was fed but isn't part of a returned node yet'''
+        return self._buffer + self._pending
+
+    @property
+    def offset(self):
+        '''the position in the input where buffered starts'''
+        return self._base
+
+    def feed(self, data):
+        '''add data to the input, returns a list of the top level nodes that
+        it completed'''
+        if self._closed:
+            raise ValueError('feed after close')
+        data = self._pending + data
+        end = data.rfind('\n') + 1
+        self._pending = data[end:]
+        if not end:
+            return []
+        self._buffer += data[:end]
+        if not self._ready(data[:end]):
+            return []
+        return self._parse()
+
+    def close(self):
+        '''signal the end of the input, returns the remaining nodes. raises
+        ParsingError if the input ends in the middle of a command'''
+        from bashlex import parser
+
+        self._closed = True
+        s = self._buffer + self._pending
+        self._buffer = self._pending = ''
+        if not s.strip():
+            return []
+
+        # this is a one time cost, so just parse what's left the way
+        # bashlex.parse would
+        parts = []
+        index = 0
+        while index < len(s):
+            part = parser._parser(s[index:] if index else s, strictmode=self._strictmode,
+                                  proceedonerror=self._proceedonerror).parse()
+            if not isinstance(part, ast.node):
+                break
+            ast.posshifter(index).visit(part)
+            index = parser._nextindex(part)
+            ast.posshifter(self._base).visit(part)
+            parts.append(part)
+        self._base += len(s)
+        return parts
+
+    def _ready(self, lines):
+        '''check if the new lines can complete what we're waiting for'''
+        if self._waitclose is not None:
+            if self._waitclose not in lines:
+                return False
+            self._waitclose = None
+        elif self._waitheredocs:
+            # look for the delimiters in the lines after the one with the
+            # redirections, the same way heredoc.makeheredoc does
+            buffer = self._buffer
+            while self._waitheredocs:
+                end = buffer.find('\n', self._scanned)
+                while end != -1 and buffer[end - 1:end] == '\\':
+                    end = buffer.find('\n', end + 1)
+                if end == -1:
+                    return False
+                line = buffer[self._scanned:end].replace('\\\n', '')
+                delimiter, killleading = self._waitheredocs[0]
+                if killleading:
+                    line = line.lstrip('\t')
+                if line == delimiter:
+                    self._waitheredocs.pop(0)
+                self._scanned = end + 1
+        return True
+
+    def _parse(self):
+        from bashlex import parser
+
+        result = []
+        while self._buffer:
+            tok = self._p.tok
+            tok._shell_input_line = self._buffer
+            try:
+                tree = self._yacc.parse(lexer=self._lexer, context=self._p,
+                                        resume=self._started)
+            except _needinput as e:
+                self._started = True
+                if e.heredocs:
+                    self._waitheredocs = e.heredocs
+                    # the bodies start after the line with the redirections
+                    self._scanned = self._buffer.find('\n', tok._shell_input_line_index) + 1
+                else:
+                    self._waitclose = e.close
+                return result
+            except heredoc.HeredocError as e:
+                # a here document that is read while reducing rather than
+                # from the tokenizer, start over once the delimiter shows up
+                redirects = [e.redirnode] + [node for node, killleading in tok.redirstack]
+                self._reset()
+                self._waitheredocs = [(node.output.word, node.type == '<<-')
+                                      for node in redirects]
+                self._scanned = self._buffer.find('\n', e.redirnode.pos[1]) + 1
+                return result
+            except errors.ParsingError:
+                self._base += len(self._buffer)
+                self._buffer = ''
+                self._reset()
+                raise
+
+            if not isinstance(tree, ast.node):
+                # blank lines and comments
+                self._base += len(self._buffer)
+                self._buffer = ''
+                self._reset()
+                break
+
+            index = parser._nextindex(tree)
+            ast.posshifter(self._base).visit(tree)
+            result.append(tree)
+            self._base += index
+            self._buffer = self._buffer[index:]
+            self._reset()
+        return result
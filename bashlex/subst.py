@@ -1,6 +1,11 @@
-import copy
+import copy, re
 
-from bashlex import ast, flags, tokenizer, errors
+from bashlex import ast, flags, scanner, tokenizer, errors, profile as profiling
+
+# the functions that parse substitutions are generators that return their
+# result to the parser's action that expands the word, see utils.run. the
+# parser for a substitution is yielded as well, so however deep they're
+# nested, parsing them doesn't recurse
 
 def _recursiveparse(parserobj, base, sindex, tokenizerargs=None):
     # TODO: fix this hack that prevents mutual import
@@ -14,18 +19,33 @@ def _recursiveparse(parserobj, base, sindex, tokenizerargs=None):
                          'tokenbeforethat' : tok._token_before_that,
                          'twotokensago' : tok._two_tokens_ago}
 
-    string = base[sindex:]
-    newlimit = parserobj._expansionlimit
-    if newlimit is not None:
-        newlimit -= 1
-    p = parser._parser(string, tokenizerargs=tokenizerargs,
-                       expansionlimit=newlimit)
-    node = p.parse()
-
-    endp = node.pos[1]
-    _adjustpositions(node, sindex, len(base))
-
-    return node, endp
+    profile = parserobj._profile
+    if profile is not None:
+        profile.enter('substitution')
+    try:
+        string = base[sindex:]
+        profiling.counters['recursiveparsers'] += 1
+        profiling.counters['bytessliced'] += len(string)
+        newlimit = parserobj._expansionlimit
+        if newlimit is not None:
+            newlimit -= 1
+        p = parser._parser(string, tokenizerargs=tokenizerargs,
+                           expansionlimit=newlimit, profile=profile)
+        if profile is not None:
+            profile.level += 1
+        try:
+            node = yield p.parsegen()
+        finally:
+            if profile is not None:
+                profile.level -= 1
+
+        endp = node.pos[1]
+        _adjustpositions(node, sindex, len(base))
+    finally:
+        if profile is not None:
+            profile.exit()
+
+    yield node, endp
 
 def _parsedolparen(parserobj, base, sindex):
     copiedps = copy.copy(parserobj.parserstate)
@@ -39,27 +59,27 @@ def _parsedolparen(parserobj, base, sindex):
                      'tokenbeforethat' : parserobj.tok._token_before_that,
                      'twotokensago' : parserobj.tok._two_tokens_ago}
 
-    node, endp = _recursiveparse(parserobj, base, sindex, tokenizerargs)
+    node, endp = yield _recursiveparse(parserobj, base, sindex, tokenizerargs)
 
     if string[endp] != ')':
         while endp > 0 and string[endp-1] == '\n':
             endp -= 1
 
-    return node, sindex + endp
+    yield node, sindex + endp
 
 def _extractcommandsubst(parserobj, string, sindex, sxcommand=False):
     if string[sindex] == '(':
         raise NotImplementedError('arithmetic expansion')
         #return _extractdelimitedstring(parserobj, string, sindex, '$(', '(', '(', sxcommand=True)
     else:
-        node, si = _parsedolparen(parserobj, string, sindex)
+        node, si = yield _parsedolparen(parserobj, string, sindex)
         si += 1
-        return ast.node(kind='commandsubstitution', command=node, pos=(sindex-2, si)), si
+        yield ast.node(kind='commandsubstitution', command=node, pos=(sindex-2, si)), si
 
 def _extractprocesssubst(parserobj, string, sindex):
     #return _extractdelimitedstring(tok, string, sindex, starter, '(', ')', sxcommand=True)
-    node, si = _parsedolparen(parserobj, string, sindex)
-    return node, si + 1
+    node, si = yield _parsedolparen(parserobj, string, sindex)
+    yield node, si + 1
 
 #def _extractdelimitedstring(parserobj, string, sindex, opener, altopener, closer,
 #                            sxcommand=False):
@@ -157,12 +177,18 @@ def _paramexpand(parserobj, string, sindex):
         # XXX 7863
         # TODO not start enough, doesn't consider escaping
         zindex = string.find('}', zindex + 1)
+        if zindex == -1:
+            # rather than starting over from the beginning of the string
+            raise errors.ParsingError('bad substitution: no closing "}" in %s'
+                                      % string, string, sindex)
         node = ast.node(kind='parameter', value=string[sindex+2:zindex],
                         pos=(sindex, zindex+1))
         # TODO
         # return _parameterbraceexpand(string, zindex)
     elif c == '(':
-        return _extractcommandsubst(parserobj, string, zindex + 1)
+        result = yield _extractcommandsubst(parserobj, string, zindex + 1)
+        yield result
+        return
     elif c == '[':
         raise NotImplementedError('arithmetic substitution')
         #return _extractarithmeticsubst(string, zindex + 1)
@@ -175,19 +201,23 @@ def _paramexpand(parserobj, string, sindex):
                 break
         temp1 = string[sindex:zindex]
         if temp1:
-            return (ast.node(kind='parameter', value=temp1[1:], pos=(sindex, zindex)),
-                    zindex)
+            yield (ast.node(kind='parameter', value=temp1[1:], pos=(sindex, zindex)),
+                   zindex)
+            return
 
     if zindex < len(string):
         zindex += 1
 
-    return node, zindex
+    yield node, zindex
 
 def _adjustpositions(node_, base, endlimit):
     class v(ast.nodevisitor):
         def visitnode(self, node):
             assert node.pos[1] + base <= endlimit
             node.pos = (node.pos[0] + base, node.pos[1] + base)
+            if type(node) is ast.heredocnode:
+                # base isn't the input the heredoc was parsed from
+                node.materialize()
     visitor = v()
     visitor.visit(node_)
 
@@ -222,7 +252,7 @@ def _expandwordinternal(parserobj, wordtoken, qheredocument, qdoublequotes, quot
             else:
                 tindex = sindex[0] + 1
 
-                node, sindex[0] = _extractprocesssubst(parserobj, string, tindex)
+                node, sindex[0] = yield _extractprocesssubst(parserobj, string, tindex)
 
                 parts.append(ast.node(kind='processsubstitution', command=node,
                                       pos=(tindex - 2, sindex[0])))
@@ -268,7 +298,7 @@ def _expandwordinternal(parserobj, wordtoken, qheredocument, qdoublequotes, quot
 
         elif c == '$' and len(string) > 1:
             tindex = sindex[0]
-            node, sindex[0] = _paramexpand(parserobj, string, sindex[0])
+            node, sindex[0] = yield _paramexpand(parserobj, string, sindex[0])
             if node:
                 parts.append(node)
             istring += string[tindex:sindex[0]]
@@ -282,7 +312,7 @@ def _expandwordinternal(parserobj, wordtoken, qheredocument, qdoublequotes, quot
                 x = _stringextract(string, sindex[0], "`")
                 if x == -1:
                     raise errors.ParsingError('bad substitution: no closing "`" '
-                                              'in %s' % string)
+                                              'in %s' % string, string, sindex[0])
                 else:
                     if wordtoken.flags & flags.word.NOCOMSUB:
                         pass
@@ -290,7 +320,7 @@ def _expandwordinternal(parserobj, wordtoken, qheredocument, qdoublequotes, quot
                         sindex[0] = x
 
                         word = string[tindex+1:sindex[0]]
-                        command, ttindex = _recursiveparse(parserobj, word, 0)
+                        command, ttindex = yield _recursiveparse(parserobj, word, 0)
                         _adjustpositions(command, tindex+1, len(string))
                         ttindex += 1 # ttindex is on the closing char
 
@@ -326,7 +356,8 @@ def _expandwordinternal(parserobj, wordtoken, qheredocument, qdoublequotes, quot
             # entire string surronded by single quotes, no expansion is
             # going to happen
             if sindex[0] == 0 and string[-1] == "'":
-                return [], string[1:-1]
+                yield [], string[1:-1]
+                return
 
             # check if we're inside double quotes
             if not qdoublequotes:
@@ -354,7 +385,90 @@ def _expandwordinternal(parserobj, wordtoken, qheredocument, qdoublequotes, quot
         for node in parts:
             visitor.visit(node)
 
-    return parts, istring
+    yield parts, istring
+
+# characters that _expandwordinternal does something with
+_expandable = re.compile(r'''[<>~$`\\"']''')
+
+def _expandwordshallow(wordtoken, qdoublequotes):
+    '''return the word that _expandwordinternal returns for wordtoken (that
+    is, after quote removal), without parsing the substitutions in it or
+    building any nodes'''
+    string = wordtoken.value
+    if not _expandable.search(string):
+        return string
+
+    istring = []
+    i = 0
+    n = len(string)
+    while i < n:
+        c = string[i]
+        if c in '<>':
+            if i + 1 < n and string[i+1] == '(' and not qdoublequotes:
+                j = scanner.skipsubstitution(string, i)
+            else:
+                j = i + 1
+            istring.append(string[i:j])
+            i = j
+        elif c == '~':
+            j = i + 1
+            if i == 0 and not qdoublequotes:
+                stopatcolon = wordtoken.flags & set([flags.word.ASSIGNRHS,
+                                                    flags.word.ASSIGNMENT,
+                                                    flags.word.TILDEEXP])
+                while j < n and string[j] not in "/\\'\"":
+                    if stopatcolon and string[j] == ':':
+                        break
+                    j += 1
+            istring.append(string[i:j])
+            i = j
+        elif c == '$' and n > 1:
+            c = string[i+1] if i + 1 < n else None
+            # like the full expansion, raise for arithmetic rather than
+            # pass over it
+            if c == '[':
+                raise NotImplementedError('arithmetic substitution')
+            elif c == '(' and string.startswith('(', i + 2):
+                raise NotImplementedError('arithmetic expansion')
+            if c == '(':
+                j = scanner.skipsubstitution(string, i)
+            elif c == '{':
+                j = string.find('}', i + 2) + 1 or n
+            elif c and c in '0123456789$#?-!*@':
+                j = i + 2
+            else:
+                j = i + 1
+                while j < n and (string[j].isalnum() or string[j] == '_'):
+                    j += 1
+            istring.append(string[i:j])
+            i = j
+        elif c == '`':
+            if string.startswith('``', i):
+                j = i + 2
+            else:
+                j = scanner.skipsubstitution(string, i)
+            istring.append(string[i:j])
+            i = j
+        elif c == '\\':
+            istring.append(string[i+1:i+2])
+            i += 2
+        elif c == '"':
+            i += 1
+        elif c == "'":
+            # entire string surronded by single quotes
+            if i == 0 and string[-1] == "'":
+                return string[1:-1]
+            if qdoublequotes:
+                istring.append(c)
+            i += 1
+        else:
+            j = i + 1
+            # copy a run of characters that need no special handling
+            m = _expandable.search(string, j)
+            j = m.start() if m else n
+            istring.append(string[i:j])
+            i = j
+    return ''.join(istring)
 
 def _stringextract(string, sindex, charlist, sxvarname=False):
     found = False
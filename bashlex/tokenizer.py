@@ -1,4 +1,4 @@
-import re, collections, enum
+import re, bisect, collections, enum
 
 from bashlex import flags, shutils, utils, errors, heredoc, state
 
@@ -14,6 +14,10 @@ _addsyntax('"`\'', 'quote')
 _addsyntax('$<>', 'exp')
 _addsyntax("()<>;&| \t\n", 'break')
 
+# characters that aren't a quote, expansion, break or backslash, so
+# _readtokenword just appends them to the word
+_plainword = re.compile(r'''[^\\"'`$<>();&| \t\n]*''')
+
 def _shellblank(c):
     return c in ' \t'
 
@@ -128,11 +132,15 @@ valid_reserved_first_command = {
 }
 
 class MatchedPairError(errors.ParsingError):
-    def __init__(self, startline, message, tokenizer):
+    def __init__(self, startline, message, tokenizer, close=None, start=None):
         # TODO use startline?
         super(MatchedPairError, self).__init__(message,
                                                tokenizer.source,
                                                tokenizer._shell_input_line_index - 1)
+        # the character we were looking for
+        self.close = close
+        # where the unclosed pair starts (its $ if it has one)
+        self.start = start
 
 wordflags = flags.word
 parserflags = flags.parser
@@ -236,7 +244,36 @@ class tokenizer(object):
         # hack: the tokenizer needs access to the stack of redirection
         # nodes when it reads heredocs. this instance is shared between
         # the tokenizer and the parser, which also needs it
-        self.redirstack = []
+        self.redirstack = collections.deque()
+        # the profile.stats of the parser using this tokenizer, or None
+        self._profile = None
+
+    def snapshot(self):
+        '''capture the state of the tokenizer between two tokens, use restore
+        to go back to it'''
+        return (self._shell_input_line_index, self._eol_ungetc_lookahead,
+                self._token_to_read, self._current_token, self._last_read_token,
+                self._token_before_that, self._two_tokens_ago, list(self._dstack),
+                list(self._parserstate), list(self.redirstack),
+                self._open_brace_count, self._esacs_needed_count,
+                list(self._positions), self._line_number,
+                getattr(self, '_function_dstart', None))
+
+    def restore(self, snapshot):
+        (self._shell_input_line_index, self._eol_ungetc_lookahead,
+         self._token_to_read, self._current_token, self._last_read_token,
+         self._token_before_that, self._two_tokens_ago, dstack, parserstate,
+         redirstack, self._open_brace_count, self._esacs_needed_count,
+         positions, self._line_number, self._function_dstart) = snapshot
+
+        # the parser holds on to these, so update them in place
+        self._dstack[:] = dstack
+        self._parserstate.clear()
+        for flag in parserstate:
+            self._parserstate.add(flag)
+        self.redirstack.clear()
+        self.redirstack.extend(redirstack)
+        self._positions[:] = positions
 
     @property
     def source(self):
@@ -519,6 +556,17 @@ class tokenizer(object):
                     else:
                         handleescapedchar()
 
+                        # the characters that follow and have no special
+                        # meaning would each go through the loop above only
+                        # to be appended, take all of them at once
+                        if self._eol_ungetc_lookahead is None:
+                            m = _plainword.match(self._shell_input_line, self._shell_input_line_index)
+                            run = m.group()
+                            if run:
+                                tokenword.append(run)
+                                d['all_digit_token'] &= run.isdigit()
+                                self._shell_input_line_index = m.end()
+
             # got_character
             # got_escaped_character
 
@@ -607,11 +655,35 @@ class tokenizer(object):
 
     def _parse_comsub(self, doublequotes, open, close, parsingcommand=False,
                       dquote=False, firstclose=False):
+        # the scans yield the scan of a nested pair, see utils.run
+        return utils.run(self._comsub(doublequotes, open, close,
+                                      parsingcommand, dquote, firstclose))
+
+    def _parse_matched_pair(self, doublequotes, open, close, parsingcommand=False, allowesc=False, dquote=False, firstclose=False, dolbrace=False, arraysub=False):
+        return utils.run(self._matchedpair(doublequotes, open, close,
+                                           parsingcommand, allowesc, dquote,
+                                           firstclose, dolbrace, arraysub))
+
+    def _pairstart(self, open):
+        '''where the pair whose opening character was just read starts,
+        including the $ of $( ${ $[ and the < or > of a process substitution'''
+        start = self._shell_input_line_index - 1
+        if start > 0 and open in '({[':
+            before = self._shell_input_line[start - 1]
+            if before == '$' or (open == '(' and before in '<>'):
+                start -= 1
+        return start
+
+    def _comsub(self, doublequotes, open, close, parsingcommand=False,
+                dquote=False, firstclose=False):
+        start = self._pairstart(open)
         peekc = self._getc(False)
         self._ungetc(peekc)
 
         if peekc == '(':
-            return self._parse_matched_pair(doublequotes, open, close)
+            ret = yield self._matchedpair(doublequotes, open, close)
+            yield ret
+            return
 
         count = 1
         dollarok = True
@@ -634,7 +706,7 @@ class tokenizer(object):
             c = self._getc(doublequotes != "'" and not insidecomment and not passnextchar)
 
             if c is None:
-                raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self)
+                raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self, close, start)
 
             # bashlex/parse.y L3571
             if c == '\n':
@@ -723,7 +795,7 @@ class tokenizer(object):
                     lexrwlen = 0
                     continue
                 elif c is None:
-                    raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self) # pragma: no coverage
+                    raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self, close, start) # pragma: no coverage
                 else:
                     ret = ret[:-1]
                     self._ungetc(peekc)
@@ -755,12 +827,12 @@ class tokenizer(object):
                 ret += c
                 peekc = self._getc(True)
                 if peekc is None:
-                    raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self)
+                    raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self, close, start)
                 if peekc == c:
                     ret += peekc
                     peekc = self._getc(True)
                     if peekc is None:
-                        raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self)
+                        raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self, close, start)
                     elif peekc == '-':
                         ret += peekc
                         stripdoc = True
@@ -796,12 +868,12 @@ class tokenizer(object):
                 self._push_delimiter(c)
                 try:
                     if wasdollar and c == "'":
-                        nestret = self._parse_matched_pair(c, c, c,
-                                                           allowesc=True,
-                                                           dquote=True)
+                        nestret = yield self._matchedpair(c, c, c,
+                                                          allowesc=True,
+                                                          dquote=True)
                     else:
-                        nestret = self._parse_matched_pair(c, c, c,
-                                                           dquote=True)
+                        nestret = yield self._matchedpair(c, c, c,
+                                                          dquote=True)
                 finally:
                     self._pop_delimiter()
 
@@ -820,25 +892,25 @@ class tokenizer(object):
                 if not insidecase and open == c:
                     count -= 1
                 if c == '(':
-                    nestret = self._parse_comsub(None, '(', ')',
+                    nestret = yield self._comsub(None, '(', ')',
                                                  parsingcommand=True,
                                                  dquote=False)
                 elif c == '{':
-                    nestret = self._parse_matched_pair(None, '{', '}',
-                                                       firstclose=True,
-                                                       dolbrace=True,
-                                                       dquote=True)
+                    nestret = yield self._matchedpair(None, '{', '}',
+                                                      firstclose=True,
+                                                      dolbrace=True,
+                                                      dquote=True)
                 elif c == '[':
-                    nestret = self._parse_matched_pair(None, '[', ']',
-                                                       dquote=True)
+                    nestret = yield self._matchedpair(None, '[', ']',
+                                                      dquote=True)
 
                 ret += nestret
 
             wasdollar = c == '$'
 
-        return ret
+        yield ret
 
-    def _parse_matched_pair(self, doublequotes, open, close, parsingcommand=False, allowesc=False, dquote=False, firstclose=False, dolbrace=False, arraysub=False):
+    def _matchedpair(self, doublequotes, open, close, parsingcommand=False, allowesc=False, dquote=False, firstclose=False, dolbrace=False, arraysub=False):
         count = 1
         dolbracestate = ''
         if dolbrace:
@@ -853,33 +925,35 @@ class tokenizer(object):
 
         rdquote = True if doublequotes == '"' else dquote
         passnextchar = False
+        start = self._pairstart(open)
         startlineno = self._line_number
 
         ret = ''
 
+        # returns the scan for the nested pair
         def handledollarword():
             if open == c:
                 count -= 1
 
             # bashlex/parse.y L3486
             if c == '(':
-                return self._parse_comsub(None, '(', ')',
-                                          parsingcommand=True,
-                                          dquote=False)
+                return self._comsub(None, '(', ')',
+                                    parsingcommand=True,
+                                    dquote=False)
             elif c == '{':
-                return self._parse_matched_pair(None, '{', '}',
-                                                firstclose=True,
-                                                dquote=rdquote,
-                                                dolbrace=True)
+                return self._matchedpair(None, '{', '}',
+                                         firstclose=True,
+                                         dquote=rdquote,
+                                         dolbrace=True)
             elif c == '[':
-                return self._parse_matched_pair(None, '[', ']', dquote=rdquote)
+                return self._matchedpair(None, '[', ']', dquote=rdquote)
             else:
                 assert False # pragma: no cover
 
         while count:
             c = self._getc(doublequotes != "'" and not passnextchar)
             if c is None:
-                raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self)
+                raise MatchedPairError(startlineno, 'unexpected EOF while looking for matching %r' % close, self, close, start)
 
             # bashlex/parse.y L3285
             # if c == '\n':
@@ -940,9 +1014,9 @@ class tokenizer(object):
                     self._push_delimiter(c)
                     try:
                         if sawdollar and "'":
-                            nestret = self._parse_matched_pair(c, c, c, parsingcommand=parsingcommand, allowesc=True, dquote=dquote, firstclose=firstclose, dolbrace=dolbrace)
+                            nestret = yield self._matchedpair(c, c, c, parsingcommand=parsingcommand, allowesc=True, dquote=dquote, firstclose=firstclose, dolbrace=dolbrace)
                         else:
-                            nestret = self._parse_matched_pair(c, c, c, parsingcommand=parsingcommand, allowesc=allowesc, dquote=dquote, firstclose=firstclose, dolbrace=dolbrace)
+                            nestret = yield self._matchedpair(c, c, c, parsingcommand=parsingcommand, allowesc=allowesc, dquote=dquote, firstclose=firstclose, dolbrace=dolbrace)
                     finally:
                         self._pop_delimiter()
 
@@ -955,15 +1029,15 @@ class tokenizer(object):
                     ret += nestret
                 elif arraysub and sawdollar and c in '({[':
                     # goto parse_dollar_word
-                    ret += handledollarword()
+                    ret += yield handledollarword()
             elif open == '"' and c == '`':
-                ret += self._parse_matched_pair(None, '`', '`', parsingcommand=parsingcommand, allowesc=allowesc, dquote=dquote, firstclose=firstclose, dolbrace=dolbrace)
+                ret += yield self._matchedpair(None, '`', '`', parsingcommand=parsingcommand, allowesc=allowesc, dquote=dquote, firstclose=firstclose, dolbrace=dolbrace)
             elif open != '`' and sawdollar and c in '({[':
-                ret += handledollarword()
+                ret += yield handledollarword()
 
             sawdollar = c == '$'
 
-        return ret
+        yield ret
 
 
     def _is_assignment(self, value, iscompassign):
@@ -1032,29 +1106,27 @@ class tokenizer(object):
             return c
 
         # bash/parse.y L2220
-
-        while True:
-            if self._shell_input_line_index < len(self._shell_input_line):
-                c = self._shell_input_line[self._shell_input_line_index]
-                self._shell_input_line_index += 1
-            else:
-                c = None
-
-            if c == '\\' and remove_quoted_newline and self._shell_input_line[self._shell_input_line_index] == '\n':
-                self._line_number += 1
-                # skip past the newline
-                self._shell_input_line_index += 1
-                continue
-            else:
-                return c
-
-            #if c is None and self._shell_input_line_terminator is None:
-            #    if self._shell_input_line_index != 0:
-            #        return '\n'
-            #    else:
-            #        return None
-
-            #return c
+        line = self._shell_input_line
+        index = self._shell_input_line_index
+        if index >= len(line):
+            return None
+        c = line[index]
+        index += 1
+
+        # parse(removecontinuations=True) removes them up front when it
+        # can (see removecontinuations), then this loop never runs
+        while c == '\\' and remove_quoted_newline and line[index] == '\n':
+            self._line_number += 1
+            # skip past the newline
+            index += 1
+            if index >= len(line):
+                self._shell_input_line_index = index
+                return None
+            c = line[index]
+            index += 1
+
+        self._shell_input_line_index = index
+        return c
 
     def _discard_until(self, character):
         c = self._getc(False)
@@ -1158,3 +1230,111 @@ class tokenizer(object):
 
         if self._parserstate & parserflags.CONDEXPR and tokstr == ']]':
             return tokentype.COND_END
+
+_continuationscan = re.compile(r'\\[\s\S]|[#\n]')
+
+def removecontinuations(s):
+    '''remove the line continuations (backslash newline) from s in one go
+
+    returns the string without them and a sorted list of the indices in it
+    where one was removed (see positionmap), or None if that can't be done
+    without tokenizing s: a backslash newline isn't a continuation in single
+    quotes, comments or some here documents, so inputs that have those are
+    left alone (as are inputs that end with one, which the tokenizer reads
+    differently at the end of the input).
+
+    >>> removecontinuations('a \\\\\\nb \\\\\\\\\\nc\\\\\\nd')
+    ('a b \\\\\\\\\\ncd', [2, 8])
+    >>> removecontinuations("a \\\\\\n'b'") is None
+    True
+    '''
+    if '\\\n' not in s:
+        return s, []
+    if "'" in s or '<<' in s or s.endswith('\\\n'):
+        return None
+
+    chunks = []
+    removed = []
+    start = 0
+    comment = False
+    for m in _continuationscan.finditer(s):
+        c = m.group()
+        if c == '\\\n':
+            if comment:
+                return None
+            chunks.append(s[start:m.start()])
+            removed.append(m.start() - 2 * len(removed))
+            start = m.end()
+        elif c == '#':
+            # maybe the start of a comment, which ends at the next newline
+            # that isn't a continuation
+            comment = True
+        elif c == '\n':
+            comment = False
+    chunks.append(s[start:])
+    return ''.join(chunks), removed
+
+def positionmap(removed, end=False):
+    '''a function that maps an index in the string returned by
+    removecontinuations to the index in the original string
+
+    with end set it maps end positions (one past the last character of
+    something), which stay before a continuation that was removed right
+    where they are rather than move past it
+
+    >>> removecontinuations('a &&\\\\\\nb')
+    ('a &&b', [4])
+    >>> positionmap([4])(4), positionmap([4], end=True)(4)
+    (6, 4)
+    '''
+    if not removed:
+        return lambda i: i
+    if end:
+        return lambda i: i + 2 * bisect.bisect_left(removed, i)
+    return lambda i: i + 2 * bisect.bisect_right(removed, i)
+
+tokenrecord = collections.namedtuple('tokenrecord', ['type', 'value', 'start', 'end', 'flags'])
+
+def tokenize(s, expand=False, strictmode=True):
+    '''generate a tokenrecord for every token of s, as the tokenizer reads
+    them without the parser
+
+    >>> [(t.type, t.value, t.start, t.end) for t in tokenize('a "$b" 2>f')]
+    [('WORD', 'a', 0, 1), ('WORD', '"$b"', 2, 6), ('NUMBER', 2, 7, 8), ('GREATER', '>', 8, 9), ('WORD', 'f', 9, 10)]
+    >>> [t.value for t in tokenize('a "b $(c)"', expand=True)]
+    ['a', 'b $(c)']
+
+    type is the name of the tokentype, value is the text of the token (the
+    file descriptor for NUMBER), start and end are its position in s and
+    flags the set of flags.word it has. words are left as they are in s,
+    unless expand is set: then the value of a WORD is what bashlex.split
+    returns for it (quotes removed, substitutions in it parsed, which is a
+    lot slower).
+
+    s can be bytes, in which case values are bytes and positions are byte
+    offsets. since there's no parser, here document bodies are tokenized as
+    if they were commands, like bashlex.split does.'''
+    if isinstance(s, (bytes, bytearray)) and not isinstance(s, str):
+        for t in tokenize(bytes(s).decode('latin-1'), expand, strictmode):
+            value = t.value
+            if hasattr(value, 'encode'):
+                value = value.encode('latin-1')
+            yield tokenrecord(t.type, value, t.start, t.end, t.flags)
+        return
+
+    if not expand:
+        tok = tokenizer(s, state.parserstate(), strictmode=strictmode)
+        for t in tok:
+            yield tokenrecord(t.ttype.name, t.value, t.lexpos, t.endlexpos, t.flags)
+        return
+
+    # expanding words needs the parser, so only import it now
+    from bashlex import parser, subst
+    p = parser._parser(s, strictmode=strictmode)
+    for t in p.tok:
+        value = t.value
+        if t.ttype == tokentype.WORD:
+            quoted = bool(t.flags & flags.word.QUOTED)
+            doublequoted = quoted and value[0] == '"'
+            parts, value = utils.run(subst._expandwordinternal(p, t, 0, doublequoted, 0, 0))
+        yield tokenrecord(t.ttype.name, value, t.lexpos, t.endlexpos, t.flags)
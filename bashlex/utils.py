@@ -1,3 +1,5 @@
+import types
+
 try:
     from collections.abc import MutableSet, Mapping
 except ImportError:
@@ -31,7 +33,11 @@ class typedset(MutableSet):
 
     def __and__(self, value):
         if isinstance(value, self._type):
-            value = set([value])
+            # the tokenizer tests single flags all the time, skip building
+            # a set to intersect with when the flag isn't there
+            if value in self._s:
+                return set([value])
+            return set()
         return self._s.__and__(value)
 
     def __or__(self, value):
@@ -72,3 +78,39 @@ class frozendict(Mapping):
 
     def __repr__(self):
         return '<frozendict %s>' % repr(self.__dict)
+
+def run(generator):
+    '''run generator, which calls other generators by yielding them: the one
+    that's yielded is run (and so on) and the value it returns is sent back.
+    a generator returns a value by yielding anything that isn't a generator
+    (or None by finishing), exceptions are passed up as they would be by
+    calls. the generators are kept on a list rather than the call stack, so
+    how deep they call each other isn't limited by the recursion limit'''
+    stack = [generator]
+    value = error = None
+    while True:
+        try:
+            if error is not None:
+                e, error = error, None
+                x = stack[-1].throw(e)
+            else:
+                x = stack[-1].send(value)
+        except StopIteration:
+            stack.pop()
+            x = None
+        except Exception as e:
+            stack.pop()
+            if not stack:
+                raise
+            error = e
+            continue
+        else:
+            if isinstance(x, types.GeneratorType):
+                stack.append(x)
+                value = None
+                continue
+            stack.pop().close()
+
+        if not stack:
+            return x
+        value = x
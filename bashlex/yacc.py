@@ -282,7 +282,17 @@ class LRParser:
     # tracking.  In this mode, symbols will record the starting/ending line number and
     # character index.
 
-    def parse(self, input=None, lexer=None, debug=False, tracking=False, context=None):
+    def parse(self, input=None, lexer=None, debug=False, tracking=False, context=None,
+              resume=False):
+        # bashlex: see parsegen
+        return utils.run(self.parsegen(input, lexer, debug, tracking, context, resume))
+
+    def parsegen(self, input=None, lexer=None, debug=False, tracking=False, context=None,
+                 resume=False):
+        # bashlex: parse as a generator for utils.run. an action can be a
+        # generator too (e.g. to parse a substitution in a word, which
+        # yields this generator for another parser), it's yielded to be run
+        # before going on
         # If debugging has been specified as a flag, turn it into a logging object
         if isinstance(debug, int) and debug:
             debug = PlyLogger(sys.stderr)
@@ -316,24 +326,34 @@ class LRParser:
         # Set the token function
         get_token = self.token = lexer.token
 
-        # Set up the state and symbol stacks
-        statestack = self.statestack = []   # Stack of parsing states
-        symstack = self.symstack = []       # Stack of grammar symbols
-        pslice.stack = symstack             # Put in the production
         errtoken   = None                   # Err token
 
-        # The start state is assumed to be (0,$end)
+        if resume:
+            # bashlex: continue with the stacks of a previous call to parse
+            # that stopped because the lexer raised while reading the next
+            # token
+            statestack = self.statestack
+            symstack = self.symstack
+            pslice.stack = symstack
+            state = statestack[-1]
+        else:
+            # Set up the state and symbol stacks
+            statestack = self.statestack = []   # Stack of parsing states
+            symstack = self.symstack = []       # Stack of grammar symbols
+            pslice.stack = symstack             # Put in the production
+
+            # The start state is assumed to be (0,$end)
+
+            statestack.append(0)
+            sym = YaccSymbol()
+            sym.type = '$end'
+            symstack.append(sym)
+            state = 0
 
-        statestack.append(0)
-        sym = YaccSymbol()
-        sym.type = '$end'
-        symstack.append(sym)
-        state = 0
-                
         # get number assignment to newline action
         # cannot hardcode as python2 and python3 produce different
         # numbers
-        newline = actions[state].get('NEWLINE')
+        newline = actions[0].get('NEWLINE')
         while True:
             # Get the next symbol on the input.  If a lookahead symbol
             # is already set, we just use that. Otherwise, we'll pull
@@ -436,7 +456,9 @@ class LRParser:
                             del symstack[-plen:]
                             self.state = state
                             try:
-                                p.callable(pslice)
+                                r = p.callable(pslice)
+                                if type(r) is types.GeneratorType:
+                                    yield r
                             except YaccAccept:
                                 accept = True
                             del statestack[-plen:]
@@ -478,7 +500,9 @@ class LRParser:
                         try:
                             # Call the grammar rule with our special slice object
                             self.state = state
-                            p.callable(pslice)
+                            r = p.callable(pslice)
+                            if type(r) is types.GeneratorType:
+                                yield r
                             if debug:
                                 debug.info('Result : %s', format_result(pslice[0]))
                             symstack.append(sym)
@@ -505,7 +529,8 @@ class LRParser:
                         debug.info('Done   : Returning %s', format_result(result))
                         debug.info('PLY: PARSE DEBUG END')
 
-                    return result
+                    yield result
+                    return
 
             if t is None:
 
@@ -531,7 +556,9 @@ class LRParser:
                         # errtoken = None               # End of file!
                         pass
                     if self.errorfunc:
-                        if errtoken and not hasattr(errtoken, 'lexer'):
+                        # bashlex: always set it, the EOF token is a singleton
+                        # that is shared between lexers
+                        if errtoken:
                             errtoken.lexer = lexer
                         self.state = state
                         tok = self.errorfunc(errtoken)
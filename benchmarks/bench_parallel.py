@@ -0,0 +1,62 @@
+'''compare bashlex.parse with and without workers on a large generated script
+
+    $ python benchmarks/bench_parallel.py --size 2000000 --workers 4
+'''
+
+import argparse, multiprocessing, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import parser
+
+# a mix of constructs that span lines, so chunk boundaries have to be
+# chosen with some care
+_pieces = [
+    'echo "installing $name" >> "$log"\n',
+    'if [ -f /etc/%(i)d ]; then\n  cp /etc/%(i)d /tmp/%(i)d\nelse\n  touch /tmp/%(i)d\nfi\n',
+    'cat <<EOF > /tmp/conf%(i)d\nkey=%(i)d\nif then fi (\nEOF\n',
+    'for f in a b c; do\n  grep -q "$f" $(ls /var/%(i)d) || echo missing\ndone\n',
+    'f%(i)d() {\n  local x=$1\n  echo "${x:-default}" | tr a-z A-Z\n}\n',
+    'case "$1" in\n  start) run %(i)d ;;\n  stop|kill) halt ;;\nesac\n',
+    'tar -czf /tmp/%(i)d.tgz \\\n  --exclude=.git \\\n  /srv/%(i)d\n',
+]
+
+def generate(size):
+    parts = []
+    total = i = 0
+    while total < size:
+        piece = _pieces[i % len(_pieces)] % {'i' : i}
+        parts.append(piece)
+        total += len(piece)
+        i += 1
+    return ''.join(parts)
+
+def timeit(f, repeat=1):
+    '''the best time of repeat calls to f, and what it returned'''
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        result = f()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best, result
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--size', type=int, default=1000000,
+                           help='size of the generated script in characters')
+    argparser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    args = argparser.parse_args(argv)
+
+    s = generate(args.size)
+    sequential, expected = timeit(lambda: parser.parse(s))
+    parallel, trees = timeit(lambda: parser.parse(s, workers=args.workers))
+    assert trees == expected, 'parallel parse returned a different result'
+
+    print('%d characters, %d top level nodes' % (len(s), len(expected)))
+    print('sequential      %8.2fs' % sequential)
+    print('%2d workers      %8.2fs (%.2fx)' % (args.workers, parallel, sequential / parallel))
+
+if __name__ == '__main__':
+    main()
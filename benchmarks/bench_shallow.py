@@ -0,0 +1,59 @@
+'''compare parsing a large generated script fully, with expansionlimit=0 and
+in shallow mode, and listing its commands with bashlex.commands
+
+    $ python benchmarks/bench_shallow.py --size 1000000
+'''
+
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import parser
+
+from bench_parallel import generate, timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def measure(f, repeat):
+    '''time f and the peak memory it allocates, if we can tell'''
+    duration, result = timeit(f, repeat)
+    if tracemalloc is None:
+        return duration, None, result
+    tracemalloc.start()
+    try:
+        f()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return duration, peak, result
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--size', type=int, default=200000,
+                           help='size of the generated script in characters')
+    argparser.add_argument('--repeat', type=int, default=3,
+                           help='report the best of this many runs')
+    args = argparser.parse_args(argv)
+
+    s = generate(args.size)
+    runs = [
+        ('parse', lambda: parser.parse(s)),
+        ('expansionlimit=0', lambda: parser.parse(s, expansionlimit=0)),
+        ('shallow', lambda: parser.parse(s, shallow=True)),
+        ('commands', lambda: list(parser.commands(s))),
+    ]
+
+    print('%d characters' % len(s))
+    base = None
+    for name, f in runs:
+        duration, peak, result = measure(f, args.repeat)
+        if base is None:
+            base = duration
+        memory = '%8.1fMB' % (peak / 1e6) if peak is not None else ''
+        print('%-18s %8.2fs (%.2fx) %s' % (name, duration, base / duration, memory))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''compare calling bashlex.split on every line of a generated shell history
+with bashlex.split_many
+
+    $ python benchmarks/bench_split_many.py --lines 1000000 --workers 4
+'''
+
+import argparse, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import parser
+
+from bench_parallel import timeit
+
+# a history mostly repeats a few commands, and most of them are plain words
+_common = ['ls', 'ls -la', 'git status', 'git diff', 'cd ..', 'make -j8', 'vim setup.py',
+           'git commit -m "fix tests"', 'grep -rn "TODO" .', 'echo $PATH']
+_rare = ['cd /srv/app%(i)d', 'ssh host%(i)d uptime', 'kill -9 %(i)d',
+         'git checkout -b "topic-%(i)d"', 'find . -name "*.%(i)d" | xargs rm',
+         'for f in *.log; do gzip "$f"; done # %(i)d', 'tar xzf release-%(i)d.tgz']
+
+def generate(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        if rng.random() < 0.7:
+            lines.append(rng.choice(_common))
+        else:
+            lines.append(rng.choice(_rare) % {'i' : rng.randint(0, count)})
+    return lines
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--lines', type=int, default=100000,
+                           help='number of history lines to generate')
+    argparser.add_argument('--workers', type=int, default=2)
+    argparser.add_argument('--repeat', type=int, default=3,
+                           help='report the best of this many runs')
+    args = argparser.parse_args(argv)
+
+    lines = generate(args.lines)
+
+    def eachline():
+        result = []
+        for line in lines:
+            try:
+                result.append(list(parser.split(line)))
+            except Exception as e:
+                result.append(e)
+        return result
+
+    runs = [
+        ('split', eachline),
+        ('split_many', lambda: parser.split_many(lines)),
+        ('split_many(workers=%d)' % args.workers,
+         lambda: parser.split_many(lines, workers=args.workers)),
+    ]
+
+    print('%d lines, %d distinct' % (len(lines), len(set(lines))))
+    base = None
+    for name, f in runs:
+        duration, result = timeit(f, args.repeat)
+        if base is None:
+            base = duration
+        print('%-24s %8.2fs (%.2fx) %10.0f lines/s' % (name, duration, base / duration,
+                                                     len(lines) / duration))
+
+if __name__ == '__main__':
+    main()
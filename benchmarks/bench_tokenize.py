@@ -0,0 +1,40 @@
+'''compare the throughput of bashlex.tokenize, with and without expand, to
+bashlex.split and shlex.split on a large generated script
+
+    $ python benchmarks/bench_tokenize.py --size 1000000
+'''
+
+import argparse, os, shlex, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import parser, tokenizer
+
+from bench_parallel import generate, timeit
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--size', type=int, default=200000,
+                           help='size of the generated script in characters')
+    argparser.add_argument('--repeat', type=int, default=3,
+                           help='report the best of this many runs')
+    args = argparser.parse_args(argv)
+
+    s = generate(args.size)
+    b = s.encode('utf-8')
+    runs = [
+        ('shlex.split', lambda: len(shlex.split(s))),
+        ('bashlex.split', lambda: len(list(parser.split(s)))),
+        ('tokenize(expand)', lambda: len(list(tokenizer.tokenize(s, expand=True)))),
+        ('tokenize', lambda: len(list(tokenizer.tokenize(s)))),
+        ('tokenize(bytes)', lambda: len(list(tokenizer.tokenize(b)))),
+    ]
+
+    print('%d characters' % len(s))
+    for name, f in runs:
+        duration, count = timeit(f, args.repeat)
+        print('%-18s %8.3fs %8d tokens %8.2fMB/s' % (name, duration, count,
+                                                   len(s) / duration / 1e6))
+
+if __name__ == '__main__':
+    main()
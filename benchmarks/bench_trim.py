@@ -0,0 +1,77 @@
+'''compare the memory the trees of a large generated script hold on to, and
+the time it takes to walk them, with and without trimming (parse's keep)
+
+    $ python benchmarks/bench_trim.py --size 1000000
+'''
+
+import argparse, gc, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import ast, parser
+
+from bench_parallel import generate, timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+class counter(ast.nodevisitor):
+    def __init__(self):
+        self.count = 0
+
+    def visitnode(self, n):
+        self.count += 1
+
+def walk(trees):
+    c = counter()
+    for tree in trees:
+        c.visit(tree)
+    return c.count
+
+def retained(f):
+    '''the memory still allocated by what f returns, if we can tell'''
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = f()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--size', type=int, default=200000,
+                           help='size of the generated script in characters')
+    argparser.add_argument('--repeat', type=int, default=3,
+                           help='report the best of this many runs')
+    args = argparser.parse_args(argv)
+
+    s = generate(args.size)
+    runs = [
+        ('parse', None),
+        ("keep=('operator',)", ('operator',)),
+        ('keep=()', ()),
+    ]
+
+    print('%d characters' % len(s))
+    base = None
+    for name, keep in runs:
+        f = lambda: parser.parse(s, keep=keep)
+        size = retained(f)
+        trees = f()
+        duration, count = timeit(lambda: walk(trees), args.repeat)
+        if base is None:
+            base = duration
+        memory = '%8.1fMB' % (size / 1e6) if size is not None else ''
+        print('%-20s %8d nodes %s, walked in %.3fs (%.2fx)' % (name, count, memory,
+                                                              duration, base / duration))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+'''compare bashlex.validate with bashlex.parse on a large generated script
+
+    $ python benchmarks/bench_validate.py --size 1000000
+'''
+
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import parser
+
+from bench_parallel import generate, timeit
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--size', type=int, default=200000,
+                           help='size of the generated script in characters')
+    args = argparser.parse_args(argv)
+
+    s = generate(args.size)
+    parsing, trees = timeit(lambda: parser.parse(s))
+    validating, error = timeit(lambda: parser.validate(s))
+    assert error is None, error
+
+    print('%d characters, %d top level nodes' % (len(s), len(trees)))
+    print('parse           %8.2fs %8.0f characters/s' % (parsing, len(s) / parsing))
+    print('validate        %8.2fs %8.0f characters/s (%.2fx)' % (validating, len(s) / validating,
+                                                                parsing / validating))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''check that parsing grows no faster than it should along each axis inputs
+get bigger in: parse a family of inputs at increasing sizes, fit the growth
+exponent and fail when it's above the bound the axis declares
+
+    $ python benchmarks/complexity.py
+    $ python benchmarks/complexity.py --axis pipeline --axis depth --scale 10
+
+the exponent is the slope of log(time) over log(size), the least squares
+fit over the sizes (1k, 10k and 100k unless the axis says otherwise, divided
+by --scale). a linear axis fits to about 1, constant costs pull it below that
+at small sizes.
+'''
+
+import argparse, gc, math, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bashlex import parser
+
+timer = getattr(time, 'process_time', time.time)
+
+class axis(object):
+    '''a family of inputs, make(n) is the one of size n'''
+    def __init__(self, name, make, bound, sizes=(1000, 10000, 100000), run=None):
+        self.name = name
+        self.make = make
+        self.bound = bound
+        self.sizes = sizes
+        self.run = run or parser.parse
+
+axes = [
+    axis('commands', lambda n: 'echo a "$b"\n' * n, 1.3),
+    axis('depth', lambda n: '( ' * n + 'x' + ' )' * n, 1.3),
+    axis('parameterdepth', lambda n: 'echo ' + '${a:-' * n + 'x' + '}' * n, 1.3),
+    axis('wordlength', lambda n: 'echo "$a' + 'x' * n + '"', 1.3),
+    axis('substitutions', lambda n: 'echo "' + '$(a)' * n + '"', 1.3),
+    axis('heredoccount', lambda n: 'cat <<EOF\nx\nEOF\n' * n, 1.3),
+    axis('heredocsize', lambda n: 'cat <<EOF\n' + 'a line $x\n' * n + 'EOF\n', 1.3),
+    axis('operators', lambda n: 'a' + ' && a' * n, 1.3),
+    axis('pipeline', lambda n: 'a' + ' | a' * n, 1.3),
+    # each level is scanned again when the one around it is parsed (as bash
+    # does), so this one is quadratic
+    axis('commandsubstitutiondepth',
+         lambda n: 'echo ' + '$(echo ' * n + 'x' + ')' * n, 2.3, (40, 80, 160)),
+]
+
+def measure(f, mintime=0.1):
+    '''the time a call to f takes, the best of a few runs of calls that take
+    at least mintime (but only one run when a call takes a second)'''
+    best = None
+    for i in range(3):
+        gc.collect()
+        count = 0
+        start = timer()
+        while True:
+            f()
+            count += 1
+            elapsed = timer() - start
+            if elapsed >= mintime:
+                break
+        if best is None or elapsed / count < best:
+            best = elapsed / count
+        if elapsed > 1:
+            break
+    return best
+
+def exponent(points):
+    '''the least squares slope of log(seconds) over log(size) for a list of
+    (size, seconds)'''
+    xs = [math.log(n) for n, t in points]
+    ys = [math.log(max(t, 1e-9)) for n, t in points]
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    num = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    den = sum((x - mx) ** 2 for x in xs)
+    return num / den
+
+def check(names=None, scale=1, out=None, mintime=0.1):
+    '''measure the axes (all of them or the ones in names), returns a list of
+    (axis, points, exponent) for each'''
+    results = []
+    for a in axes:
+        if names and a.name not in names:
+            continue
+        points = []
+        for size in a.sizes:
+            n = max(1, size // scale)
+            s = a.make(n)
+            points.append((n, measure(lambda: a.run(s), mintime)))
+        e = exponent(points)
+        results.append((a, points, e))
+        if out is not None:
+            sizes = ' '.join('%d:%.4fs' % p for p in points)
+            mark = 'ok' if e <= a.bound else 'TOO SLOW'
+            out.write('%-26s %5.2f (bound %.1f) %-8s %s\n' % (a.name, e, a.bound, mark, sizes))
+            out.flush()
+    return results
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--axis', action='append', dest='names',
+                           choices=[a.name for a in axes],
+                           help='only measure these axes')
+    argparser.add_argument('--scale', type=int, default=1,
+                           help='divide the sizes by this')
+    args = argparser.parse_args(argv)
+
+    results = check(args.names, args.scale, sys.stdout)
+    failed = [a.name for a, points, e in results if e > a.bound]
+    if failed:
+        sys.stderr.write('grows faster than its bound: %s\n' % ', '.join(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/bin/bash
+# rotate database dumps and sync them off the host
+
+DEST=/srv/backups
+REMOTE=backup@storage.example.com:/backups/$(hostname -s)
+KEEP_DAILY=7
+KEEP_WEEKLY=4
+STAMP=$(date +%Y%m%d-%H%M%S)
+LOCK=/var/lock/backup.lock
+
+exec 9> "$LOCK"
+if ! flock -n 9; then
+    echo "another backup is running" >&2
+    exit 1
+fi
+
+notify() {
+    local subject=$1
+    shift
+    mail -s "[backup $(hostname -s)] $subject" root <<MAIL
+$*
+
+disk usage:
+$(df -h "$DEST" | tail -n 1)
+MAIL
+}
+
+dump_databases() {
+    local db
+    for db in $(psql -At -c "select datname from pg_database where not datistemplate"); do
+        pg_dump -Fc "$db" > "$DEST/daily/$db-$STAMP.dump" 2>> "$DEST/errors.log" || {
+            notify "dump of $db failed" "$(tail -n 20 "$DEST/errors.log")"
+            return 1
+        }
+    done
+}
+
+rotate() {
+    local dir=$1 keep=$2
+    ls -1t "$dir"/*.dump 2>/dev/null | tail -n +`expr $keep + 1` | while read -r old; do
+        rm -f -- "$old"
+    done
+}
+
+mkdir -p "$DEST/daily" "$DEST/weekly"
+dump_databases || exit 1
+
+if [ "$(date +%u)" = 7 ]; then
+    for f in "$DEST"/daily/*-"$STAMP".dump; do
+        cp -l "$f" "$DEST/weekly/"
+    done
+fi
+
+rotate "$DEST/daily" "$KEEP_DAILY"
+rotate "$DEST/weekly" "$KEEP_WEEKLY"
+
+rsync -a --delete --partial --timeout=600 \
+    -e "ssh -i /root/.ssh/backup_key -o BatchMode=yes" \
+    "$DEST/" "$REMOTE/" > "$DEST/rsync.log" 2>&1
+status=$?
+if [ $status -ne 0 ]; then
+    notify "rsync failed with status $status" "$(tail -n 50 "$DEST/rsync.log")"
+    exit $status
+fi
+
+find "$DEST" -name '*.log' -size +10M -exec gzip -9 {} \;
@@ -0,0 +1,83 @@
+#!/bin/bash
+# a build and release script for a small C project
+
+set -e
+set -o pipefail
+
+ROOT=$(dirname "$(readlink -f "$0")")
+BUILD=${BUILD:-$ROOT/build}
+PREFIX=${PREFIX:-/usr/local}
+JOBS=${JOBS:-$(nproc 2>/dev/null)}
+VERSION=$(git -C "$ROOT" describe --tags --always --dirty 2>/dev/null)
+[ -n "$VERSION" ] || VERSION=unknown
+
+usage() {
+    cat <<USAGE
+usage: $0 [-c] [-t] [-r] [-p prefix]
+
+  -c  clean the build directory first
+  -t  run the tests after building
+  -r  make a release tarball
+  -p  install prefix (default $PREFIX)
+USAGE
+    exit 1
+}
+
+clean=
+tests=
+release=
+while getopts "ctrp:h" opt; do
+    case $opt in
+        c) clean=1 ;;
+        t) tests=1 ;;
+        r) release=1 ;;
+        p) PREFIX=$OPTARG ;;
+        *) usage ;;
+    esac
+done
+shift `expr $OPTIND - 1`
+
+if [ -n "$clean" ]; then
+    echo "cleaning $BUILD"
+    rm -rf "$BUILD"
+fi
+
+mkdir -p "$BUILD"
+cd "$BUILD"
+
+if [ ! -f Makefile ]; then
+    CFLAGS="${CFLAGS:--O2 -g}" "$ROOT/configure" --prefix="$PREFIX" \
+        --enable-shared --disable-static \
+        --with-version="$VERSION" > configure.log 2>&1 || {
+        echo "configure failed, see $BUILD/configure.log" >&2
+        tail -n 20 configure.log >&2
+        exit 1
+    }
+fi
+
+make -j"$JOBS" 2>&1 | tee make.log | grep -E '(warning|error):' || true
+
+if [ -n "$tests" ]; then
+    failed=0
+    for t in tests/test_*; do
+        [ -x "$t" ] || continue
+        name=${t##*/}
+        if "$t" > "logs/$name.out" 2>&1; then
+            printf '%-40s ok\n' "$name"
+        else
+            printf '%-40s FAILED\n' "$name"
+            failed=`expr $failed + 1`
+        fi
+    done
+    [ "$failed" -eq 0 ] || { echo "$failed tests failed" >&2; exit 1; }
+fi
+
+if [ -n "$release" ]; then
+    dist=project-${VERSION#v}
+    rm -rf "$dist" "$dist.tar.gz"
+    git -C "$ROOT" archive --prefix="$dist/" HEAD | tar -x
+    cp -p src/version.h "$dist/src/"
+    tar -czf "$dist.tar.gz" "$dist"
+    sha256sum "$dist.tar.gz" > "$dist.tar.gz.sha256"
+    echo "wrote $BUILD/$dist.tar.gz"
+fi
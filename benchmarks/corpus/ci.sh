@@ -0,0 +1,78 @@
+#!/usr/bin/env bash
+# a CI job: set up a database, run the test matrix and collect reports
+
+set -euo pipefail
+
+: "${CI_PROJECT_DIR:=$(pwd)}"
+: "${PYTHON_VERSIONS:=3.8 3.9 3.10 3.11}"
+REPORTS="$CI_PROJECT_DIR/reports"
+export PGHOST=localhost PGUSER=ci PGPASSWORD=ci PGDATABASE=ci_test
+
+section() {
+    echo -e "\e[0Ksection_start:$(date +%s):$1\r\e[0K$2"
+}
+
+section_end() {
+    echo -e "\e[0Ksection_end:$(date +%s):$1\r\e[0K"
+}
+
+cleanup() {
+    local status=$?
+    docker rm -f ci-postgres > /dev/null 2>&1 || true
+    if [ "$status" -ne 0 ]; then
+        echo "job failed with status $status" >&2
+        find "$REPORTS" -name '*.log' -newer "$CI_PROJECT_DIR/.ci-start" -print0 \
+            | xargs -0 -r tail -n 50
+    fi
+    exit "$status"
+}
+trap cleanup EXIT
+
+touch "$CI_PROJECT_DIR/.ci-start"
+mkdir -p "$REPORTS"
+
+section db "starting postgres"
+docker run -d --name ci-postgres -p 5432:5432 \
+    -e POSTGRES_USER="$PGUSER" -e POSTGRES_PASSWORD="$PGPASSWORD" \
+    -e POSTGRES_DB="$PGDATABASE" postgres:15-alpine > /dev/null
+for i in $(seq 1 30); do
+    if pg_isready -q; then
+        break
+    fi
+    sleep 1
+done
+pg_isready || { echo "postgres did not start" >&2; exit 1; }
+psql -v ON_ERROR_STOP=1 <<SQL
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE SCHEMA IF NOT EXISTS app AUTHORIZATION $PGUSER;
+SQL
+section_end db
+
+for py in $PYTHON_VERSIONS; do
+    section "py${py//./}" "python $py"
+    venv="$CI_PROJECT_DIR/.venv-$py"
+    if [ ! -d "$venv" ]; then
+        "python$py" -m venv "$venv"
+    fi
+    # shellcheck disable=SC1090
+    source "$venv/bin/activate"
+    pip install -q --upgrade pip wheel
+    pip install -q -r requirements-dev.txt -e .
+    python -m pytest -q \
+        --junitxml="$REPORTS/junit-$py.xml" \
+        --cov=app --cov-report=xml:"$REPORTS/coverage-$py.xml" \
+        2>&1 | tee "$REPORTS/pytest-$py.log"
+    deactivate
+    section_end "py${py//./}"
+done
+
+section lint "lint"
+git diff --name-only "origin/${CI_DEFAULT_BRANCH:-main}...HEAD" -- '*.py' \
+    | while read -r f; do
+        [ -f "$f" ] && echo "$f"
+    done \
+    | xargs -r flake8 --max-line-length=100 | tee "$REPORTS/flake8.log"
+section_end lint
+
+echo "reports:"
+ls -la "$REPORTS"
@@ -0,0 +1,88 @@
+#!/bin/sh
+# an init script in the style of /etc/init.d
+
+NAME=exampled
+DAEMON=/usr/sbin/$NAME
+PIDFILE=/var/run/$NAME.pid
+CONFIG=/etc/default/$NAME
+LOGDIR=/var/log/$NAME
+
+test -x "$DAEMON" || exit 0
+[ -r "$CONFIG" ] && . "$CONFIG"
+
+log() {
+    echo "$(date '+%Y-%m-%d %H:%M:%S') $NAME: $*" >> "$LOGDIR/init.log"
+}
+
+is_running() {
+    [ -f "$PIDFILE" ] || return 1
+    pid=$(cat "$PIDFILE" 2>/dev/null)
+    [ -n "$pid" ] && kill -0 "$pid" 2>/dev/null
+}
+
+do_start() {
+    if is_running; then
+        log "already running"
+        return 1
+    fi
+    mkdir -p "$LOGDIR" || return 2
+    chown "${USER:-nobody}" "$LOGDIR"
+    start-stop-daemon --start --quiet --background \
+        --make-pidfile --pidfile "$PIDFILE" \
+        --exec "$DAEMON" -- $DAEMON_OPTS || return 2
+    log "started with pid $(cat $PIDFILE)"
+}
+
+do_stop() {
+    start-stop-daemon --stop --quiet --retry=TERM/30/KILL/5 --pidfile "$PIDFILE"
+    RETVAL=$?
+    [ "$RETVAL" = 2 ] && return 2
+    rm -f "$PIDFILE"
+    log "stopped"
+    return "$RETVAL"
+}
+
+do_reload() {
+    start-stop-daemon --stop --signal 1 --quiet --pidfile "$PIDFILE" --name "$NAME"
+}
+
+case "$1" in
+    start)
+        echo -n "Starting $NAME: "
+        do_start
+        case "$?" in
+            0|1) echo "done" ;;
+            2) echo "failed" ;;
+        esac
+        ;;
+    stop)
+        echo -n "Stopping $NAME: "
+        do_stop
+        case "$?" in
+            0|1) echo "done" ;;
+            2) echo "failed" ;;
+        esac
+        ;;
+    reload|force-reload)
+        do_reload
+        ;;
+    restart)
+        do_stop
+        sleep 1
+        do_start
+        ;;
+    status)
+        if is_running; then
+            echo "$NAME is running"
+        else
+            echo "$NAME is not running"
+            exit 3
+        fi
+        ;;
+    *)
+        echo "Usage: $0 {start|stop|restart|reload|force-reload|status}" >&2
+        exit 3
+        ;;
+esac
+
+exit 0
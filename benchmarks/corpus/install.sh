@@ -0,0 +1,78 @@
+#!/bin/sh
+# a curl | sh style installer
+
+set -u
+
+REPO="example/tool"
+INSTALL_DIR="${INSTALL_DIR:-$HOME/.local/bin}"
+TMP=$(mktemp -d -t tool.XXXXXX)
+trap 'rm -rf "$TMP"' EXIT INT TERM
+
+say() {
+    printf 'install: %s\n' "$1"
+}
+
+err() {
+    say "$1" >&2
+    exit 1
+}
+
+need() {
+    if ! command -v "$1" > /dev/null 2>&1; then
+        err "need '$1' (command not found)"
+    fi
+}
+
+download() {
+    if command -v curl > /dev/null 2>&1; then
+        curl --proto '=https' --tlsv1.2 -sSfL "$1" -o "$2"
+    elif command -v wget > /dev/null 2>&1; then
+        wget -q --https-only "$1" -O "$2"
+    else
+        err "need curl or wget"
+    fi
+}
+
+detect_platform() {
+    os=$(uname -s | tr '[:upper:]' '[:lower:]')
+    arch=$(uname -m)
+    case "$arch" in
+        x86_64|amd64) arch=x86_64 ;;
+        aarch64|arm64) arch=aarch64 ;;
+        armv7*) arch=armv7 ;;
+        *) err "unsupported architecture: $arch" ;;
+    esac
+    case "$os" in
+        linux) target="$arch-unknown-linux-musl" ;;
+        darwin) target="$arch-apple-darwin" ;;
+        *) err "unsupported OS: $os" ;;
+    esac
+    echo "$target"
+}
+
+need uname
+need tar
+need mkdir
+
+target=$(detect_platform)
+version=${VERSION:-$(download "https://api.github.com/repos/$REPO/releases/latest" - 2>/dev/null \
+    | grep '"tag_name"' | sed -E 's/.*"([^"]+)".*/\1/')}
+[ -n "$version" ] || err "could not find the latest version"
+
+url="https://github.com/$REPO/releases/download/$version/tool-$version-$target.tar.gz"
+say "downloading $url"
+download "$url" "$TMP/tool.tar.gz" || err "download failed"
+download "$url.sha256" "$TMP/tool.tar.gz.sha256" || err "checksum download failed"
+
+(cd "$TMP" && sha256sum -c tool.tar.gz.sha256 > /dev/null) || err "checksum mismatch"
+
+tar -xzf "$TMP/tool.tar.gz" -C "$TMP"
+mkdir -p "$INSTALL_DIR"
+install -m 755 "$TMP/tool-$version-$target/tool" "$INSTALL_DIR/tool"
+
+case ":$PATH:" in
+    *":$INSTALL_DIR:"*) ;;
+    *) say "add $INSTALL_DIR to your PATH" ;;
+esac
+
+say "installed tool $version to $INSTALL_DIR/tool"
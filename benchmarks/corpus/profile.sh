@@ -0,0 +1,74 @@
+# ~/.profile style shell setup: PATH, aliases, prompt and helpers
+
+umask 022
+
+prepend_path() {
+    case ":$PATH:" in
+        *":$1:"*) ;;
+        *) [ -d "$1" ] && PATH="$1:$PATH" ;;
+    esac
+}
+
+prepend_path "$HOME/bin"
+prepend_path "$HOME/.local/bin"
+prepend_path "$HOME/.cargo/bin"
+prepend_path "/usr/local/go/bin"
+export PATH
+
+export EDITOR=${EDITOR:-vim}
+export PAGER="less -R"
+export LESS="-FRX"
+export HISTSIZE=50000 HISTFILESIZE=100000
+export HISTCONTROL=ignoreboth:erasedups
+
+if [ -z "${LS_COLORS:-}" ] && command -v dircolors > /dev/null; then
+    eval "$(dircolors -b)"
+fi
+
+alias ll='ls -alF'
+alias la='ls -A'
+alias l='ls -CF'
+alias grep='grep --color=auto'
+alias ..='cd ..'
+alias gs='git status -sb'
+alias gl='git log --oneline --graph --decorate -20'
+
+mkcd() {
+    mkdir -p -- "$1" && cd -P -- "$1"
+}
+
+extract() {
+    if [ ! -f "$1" ]; then
+        echo "extract: '$1' is not a file" >&2
+        return 1
+    fi
+    case "$1" in
+        *.tar.bz2|*.tbz2) tar xjf "$1" ;;
+        *.tar.gz|*.tgz) tar xzf "$1" ;;
+        *.tar.xz) tar xJf "$1" ;;
+        *.bz2) bunzip2 "$1" ;;
+        *.gz) gunzip "$1" ;;
+        *.zip) unzip "$1" ;;
+        *.7z) 7z x "$1" ;;
+        *) echo "extract: don't know how to extract '$1'" >&2; return 1 ;;
+    esac
+}
+
+git_branch() {
+    git symbolic-ref --short HEAD 2>/dev/null || git rev-parse --short HEAD 2>/dev/null
+}
+
+PS1='\u@\h:\w$(git_branch)\$ '
+
+for f in "$HOME"/.profile.d/*.sh; do
+    [ -r "$f" ] && . "$f"
+done
+unset f
+
+if [ -f "$HOME/.ssh/agent.env" ]; then
+    . "$HOME/.ssh/agent.env" > /dev/null
+    if ! kill -0 "$SSH_AGENT_PID" 2>/dev/null; then
+        ssh-agent > "$HOME/.ssh/agent.env"
+        . "$HOME/.ssh/agent.env" > /dev/null
+    fi
+fi
@@ -0,0 +1,427 @@
+'''look for inputs that are slow to parse: mutate bash inputs with the
+tokens and grammar the parser uses, measure the time and memory it takes to
+parse each one and minimize the ones that cost too much per byte into a
+corpus of slow cases (benchmarks/slow, which tests/test_fuzz.py parses)
+
+    $ python benchmarks/fuzz.py --seed 1 --iterations 5000
+
+it runs offline with only the standard library. the inputs tried are the
+same for the same seed (they don't depend on the timings), which of them
+are slow enough to be kept does. a parse that takes longer than --timeout
+or allocates more than --memlimit is stopped (from a timer signal, on
+platforms that have setitimer) and counts as slow, that's how inputs that
+never finish are found.
+'''
+
+import argparse, gc, hashlib, os, random, re, sys, time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+from bashlex import parser, tokenizer
+
+try:
+    import signal
+    _setitimer = signal.setitimer
+except (ImportError, AttributeError):
+    _setitimer = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import generate
+
+timer = getattr(time, 'perf_counter', time.time)
+
+slowdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slow')
+
+# the text of the grammar's terminals, WORD and friends get a word that's
+# picked at random from _words
+_terminals = {}
+for _text, _type in tokenizer.valid_reserved_first_command.items():
+    _terminals[_type.name] = [_text]
+for _type in tokenizer.tokentype:
+    if isinstance(_type.value, str) and _type.name not in ('EOF', 'DASH'):
+        _terminals[_type.name] = [_type.value]
+_terminals.update({
+    'ASSIGNMENT_WORD' : ['x=1', 'a+=b', 'p=$(c)', 'v="${w}"'],
+    'NUMBER' : ['2', '1', '10'],
+    'REDIR_WORD' : ['{fd}'],
+    'ARITH_CMD' : ['((x))'],
+    'ARITH_FOR_EXPRS' : ['((i=0; i<3; i++))'],
+    'COND_CMD' : ['[[ -f a ]]'],
+    'TIMEOPT' : ['-p'],
+    'TIMEIGN' : ['--'],
+    'DASH' : ['-'],
+})
+
+_words = ['a', 'echo', 'x', '"$a"', "'b c'", '$x', '${x:-y}', '${#x}', '$(a)',
+          '"$(a b)"', '`a`', '<(a)', '>(a)', '\\n', '*', 'a\\ b', '$@',
+          '"${a}b"', '$1', 'EOF', '~', '~/a']
+
+# pieces that open or close something, inserted on their own to make
+# unbalanced input
+_fragments = ['$(', '${', '$[', '$((', '`', '"', "'", '<(', '(', ')', '}',
+              '{', ']', '\\', '\\\n', '#', '\n', ';', '<<', '<<-', '$', '=']
+
+# a span is put in one of these, some number of times
+_wrappers = ['$(%s)', '"$(%s)"', '(%s)', '{ %s; }', '${a:-%s}', '"%s"',
+             '<(%s)', 'if %s; then a; fi', 'while a; do %s; done', '`%s`',
+             'case a in x) %s;; esac', 'f() { %s; }', '%s | %s', '%s && %s']
+
+_grammar = None
+
+def grammar():
+    '''nonterminal -> list of productions (tuples of symbols) of the parser's
+    grammar, and nonterminal -> how deep the shallowest sentence of it is'''
+    global _grammar
+    if _grammar is None:
+        rules = {}
+        for p in parser.yaccparser.productions[1:]:
+            if 'error' not in p.prod:
+                rules.setdefault(p.name, []).append(tuple(p.prod))
+        depth = {}
+        changed = True
+        while changed:
+            changed = False
+            for name, prods in rules.items():
+                for prod in prods:
+                    if all(s in depth or s not in rules for s in prod):
+                        d = 1 + max([depth.get(s, 0) for s in prod] or [0])
+                        if d < depth.get(name, sys.maxsize):
+                            depth[name] = d
+                            changed = True
+        _grammar = rules, depth
+    return _grammar
+
+def sentence(rng, symbol='simple_list', maxdepth=6):
+    '''a random sentence of symbol in the grammar, as a list of tokens'''
+    rules, depth = grammar()
+    out = []
+    stack = [(symbol, maxdepth)]
+    while stack:
+        s, d = stack.pop()
+        if s not in rules:
+            if s in ('WORD', 'error'):
+                out.append(rng.choice(_words))
+            else:
+                out.append(rng.choice(_terminals.get(s, ['a'])))
+            continue
+        prods = rules[s]
+        if d <= 0:
+            # head for the shallowest sentence
+            best = min(max([depth.get(x, 0) for x in prod] or [0]) for prod in prods)
+            prods = [prod for prod in prods
+                     if max([depth.get(x, 0) for x in prod] or [0]) == best]
+        prod = rng.choice(prods)
+        for x in reversed(prod):
+            stack.append((x, d - 1))
+    return out
+
+def join(tokens):
+    s = ''
+    for t in tokens:
+        if s and not s.endswith('\n') and t != '\n':
+            s += ' '
+        s += t
+    return s
+
+_spans = re.compile(r'\s+|[^\s]+')
+
+def spans(s):
+    '''(start, end) of the tokens of s, or of its runs of blanks and non
+    blanks if it can't be tokenized'''
+    outcome, result, duration, peak = _call(
+        lambda: [(t.start, t.end) for t in tokenizer.tokenize(s)], 2, None)
+    if outcome != 'ok' or not result:
+        result = [m.span() for m in _spans.finditer(s)]
+    return result or [(0, len(s))]
+
+def mutate(rng, s, population, maxlen=20000):
+    '''a mutation of s, about maxlen characters at most'''
+    pieces = spans(s)
+    i = rng.randrange(len(pieces))
+    j = min(len(pieces), i + rng.choice([1, 1, 2, 3, 5]))
+    start, end = pieces[i][0], pieces[j - 1][1]
+    span = s[start:end]
+    kind = rng.randrange(7)
+    if kind == 0:
+        new = ''
+    elif kind == 1:
+        # repeat it, which is how something superlinear shows
+        new = span * min(rng.choice([2, 10, 100, 1000]), maxlen // max(len(span), 1) + 1)
+    elif kind == 2:
+        new = rng.choice(_fragments)
+        if rng.random() < 0.5:
+            new = span + new
+    elif kind == 3:
+        new = join(sentence(rng, rng.choice(sorted(grammar()[0])), rng.randint(1, 8)))
+        if rng.random() < 0.5:
+            new = span + ' ' + new
+    elif kind == 4:
+        new = span
+        wrapper = rng.choice(_wrappers)
+        for k in range(rng.choice([1, 2, 10, 50])):
+            if len(new) > maxlen:
+                break
+            new = wrapper.replace('%s', new)
+    elif kind == 5:
+        new = rng.choice(_words + list(sum(_terminals.values(), [])))
+    else:
+        other = rng.choice(population)
+        pieces = spans(other)
+        a = rng.randrange(len(pieces))
+        b = min(len(pieces), a + rng.randint(1, 10))
+        new = other[pieces[a][0]:pieces[b - 1][1]]
+    return s[:start] + new + s[end:]
+
+def seeds():
+    '''the inputs the fuzzer starts with: the top level commands of the
+    bundled scripts, the generated inputs cut into lines and sentences of
+    the grammar'''
+    result = []
+    for name in sorted(os.listdir(generate.corpusdir)):
+        with open(os.path.join(generate.corpusdir, name)) as f:
+            s = f.read()
+        result.extend(chunk for chunk in s.split('\n\n') if chunk.strip())
+    for family in sorted(generate.families):
+        result.append(generate.generate(family, 2000, 0))
+    rng = random.Random(0)
+    for i in range(50):
+        result.append(join(sentence(rng)))
+    return result
+
+def candidates(seed, maxlen=20000):
+    '''generate the inputs to try for seed, forever'''
+    rng = random.Random(seed)
+    population = seeds()
+    while True:
+        s = rng.choice(population)
+        for i in range(rng.randint(1, 4)):
+            s = mutate(rng, s, population, maxlen)
+        if len(s) > maxlen:
+            s = s[:maxlen]
+        yield s
+        if rng.random() < 0.1 and len(s) < 2000:
+            population.append(s)
+
+class _stop(BaseException):
+    '''raised from the timer signal to stop a parse, a BaseException so the
+    parser doesn't catch it'''
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+def measure(s, timeout=2, memlimit=256 * 1024 * 1024, parse=parser.parse):
+    '''parse s and return (outcome, seconds, peak memory in bytes): outcome is
+    'ok', the name of the exception parsing raised, 'timeout' if it took
+    longer than timeout or 'memory' if it allocated more than memlimit (peak
+    memory is None if we can't tell, or memlimit is None, in which case
+    memory isn't traced, which makes the parse a lot faster)'''
+    outcome, result, duration, peak = _call(lambda: parse(s), timeout, memlimit)
+    return outcome, duration, peak
+
+def _call(f, timeout, memlimit):
+    '''call f, stopping it after timeout seconds or once it allocated more
+    than memlimit bytes (either can be None), returns (outcome, what f
+    returned, seconds, peak memory)'''
+    trace = memlimit is not None and tracemalloc is not None
+    result = None
+    running = [True]
+    guard = _setitimer is not None and timeout is not None
+    if guard:
+        deadline = timer() + timeout
+        def check(signum, frame):
+            if not running[0]:
+                return
+            if timer() > deadline:
+                raise _stop('timeout')
+            if trace and tracemalloc.get_traced_memory()[0] > memlimit:
+                raise _stop('memory')
+        previous = signal.signal(signal.SIGALRM, check)
+        signal.setitimer(signal.ITIMER_REAL, 0.01, 0.01)
+    if trace:
+        tracemalloc.start()
+    gc.collect()
+    start = timer()
+    try:
+        try:
+            try:
+                result = f()
+                outcome = 'ok'
+            except _stop as e:
+                outcome = e.outcome
+            except Exception as e:
+                outcome = e.__class__.__name__
+            finally:
+                running[0] = False
+        except _stop as e:
+            # the signal came just as f was done
+            outcome = e.outcome
+        duration = timer() - start
+    finally:
+        if guard:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        peak = None
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return outcome, result, duration, peak
+
+class fuzzer(object):
+    '''decides what's slow: a parse that times out or runs out of memory, or
+    costs more than threshold seconds or memthreshold bytes per byte of
+    input (over what parsing a single word costs). it also has to take at
+    least mintime longer than that, the cost of a tiny input is mostly noise
+    and raising an exception'''
+    def __init__(self, threshold=100e-6, memthreshold=20000, timeout=2,
+                 memlimit=256 * 1024 * 1024, mintime=0.01, out=None):
+        self.threshold = threshold
+        self.mintime = mintime
+        self.memthreshold = memthreshold
+        self.timeout = timeout
+        self.memlimit = memlimit
+        self.out = out
+        self.base = min(measure('a', timeout, None)[1] for i in range(5))
+        self.basememory = min(measure('a', timeout, memlimit)[2] for i in range(5))
+
+    def cost(self, s):
+        '''why s is slow ('timeout', 'memory', 'time' or 'peak'), or None if
+        it isn't'''
+        outcome, duration, peak = measure(s, self.timeout, self.memlimit)
+        if outcome == 'memory':
+            return outcome
+        n = max(len(s), 1)
+        limit = max(self.threshold * n, self.mintime)
+        if outcome == 'timeout' or duration - self.base > limit:
+            # tracing memory slows parsing down a lot, so time it again
+            # without it (twice, timings are noisy)
+            for i in range(2):
+                outcome, duration, ignored = measure(s, self.timeout, None)
+                if outcome == 'timeout':
+                    return outcome
+                if duration - self.base <= limit:
+                    break
+            else:
+                return 'time'
+        if peak is not None and peak - self.basememory > max(self.memthreshold * n, 1 << 20):
+            return 'peak'
+        return None
+
+    def minimize(self, s, reason, maxtries=200):
+        '''the smallest input we can find from s that's slow for the same
+        reason: remove tokens (then characters) while it still is'''
+        tries = [0]
+        def slow(candidate):
+            tries[0] += 1
+            return candidate and self.cost(candidate) == reason
+
+        for chars in (False, True):
+            pieces = [(i, i + 1) for i in range(len(s))] if chars else spans(s)
+            n = 2
+            while len(pieces) >= 2 and tries[0] < maxtries:
+                chunk = max(1, len(pieces) // n)
+                removed = False
+                for i in range(0, len(pieces), chunk):
+                    keep = pieces[:i] + pieces[i + chunk:]
+                    candidate = ''.join(s[a:b] for a, b in _fill(s, keep))
+                    if slow(candidate):
+                        s = candidate
+                        pieces = [(i, i + 1) for i in range(len(s))] if chars else spans(s)
+                        n = max(n - 1, 2)
+                        removed = True
+                        break
+                    if tries[0] >= maxtries:
+                        break
+                if not removed:
+                    if chunk == 1:
+                        break
+                    n = min(len(pieces), n * 2)
+        return s
+
+    def run(self, seed, iterations=None, duration=None, save=True):
+        '''fuzz, returns a list of (reason, minimized input) of the slow ones
+        found, saving them to slowdir if save is set'''
+        found = []
+        end = None if duration is None else time.time() + duration
+        seen = set()
+        for i, s in enumerate(candidates(seed)):
+            if iterations is not None and i >= iterations:
+                break
+            if end is not None and time.time() > end:
+                break
+            reason = self.cost(s)
+            if reason is None:
+                continue
+            small = self.minimize(s, reason)
+            if small in seen:
+                continue
+            seen.add(small)
+            found.append((reason, small))
+            if self.out is not None:
+                self.out.write('%d: %s %d -> %d characters: %r\n' %
+                               (i, reason, len(s), len(small), small[:200]))
+                self.out.flush()
+            if save:
+                savecase(small)
+        return found
+
+def _fill(s, pieces):
+    '''the spans of s in pieces, plus the blanks between adjacent ones so
+    tokens don't run into each other'''
+    result = []
+    for k, (a, b) in enumerate(pieces):
+        if result and result[-1][1] < a and s[result[-1][1]:a].isspace():
+            result.append((result[-1][1], a))
+        result.append((a, b))
+    return result
+
+def savecase(s):
+    '''write s to slowdir, named after its hash'''
+    if not os.path.isdir(slowdir):
+        os.makedirs(slowdir)
+    name = hashlib.sha1(s.encode('utf-8')).hexdigest()[:12] + '.sh'
+    with open(os.path.join(slowdir, name), 'w') as f:
+        f.write(s)
+    return name
+
+def cases():
+    '''(name, input) of the saved slow cases'''
+    result = []
+    if os.path.isdir(slowdir):
+        for name in sorted(os.listdir(slowdir)):
+            if name.endswith('.sh'):
+                with open(os.path.join(slowdir, name)) as f:
+                    result.append((name, f.read()))
+    return result
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--iterations', type=int, help='stop after this many inputs')
+    argparser.add_argument('--duration', type=float, help='stop after this many seconds')
+    argparser.add_argument('--threshold', type=float, default=100,
+                           help='microseconds per byte that is slow')
+    argparser.add_argument('--memthreshold', type=int, default=20000,
+                           help='bytes allocated per byte that is slow')
+    argparser.add_argument('--mintime', type=float, default=10,
+                           help='milliseconds over parsing a word that is slow')
+    argparser.add_argument('--timeout', type=float, default=2,
+                           help='seconds a parse can take')
+    argparser.add_argument('--memlimit', type=int, default=256,
+                           help='megabytes a parse can allocate')
+    argparser.add_argument('--no-save', dest='save', action='store_false',
+                           help="don't save the slow inputs to %s" % slowdir)
+    args = argparser.parse_args(argv)
+    if args.iterations is None and args.duration is None:
+        args.iterations = 1000
+
+    f = fuzzer(args.threshold / 1e6, args.memthreshold, args.timeout,
+               args.memlimit * 1024 * 1024, args.mintime / 1e3, sys.stdout)
+    found = f.run(args.seed, args.iterations, args.duration, args.save)
+    sys.stdout.write('%d slow inputs\n' % len(found))
+
+if __name__ == '__main__':
+    main()
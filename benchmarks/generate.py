@@ -0,0 +1,167 @@
+'''generate the synthetic inputs of the benchmark suite, the same ones for
+the same seed and size
+
+    $ python benchmarks/generate.py pipelines --size 100000 --seed 1 > p.sh
+'''
+
+import argparse, os, random, sys
+
+_words = ['echo', 'grep', 'sed', 'awk', 'cut', 'sort', 'uniq', 'tr', 'head',
+          'tail', 'xargs', 'cat', 'wc', 'tee', 'find', 'ls', 'git', 'curl',
+          'printf', 'test']
+_args = ['-v', '-n', '-f', '--quiet', '-la', '-r', '"$1"', '"$@"', '$HOME',
+         '${x:-default}', '${f##*/}', "'a b'", '/tmp/out', '*.log', 'foo',
+         'bar', '-e "s/a/b/g"', '$PWD/build', '"${name}.tar.gz"', '2>/dev/null']
+
+def _command(rng, nargs=3):
+    parts = [rng.choice(_words)]
+    for i in range(rng.randint(0, nargs)):
+        parts.append(rng.choice(_args))
+    return ' '.join(parts)
+
+def pipelines(rng, size):
+    '''long pipelines and && / || chains'''
+    lines = []
+    total = 0
+    while total < size:
+        n = rng.randint(5, 50)
+        ops = [rng.choice([' | ', ' | ', ' && ', ' || ']) for i in range(n - 1)]
+        line = _command(rng)
+        for op in ops:
+            line += op + _command(rng)
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+def substitutions(rng, size):
+    '''command, process and parameter substitutions nested in each other'''
+    lines = []
+    total = 0
+    while total < size:
+        depth = rng.randint(1, 12)
+        inner = _command(rng)
+        for i in range(depth):
+            kind = rng.randint(0, 3)
+            if kind == 0:
+                inner = '%s "$(%s)"' % (rng.choice(_words), inner)
+            elif kind == 1:
+                inner = '%s <(%s)' % (rng.choice(_words), inner)
+            elif kind == 2:
+                inner = 'echo ${v%d:-$(%s)}' % (i, inner)
+            else:
+                inner = '%s $(%s) $(%s)' % (rng.choice(_words), _command(rng), inner)
+        lines.append(inner)
+        total += len(inner) + 1
+    return '\n'.join(lines) + '\n'
+
+def heredocs(rng, size):
+    '''commands with here documents of various lengths, some with <<-'''
+    chunks = []
+    total = 0
+    i = 0
+    while total < size:
+        delimiter = 'EOF%d' % i
+        strip = rng.random() < 0.3
+        lines = []
+        for j in range(rng.choice([1, 3, 10, 100])):
+            line = ' '.join(rng.choice(_args) for k in range(rng.randint(1, 8)))
+            lines.append(('\t' if strip else '') + line)
+        chunk = '%s <<%s%s > /tmp/f%d\n%s\n%s%s\n' % (
+            rng.choice(['cat', 'tee', 'sh']), '-' if strip else '', delimiter, i,
+            '\n'.join(lines), '\t' if strip else '', delimiter)
+        chunks.append(chunk)
+        total += len(chunk)
+        i += 1
+    return ''.join(chunks)
+
+def cases(rng, size):
+    '''case statements with many clauses'''
+    chunks = []
+    total = 0
+    while total < size:
+        clauses = []
+        for i in range(rng.randint(2, 40)):
+            patterns = '|'.join(rng.choice(['start', 'stop', '*.tar.gz', '-h',
+                                            '--help', '[0-9]*', '"$x"', 'x?'])
+                                for j in range(rng.randint(1, 3)))
+            clauses.append('    %s) %s ;;' % (patterns, _command(rng)))
+        clauses.append('    *) %s ;;' % _command(rng))
+        chunk = 'case "$%s" in\n%s\nesac\n' % (rng.choice(['1', 'x', 'opt']),
+                                               '\n'.join(clauses))
+        chunks.append(chunk)
+        total += len(chunk)
+    return ''.join(chunks)
+
+def quoted(rng, size):
+    '''commands with huge quoted strings'''
+    chunks = []
+    total = 0
+    while total < size:
+        length = rng.choice([100, 1000, 10000, 100000])
+        words = []
+        n = 0
+        while n < length:
+            w = rng.choice(_words + ['$x', '${y}', "it's", '\\"', 'a\tb'])
+            words.append(w)
+            n += len(w) + 1
+        body = ' '.join(words)
+        if rng.random() < 0.5:
+            chunk = 'echo "%s"\n' % body
+        else:
+            chunk = "printf '%%s\\n' '%s'\n" % body.replace("'", '')
+        chunks.append(chunk)
+        total += len(chunk)
+    return ''.join(chunks)
+
+def oneliners(rng, size):
+    '''single commands, as in shell history, for parsesingle and split'''
+    lines = []
+    total = 0
+    while total < size:
+        line = _command(rng, 6)
+        if rng.random() < 0.3:
+            line += ' | ' + _command(rng)
+        if rng.random() < 0.2:
+            line += ' > "$(%s)"' % _command(rng)
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+families = {
+    'pipelines' : pipelines,
+    'substitutions' : substitutions,
+    'heredocs' : heredocs,
+    'cases' : cases,
+    'quoted' : quoted,
+    'oneliners' : oneliners,
+}
+
+corpusdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+def realworld():
+    '''the scripts in benchmarks/corpus, joined'''
+    scripts = []
+    for name in sorted(os.listdir(corpusdir)):
+        if name.endswith('.sh'):
+            with open(os.path.join(corpusdir, name)) as f:
+                scripts.append(f.read())
+    return '\n'.join(scripts)
+
+def generate(family, size, seed=0):
+    '''an input of the given family that's about size characters long'''
+    if family == 'realworld':
+        s = realworld()
+        return '\n'.join([s] * max(1, size // len(s)))
+    return families[family](random.Random('%s-%d' % (family, seed)), size)
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('family', choices=sorted(families) + ['realworld'])
+    argparser.add_argument('--size', type=int, default=100000,
+                           help='size of the input in characters')
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args(argv)
+    sys.stdout.write(generate(args.family, args.size, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+($($($($($($($($($($($($($($($($($($($($($("cleBUILD"    rm)))))))))))))))))))))))))))))))))))gz
\ No newline at end of file
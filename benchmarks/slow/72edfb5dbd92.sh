@@ -0,0 +1 @@
+e'${'
\ No newline at end of file
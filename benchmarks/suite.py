@@ -0,0 +1,194 @@
+'''run the benchmark suite: import time, parse, parsesingle, split, convertpos,
+nodevisitor traversal and dump on the bundled real-world scripts and on
+seeded synthetic inputs (see generate.py), offline
+
+    $ python benchmarks/suite.py --json results.json
+    $ python benchmarks/suite.py --baseline benchmarks/baseline.json --check
+
+each result has the best time of --repeat runs, tokens/s (counting the
+tokens bashlex.tokenize reads from the input, here document bodies
+included), MB/s of input and the peak memory the run allocated (with
+tracemalloc, when there is one). --baseline compares the times to a json
+file written by --json earlier (on the same machine, times from another one
+aren't comparable), --check makes it exit with status 1 if any is slower
+than the baseline by more than --tolerance.
+'''
+
+import argparse, json, os, platform, subprocess, sys, time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+from bashlex import ast, parser, tokenizer
+
+import generate
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+timer = getattr(time, 'perf_counter', time.time)
+
+def best(f, repeat):
+    '''the best time of repeat calls to f, and what it returned'''
+    duration = result = None
+    for i in range(repeat):
+        start = timer()
+        result = f()
+        elapsed = timer() - start
+        if duration is None or elapsed < duration:
+            duration = elapsed
+    return duration, result
+
+def peak(f):
+    '''the peak memory in bytes allocated while calling f, None if we can't
+    tell'''
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def counttokens(s):
+    try:
+        return sum(1 for t in tokenizer.tokenize(s))
+    except Exception:
+        return None
+
+def importtime(repeat):
+    '''the time it takes a new interpreter to import the parser'''
+    code = ('import time; start = time.time(); import bashlex.parser; '
+            'print(time.time() - start)')
+    times = []
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+        times.append(float(out.decode().strip()))
+    return min(times)
+
+class _counter(ast.nodevisitor):
+    def __init__(self):
+        self.count = 0
+    def visitnode(self, n):
+        self.count += 1
+
+def _visit(trees):
+    v = _counter()
+    for tree in trees:
+        v.visit(tree)
+    return v.count
+
+def benchmarks(s, lines):
+    '''name -> (function to time, input it reads) for the input s, or lines
+    for the per line operations'''
+    if lines is not None:
+        return [
+            ('parsesingle', lambda: [parser.parsesingle(l) for l in lines]),
+            ('split', lambda: [list(parser.split(l)) for l in lines]),
+        ]
+    trees = parser.parse(s)
+    return [
+        ('parse', lambda: parser.parse(s)),
+        ('convertpos', lambda: parser.parse(s, convertpos=True)),
+        ('visitor', lambda: _visit(trees)),
+        ('dump', lambda: [tree.dump() for tree in trees]),
+    ]
+
+def run(size, seed, repeat, families=None, out=sys.stdout):
+    results = {}
+    def report(name, duration, nbytes=None, ntokens=None, memory=None):
+        r = results[name] = {'seconds' : duration}
+        line = '%-28s %9.4fs' % (name, duration)
+        if nbytes:
+            r['mb_per_s'] = nbytes / 1e6 / duration
+            line += ' %8.2f MB/s' % r['mb_per_s']
+        if ntokens:
+            r['tokens_per_s'] = ntokens / duration
+            line += ' %10.0f tokens/s' % r['tokens_per_s']
+        if memory is not None:
+            r['peak_mb'] = memory / 1e6
+            line += ' %8.1f MB peak' % r['peak_mb']
+        out.write(line + '\n')
+        out.flush()
+
+    report('import', importtime(repeat))
+
+    for family in families or (sorted(generate.families) + ['realworld']):
+        s = generate.generate(family, size, seed)
+        lines = None
+        if family == 'oneliners':
+            lines = s.splitlines()
+        nbytes = len(s.encode('utf-8'))
+        ntokens = counttokens(s)
+        for name, f in benchmarks(s, lines):
+            duration = best(f, repeat)[0]
+            report('%s/%s' % (name, family), duration, nbytes, ntokens, peak(f))
+
+    return {
+        'python' : platform.python_version(),
+        'implementation' : platform.python_implementation(),
+        'machine' : platform.machine(),
+        'size' : size,
+        'seed' : seed,
+        'repeat' : repeat,
+        'results' : results,
+    }
+
+def compare(current, baseline, tolerance, out=sys.stdout):
+    '''print how the times in current compare to baseline, returns the names
+    of the ones that are slower by more than tolerance'''
+    slower = []
+    if (current['size'], current['seed']) != (baseline['size'], baseline['seed']):
+        out.write('warning: the baseline was run with size %d seed %d\n' %
+                  (baseline['size'], baseline['seed']))
+    out.write('\n%-28s %10s %10s %8s\n' % ('', 'baseline', 'current', 'ratio'))
+    for name in sorted(current['results']):
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['seconds']
+        after = current['results'][name]['seconds']
+        ratio = after / before
+        mark = ''
+        if ratio > 1 + tolerance:
+            slower.append(name)
+            mark = ' slower'
+        out.write('%-28s %9.4fs %9.4fs %7.2fx%s\n' % (name, before, after, ratio, mark))
+    return slower
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument('--size', type=int, default=100000,
+                           help='size of each input in characters')
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--repeat', type=int, default=3,
+                           help='report the best of this many runs')
+    argparser.add_argument('--family', action='append', dest='families',
+                           choices=sorted(generate.families) + ['realworld'],
+                           help='only run on these inputs')
+    argparser.add_argument('--json', help='write the results to this file')
+    argparser.add_argument('--baseline', help='compare to the results in this file')
+    argparser.add_argument('--tolerance', type=float, default=0.25,
+                           help='how much slower than the baseline is too slow')
+    argparser.add_argument('--check', action='store_true',
+                           help='exit with status 1 if something is too slow')
+    args = argparser.parse_args(argv)
+
+    current = run(args.size, args.seed, args.repeat, args.families)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(current, baseline, args.tolerance)
+        if slower and args.check:
+            sys.stderr.write('slower than the baseline: %s\n' % ', '.join(slower))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import complexity
+
+class test_complexity(unittest.TestCase):
+    def test_exponent(self):
+        self.assertAlmostEqual(complexity.exponent([(10, 1), (100, 10), (1000, 100)]), 1)
+        self.assertAlmostEqual(complexity.exponent([(10, 1), (100, 100), (1000, 10000)]), 2)
+
+    def test_quadratic(self):
+        # the harness notices something that's quadratic
+        a = complexity.axis('quadratic', lambda n: 'a' * n, 1.3, (100, 200, 400),
+                            run=lambda s: [s.count(c) for c in s])
+        complexity.axes.append(a)
+        try:
+            [(axis, points, e)] = complexity.check(['quadratic'])
+        finally:
+            complexity.axes.remove(a)
+        self.assertGreater(e, a.bound)
+
+    def test_bounds(self):
+        # the full sizes take a couple of minutes (python
+        # benchmarks/complexity.py), a twentieth of them is enough to see
+        # something quadratic
+        for a, points, e in complexity.check(scale=20, mintime=0.02):
+            self.assertLessEqual(e, a.bound, '%s grows with exponent %.2f: %s' % (a.name, e, points))
@@ -0,0 +1,65 @@
+import io, unittest
+
+from bashlex import ast, errors, events, parser
+
+class recorder(ast.nodevisitor):
+    def __init__(self):
+        self.events = []
+
+    def visitnode(self, n):
+        self.events.append(('start', n.kind, n.pos))
+
+    def visitnodeend(self, n):
+        self.events.append(('end', n.kind, n.pos))
+
+s = ('a "b $(c | d)" 2>&1 >f && ! e\n'
+     'f() { for i in x; do g <<EOF; done; }\nbody\nEOF\n'
+     'case $h in\n  i) (j) ;;\nesac\n')
+
+class test_events(unittest.TestCase):
+    def test_order(self):
+        r = recorder()
+        for tree in parser.parse(s):
+            r.visit(tree)
+        self.assertEqual([e[:3] for e in events.iterparse(s)], r.events)
+
+    def test_fields(self):
+        fields = [(e.kind, e.fields) for e in events.iterparse('a 2>&1 >f; b')
+                  if e.type == 'start']
+        self.assertEqual(fields, [
+            ('list', {}),
+            ('command', {}),
+            ('word', {'word' : 'a'}),
+            ('redirect', {'input' : 2, 'type' : '>&', 'output' : 1}),
+            ('redirect', {'input' : None, 'type' : '>'}),
+            ('word', {'word' : 'f'}),
+            ('operator', {'op' : ';'}),
+            ('command', {}),
+            ('word', {'word' : 'b'}),
+        ])
+
+    def test_stream(self):
+        self.assertEqual(list(events.iterparse(io.StringIO(u'' + s))),
+                         list(events.iterparse(s)))
+
+        # events for a command are generated before the next line is read
+        def lines():
+            yield 'a\n'
+            yield 'b; c\n'
+            raise AssertionError('read too far')
+        it = events.iterparse(lines())
+        self.assertEqual(next(it)[:2], ('start', 'command'))
+
+        self.assertRaises(errors.ParsingError, list, events.iterparse(['a; ;\n']))
+
+    def test_handler(self):
+        class h(events.handler):
+            depth = maxdepth = 0
+            def start(self, kind, pos, fields):
+                self.depth += 1
+                self.maxdepth = max(self.maxdepth, self.depth)
+            def end(self, kind, pos):
+                self.depth -= 1
+        handler = h()
+        events.parse(s, handler)
+        self.assertEqual((handler.depth, handler.maxdepth), (0, 9))
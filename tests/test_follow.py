@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os, shutil, tempfile, unittest
+
+from bashlex import errors, follow, parser
+
+class test_follow(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'log')
+        self.checkpoint = os.path.join(self.dir, 'checkpoint')
+        self.written = b''
+        self.append(b'')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def append(self, data):
+        self.written += data
+        with open(self.log, 'ab') as f:
+            f.write(data)
+
+    def test_partial(self):
+        f = follow.follower(self.log)
+        self.append(b'a\nb; c')
+        self.assertEqual([n.pos for n in f.poll()], [(0, 1)])
+        self.append(b' &&\n d\ncat <<EOF\nx\n')
+        result = f.poll()
+        self.assertEqual([n.pos for n in result], [(2, 12)])
+        self.append(b'EOF\nlast')
+        result.extend(f.poll())
+        self.assertEqual([n.pos for n in result], [(2, 12), (13, 22)])
+        self.assertEqual(f.close()[0].pos, (29, 33))
+        self.assertEqual(parser.parse(self.written.decode('utf-8'))[1:3], result)
+
+    def test_checkpoint(self):
+        f = follow.follower(self.log, self.checkpoint)
+        self.append(u'echo é\nif a\nthen "b\n'.encode('utf-8'))
+        self.assertEqual(len(f.poll()), 1)
+        f.save()
+        state = follow.readcheckpoint(self.checkpoint)
+        self.assertEqual((state['offset'], state['position']), (8, 7))
+        self.assertEqual(sorted(os.listdir(self.dir)), ['checkpoint', 'log'])
+
+        # a multibyte character split between two writes
+        self.append(u'é'.encode('utf-8')[:1])
+        f = follow.follower(self.log, self.checkpoint)
+        self.assertEqual(f.poll(), [])
+        self.append(u'é'.encode('utf-8')[1:] + b'"\nfi\n')
+        node, = f.poll()
+        self.assertEqual(node, parser.parse(self.written.decode('utf-8'))[1])
+
+    def test_truncate(self):
+        f = follow.follower(self.log, self.checkpoint)
+        self.append(b'aaaaa\nb\n')
+        self.assertEqual(len(f.poll()), 2)
+        with open(self.log, 'wb') as g:
+            g.write(b'c\n')
+        node, = f.poll()
+        self.assertEqual(node.pos, (0, 1))
+
+    def test_error(self):
+        f = follow.follower(self.log)
+        self.append(b'a\nb; ;\nc\n')
+        self.assertEqual([n.pos for n in f.poll()], [(0, 1)])
+        self.assertRaises(errors.ParsingError, f.poll)
+        self.assertEqual([n.pos for n in f.poll()], [(7, 8)])
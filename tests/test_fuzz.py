@@ -0,0 +1,58 @@
+import os, random, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import fuzz
+
+class test_fuzz(unittest.TestCase):
+    def test_deterministic(self):
+        def first(seed, n=30):
+            g = fuzz.candidates(seed)
+            return [next(g) for i in range(n)]
+        self.assertEqual(first(3), first(3))
+        self.assertNotEqual(first(3), first(4))
+
+    def test_sentence(self):
+        rng = random.Random(0)
+        tokens = fuzz.sentence(rng, 'if_command')
+        self.assertEqual((tokens[0], tokens[-1]), ('if', 'fi'))
+        tokens = fuzz.sentence(rng, 'case_command', 0)
+        self.assertEqual(tokens[0], 'case')
+
+    @unittest.skipIf(fuzz._setitimer is None, 'needs setitimer')
+    def test_stop(self):
+        def forever(s):
+            while True:
+                pass
+        outcome, duration, peak = fuzz.measure('a', 0.1, None, parse=forever)
+        self.assertEqual(outcome, 'timeout')
+        self.assertLess(duration, 5)
+
+        if fuzz.tracemalloc is not None:
+            def grow(s):
+                l = []
+                while True:
+                    l.append(' ' * 1000)
+            outcome, duration, peak = fuzz.measure('a', 10, 1 << 20, parse=grow)
+            self.assertEqual(outcome, 'memory')
+
+    def test_minimize(self):
+        class f(fuzz.fuzzer):
+            def cost(self, s):
+                if '$(' in s and 'x' in s:
+                    return 'time'
+        self.assertEqual(f().minimize('a b "$(c d)" e x f', 'time'), '$(x')
+
+    def test_slow_cases(self):
+        # the slow cases the fuzzer found and minimized don't hang or run out
+        # of memory (anymore)
+        cases = fuzz.cases()
+        self.assertTrue(cases)
+        for name, s in cases:
+            outcome, duration, peak = fuzz.measure(s, 10, 256 * 1024 * 1024)
+            self.assertNotIn(outcome, ('timeout', 'memory'), name)
+
+    def test_unclosed_parameter(self):
+        # this used to loop forever, allocating as it went
+        outcome, duration, peak = fuzz.measure("case');${'{", 10, 256 * 1024 * 1024)
+        self.assertEqual(outcome, 'ParsingError')
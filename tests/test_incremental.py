@@ -0,0 +1,91 @@
+import unittest
+
+from bashlex import ast, errors, incremental, parser
+
+old = ('a\n'
+       'cat <<EOF | b\n'
+       'x\n'
+       'EOF\n'
+       'if c\n'
+       'then d\n'
+       'fi\n'
+       'e\n')
+
+def edit(s, start, end, text):
+    return s[:start] + text + s[end:], (start, end, start + len(text))
+
+class test_incremental(unittest.TestCase):
+    def assertIncremental(self, new, edits=None):
+        tree = parser.parse(old)
+        result = incremental.parse_incremental(tree, old, new, edits)
+        self.assertEqual(result, parser.parse(new))
+        return tree, result
+
+    def test_damage(self):
+        self.assertEqual(incremental.damage('abc', 'abc'), None)
+        self.assertEqual(incremental.damage('abc', 'axbc'), (1, 1, 2))
+        self.assertEqual(incremental.damage('abcd', 'ad'), (1, 3, 1))
+        self.assertEqual(incremental.damage('aaa', 'aaaa'), (3, 3, 4))
+        # the second edit is in terms of the source after the first one
+        self.assertEqual(incremental.damage('abcdef', 'xabcdyf', [(0, 0, 1), (5, 6, 6)]),
+                         (0, 5, 6))
+        self.assertRaises(ValueError, incremental.damage, 'abc', 'abcd', [(0, 1, 1)])
+
+    def test_reuse(self):
+        new, e = edit(old, old.index('d'), old.index('d') + 1, 'dd; ee')
+        tree, result = self.assertIncremental(new, [e])
+        self.assertTrue(result[0] is tree[0])
+        self.assertTrue(result[1] is tree[1])
+        self.assertFalse(result[2] is tree[2])
+        self.assertTrue(result[3] is tree[3])
+
+    def test_diff(self):
+        new, e = edit(old, 0, 0, 'z\n')
+        tree, result = self.assertIncremental(new)
+        self.assertTrue(result[2] is tree[1])
+
+    def test_lazy_shift(self):
+        # the nodes after the edit are shifted when they're first used
+        tree = parser.parse(old)
+        new, e = edit(old, 0, 0, 'z\n')
+        result = incremental.parse_incremental(tree, old, new, [e])
+        self.assertTrue(type(result[-1]) is ast._shiftednode)
+
+        # shifting again before they're used adds up
+        newer, e = edit(new, 0, 0, 'yy; ')
+        result = incremental.parse_incremental(result, new, newer, [e])
+        self.assertTrue(type(result[-1]) is ast._shiftednode)
+        last = result[-1]
+        self.assertEqual(last.pos, parser.parse(newer)[-1].pos)
+        self.assertTrue(type(last) is ast.node)
+        self.assertEqual(result, parser.parse(newer))
+
+        # setting an attribute doesn't lose the shift
+        tree = parser.parse(old)
+        result = incremental.parse_incremental(tree, old, new, [(0, 0, 2)])
+        result[-1].extra = 1
+        self.assertEqual(result[-1].pos, parser.parse(new)[-1].pos)
+
+    def test_heredoc(self):
+        # editing a heredoc body reparses the command it belongs to
+        new, e = edit(old, old.index('x'), old.index('x') + 1, 'y\nEOF\nz')
+        self.assertIncremental(new, [e])
+        new, e = edit(old, old.index('EOF\n'), old.index('EOF\n') + 3, 'EOX')
+        self.assertRaises(errors.ParsingError, incremental.parse_incremental,
+                          parser.parse(old), old, new, [e])
+
+    def test_merge_and_split(self):
+        # joining two commands and splitting one
+        new, e = edit(old, 1, 2, ' |')
+        self.assertIncremental(new, [e])
+        new, e = edit(old, old.index('then d') + 6, old.index('then d') + 6, '\nfi\nif f\nthen g')
+        self.assertIncremental(new, [e])
+
+    def test_append(self):
+        new, e = edit(old, len(old), len(old), 'f\ng\n')
+        self.assertIncremental(new, [e])
+        self.assertIncremental(old[:-1] + 'ff')
+
+    def test_convertpos(self):
+        tree = parser.parse(old, convertpos=True)
+        self.assertRaises(ValueError, incremental.parse_incremental, tree, old, old + 'a')
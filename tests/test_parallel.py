@@ -0,0 +1,63 @@
+import unittest
+
+from bashlex import errors, parallel, parser
+
+class test_parallel(unittest.TestCase):
+    def setUp(self):
+        self._minchunk = parallel._minchunk
+        # make small inputs get cut into several chunks
+        parallel._minchunk = 8
+
+    def tearDown(self):
+        parallel._minchunk = self._minchunk
+
+    def assertSameParse(self, s, **kwargs):
+        expected = parser.parse(s, **kwargs)
+        self.assertTrue(len(parallel.chunks(s, 2)) > 1)
+        self.assertEqual(parser.parse(s, workers=2, **kwargs), expected)
+
+    def test_chunks(self):
+        s = 'a\nb\nif x\nthen y\nfi\nc\n' * 10
+        ranges = parallel.chunks(s, 2)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(s))
+        # each chunk starts where the parser starts a top level node
+        starts = set(parser._nextindex(n) for n in parser.parse(s))
+        for (a, b), (c, d) in zip(ranges, ranges[1:]):
+            self.assertEqual(b, c)
+            self.assertTrue(c in starts)
+
+    def test_spanning_constructs(self):
+        s = ('cat <<EOF | a\nx\n(\nEOF\n'
+             'b \\\nc\n'
+             'if d\nthen\n  e\nfi\n'
+             'f() {\n  g "$(h\ni)"\n}\n'
+             'case j in\n k) l;;\nesac\n') * 4
+        self.assertSameParse(s)
+        self.assertSameParse(s, convertpos=True)
+        self.assertSameParse(s + 'tail', strictmode=False)
+
+    def test_expansionlimit(self):
+        s = 'a $(b $(c))\n' * 10
+        self.assertSameParse(s, expansionlimit=1)
+
+    def test_error(self):
+        s = 'a\nb\nc\n' * 5 + 'd )\ne\n' + 'f\n' * 5
+        with self.assertRaises(errors.ParsingError) as expected:
+            parser.parse(s)
+        with self.assertRaises(errors.ParsingError) as actual:
+            parser.parse(s, workers=2)
+        self.assertEqual(actual.exception.message, expected.exception.message)
+        self.assertEqual(actual.exception.position, expected.exception.position)
+        self.assertEqual(actual.exception.s, expected.exception.s)
+
+    def test_trailing_comments(self):
+        s = 'a # c\nb   \nc; # d\n\n# e\n' * 10
+        self.assertSameParse(s)
+        # none of the chunks were parsed again sequentially
+        self.assertEqual(len(parallel.parsechunks(s, 2)), len(parallel.chunks(s, 2)))
+
+    def test_small_input(self):
+        parallel._minchunk = self._minchunk
+        self.assertEqual(parallel.parsechunks('a; b\nc\n', 4), {})
+        self.assertEqual(parser.parse('a\nb', workers=4), parser.parse('a\nb'))
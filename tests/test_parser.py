@@ -1,6 +1,6 @@
-import unittest, functools
+import unittest, functools, random, pickle, time, sys
 
-from bashlex import parser, state, flags, ast, errors
+from bashlex import parser, state, flags, ast, errors, tokenizer
 
 parse = functools.partial(parser.parse, convertpos=True)
 
@@ -1285,3 +1285,345 @@ class test_parser(unittest.TestCase):
               proceedonerror=True)
       with self.assertRaises(NotImplementedError):
           parse(s, proceedonerror=False)
+
+    def test_unexpected_eof_position(self):
+        # each error reports its own input, not that of an earlier error
+        for s in ['if a; then b', 'a |', 'while b']:
+            with self.assertRaises(errors.ParsingError) as e:
+                parse(s)
+            self.assertEqual(e.exception.s, s)
+            self.assertEqual(e.exception.position, len(s))
+
+    def test_needs_more_input(self):
+        incomplete = parser.incomplete
+        tests = [
+            ('echo "a b', incomplete('delimiter', '"', 5)),
+            ("echo 'a", incomplete('delimiter', "'", 5)),
+            ('a $(b c', incomplete('delimiter', ')', 2)),
+            ('a ${b', incomplete('delimiter', '}', 2)),
+            ('a `b', incomplete('delimiter', '`', 2)),
+            # where the unclosed delimiter is, not the word it's in
+            ('x=$(if a; then', incomplete('delimiter', ')', 2)),
+            ('echo "$(a', incomplete('delimiter', ')', 6)),
+            ('a\necho b"c', incomplete('delimiter', '"', 8)),
+            ('x <(a', incomplete('delimiter', ')', 2)),
+            ('cat <<EOF\nabc\n', incomplete('heredoc', 'EOF', 4)),
+            ('a\nif true; then cat <<-E\n', incomplete('heredoc', 'E', 20)),
+            ('if a; then b', incomplete('keyword', 'fi', 0)),
+            ('a; case x in\ny) z;;\n', incomplete('keyword', 'esac', 3)),
+            ('for i in a; do\n', incomplete('keyword', 'done', 0)),
+            ('while a; do { b;', incomplete('keyword', '}', 12)),
+            ('f() {', incomplete('keyword', '}', 4)),
+            ('(a\n', incomplete('keyword', ')', 0)),
+            ('a |', incomplete('command', None, 2)),
+            ('a &&\n', incomplete('command', None, 2)),
+            ('a \\', incomplete('continuation', None, 2)),
+            ('a \\\n', incomplete('continuation', None, 2)),
+        ]
+        for s, expected in tests:
+            self.assertEqual(parser.needs_more_input(s), expected, s)
+
+        for s in ['', '\n', 'a', 'a; b\nc\n', 'a \\\\', '# a \\', 'if a; then b; fi',
+                  'cat <<EOF\nx\nEOF', 'case x in (a) b;; esac',
+                  # errors that more input won't fix
+                  'a )', 'if a; then b; fi fi']:
+            self.assertEqual(parser.needs_more_input(s), None, s)
+
+    def test_validate(self):
+        for s in ['a', 'a; b\nc\n', 'if a; then b; fi', 'cat <<EOF | a\nx\nEOF\nb; c',
+                  'echo $(a | b) `c` <(d)', 'a  # c\n\n b; ;', 'a\nb)', 'echo $(a; ;)',
+                  'cat <<EOF\nx', 'a &&', 'a\n(b\n', 'echo "a']:
+            try:
+                parser.parse(s)
+                expected = None
+            except errors.ParsingError as e:
+                expected = (e.message, e.s, e.position)
+            e = parser.validate(s)
+            if e is not None:
+                e = (e.message, e.s, e.position)
+            self.assertEqual(e, expected, s)
+
+        self.assertTrue(parser.validate('cat <<EOF', strictmode=False) is None)
+        self.assertRaises(NotImplementedError, parser.validate, 'a; select x; do b; done')
+        self.assertTrue(parser.validate('select x; do b; done', proceedonerror=True) is None)
+
+    def test_shallow(self):
+        s = 'a "$(b "c")" ~/d $e ${f}g `h` <(i) >f\nX=1 j | k'
+        trees = parser.parse(s, shallow=True)
+        self.assertEqual([node.word for node in trees[0].parts[:-1]],
+                         ['a', '$(b "c")', '~/d', '$e', '${f}g', '`h`', '<(i)'])
+
+        class v(ast.nodevisitor):
+            def visitword(self, n, word):
+                n.parts = []
+            def visitassignment(self, n, word):
+                n.parts = []
+        expected = parser.parse(s)
+        for tree in expected:
+            v().visit(tree)
+        self.assertEqual(trees, expected)
+
+        # substitutions aren't parsed, so errors inside them aren't found
+        self.assertEqual(len(parser.parse('a $(b; ;)', shallow=True)), 1)
+
+        # arithmetic isn't supported either way
+        for s in ['echo $[1+$[2]"x"]', 'echo "$[1]"', 'echo $((1))', 'a=$((1))']:
+            self.assertRaises(NotImplementedError, parser.parse, s)
+            self.assertRaises(NotImplementedError, parser.parse, s, shallow=True)
+        self.assertEqual(parser.parse("echo '$[1]'", shallow=True),
+                         parser.parse("echo '$[1]'"))
+
+    def test_commands(self):
+        s = ('A=1 a b\'c\' 2>&1 < "$f" | b $(c d)\n'
+             'f() { if x; then y <<EOF; fi; }\nbody\nEOF\n'
+             'for i in 1; do z & done')
+        self.assertEqual(list(parser.commands(s)), [
+            (['a', 'bc'], [(2, '>&', 1), (None, '<', '$f')], (0, 22)),
+            (['b', '$(c d)'], [], (25, 33)),
+            (['x'], [], (43, 44)),
+            (['y'], [(None, '<<', 'EOF')], (51, 58)),
+            (['z'], [], (90, 91)),
+        ])
+        self.assertEqual(list(parser.commands('')), [])
+
+    def test_keep(self):
+        s = 'a && ! b | c $(d; e) >f\nfor i in x; do { y; }; done'
+        trees = parser.parse(s, keep=())
+        self.assertEqual(trees, [ast.trim(t) for t in parser.parse(s)])
+
+        kinds = []
+        class v(ast.nodevisitor):
+            def visitnode(self, n):
+                kinds.append(n.kind)
+        for tree in trees:
+            v().visit(tree)
+        self.assertFalse(ast.noisekinds.intersection(kinds))
+        self.assertIsInstance(trees[0].parts, tuple)
+        self.assertEqual(trees[0].parts[1].parts[0].parts[0].parts, ())
+
+        # the for node is the loop variable, the words and the body
+        self.assertEqual([n.kind for n in trees[1].list[0].parts],
+                         ['word', 'word', 'list'])
+
+        trees = parser.parse(s, keep=('operator',), convertpos=True)
+        self.assertEqual([n.kind for n in trees[0].parts], ['command', 'operator', 'pipeline'])
+        self.assertEqual(trees[0].parts[1].s, '&&')
+        self.assertEqual(parser.parse(s, keep=ast.noisekinds),
+                         [ast.trim(t, ast.noisekinds) for t in parser.parse(s)])
+
+    def test_split_many(self):
+        lines = ['git status', 'a  b\tc ', '', 'x=1 ~/y', 'a "b c"', 'a $(b "c")',
+                 'a "b', 'git status', 'a | b > c # d', 'a "b c"']
+        result = parser.split_many(iter(lines))
+        self.assertEqual(len(result), len(lines))
+        for line, r in zip(lines, result):
+            try:
+                expected = list(parser.split(line))
+            except errors.ParsingError as e:
+                self.assertEqual((type(r), r.position), (type(e), e.position))
+            else:
+                self.assertEqual(r, expected)
+        self.assertIsNot(result[0], result[7])
+
+        many = lines * 100 + ['a "%d"' % i for i in range(5000)]
+        result = parser.split_many(many, workers=2)
+        self.assertEqual(result[:6], parser.split_many(lines[:6]))
+        self.assertIsInstance(result[6], errors.ParsingError)
+        self.assertEqual(result[6].position, 4)
+        self.assertEqual(result[-1], ['a', '4999'])
+
+    def test_fastpath(self):
+        plain = ['a', '--flag=value', 'x=1', '*.py', '[ab]', 'a[1]=2', '\xe9', '/usr/bin', '%']
+        other = ['!', 'a{b}', '}', '~', '$x', '"a b"', '>f', ';', '#'] + \
+                sorted(tokenizer.valid_reserved_first_command)
+        seps = [' ', '\t', '\n', '\n\n', ' \n ']
+        rng = random.Random(0)
+        hits = 0
+        for i in range(500):
+            vocab = plain + other if i % 2 else plain
+            s = ''.join(rng.choice(vocab) + rng.choice(seps)
+                        for j in range(rng.randint(1, 5)))
+            fast = parser._parsesimple(s)
+            if fast is not None:
+                hits += 1
+                self.assertEqual(fast, list(parser._parsefrom(s, 0)), s)
+        self.assertTrue(hits > 100)
+
+        before = dict(parser.fastpath)
+        trees = parser.parse('cmd --flag=value *.py\n\n b', convertpos=True)
+        self.assertEqual([[w.s for w in tree.parts] for tree in trees],
+                         [['cmd', '--flag=value', '*.py'], ['b']])
+        parser.parse('x=1 cmd')
+        parser.parse('cmd "a"')
+        self.assertEqual(parser.fastpath['hit'] - before['hit'], 1)
+        self.assertEqual(parser.fastpath['miss'] - before['miss'], 2)
+
+    def test_line_continuations(self):
+        s = 'echo "$(a \\\n b)" \\\n  ${x\\\n} <(c\\\nd) \\\\\nls'
+        trees = parser.parse(s, removecontinuations=True)
+
+        found = []
+        class v(ast.nodevisitor):
+            def visitword(self, n, word):
+                found.append((word, s[n.pos[0]:n.pos[1]].replace('\\\n', '')))
+            def visitparameter(self, n, value):
+                found.append((value, s[n.pos[0]:n.pos[1]].replace('\\\n', '')))
+        for tree in trees:
+            v().visit(tree)
+        self.assertEqual(found, [
+            ('echo', 'echo'), ('$(a  b)', '"$(a  b)"'), ('a', 'a'), ('b', 'b'),
+            ('${x}', '${x}'), ('x', '${x}'), ('<(cd)', '<(cd)'), ('cd', 'cd'),
+            ('\\', '\\\\'), ('ls', 'ls')])
+
+        # ends right before a continuation stay there
+        trees = parser.parse('a &&\\\n\necho x', removecontinuations=True)
+        self.assertEqual(trees[0].parts[1].pos, (2, 4))
+        self.assertEqual(trees[0].pos, (0, 13))
+
+        # errors are the same as without the pre-pass
+        s = 'a \\\nb\nc "d\\\ne'
+        self.assertRaisesRegex(errors.ParsingError, r'matching .*position 7\)', parser.parse, s,
+                               removecontinuations=True)
+
+        # the pre-pass is opt in, the other ways to parse give the same
+        # result as parse without it
+        from bashlex import events, incremental, script, stream
+        s = 'echo "$(a \\\n b)" x\nc\n'
+        expected = parser.parse(s)
+        self.assertNotEqual(parser.parse(s, removecontinuations=True), expected)
+        self.assertEqual(list(script.Script(s)), expected)
+        new = s.replace(' x', ' y')
+        self.assertEqual(incremental.parse_incremental(expected, s, new), parser.parse(new))
+        p = stream.lineparser()
+        self.assertEqual(p.feed(s) + p.close(), expected)
+
+    def test_heredoc_values(self):
+        def values(s):
+            found = []
+            class v(ast.nodevisitor):
+                def visitheredoc(self, n, value):
+                    found.append((value, s[n.pos[0]:n.pos[1]]))
+            for tree in parser.parse(s):
+                v().visit(tree)
+            return found
+
+        self.assertEqual(values('a <<-EOF\n\t\tb\n\tc\n\tEOF\n'),
+                         [('b\nc\nEOF', '\t\tb\n\tc\n\tEOF')])
+        # in a later command and in a substitution
+        self.assertEqual(values('z\necho $(cat <<EOF\nq\nEOF\n)'),
+                         [('q\nEOF', 'q\nEOF')])
+        self.assertEqual(values('z\ncat <<A; cat <<-B\na\nA\n\tb\n\tB\n'),
+                         [('a\nA', 'a\nA'), ('b\nB', '\tb\n\tB')])
+
+        # nodes are pickled (e.g. by parse(workers=...)) with their value
+        s = 'x\ncat <<-EOF\n\ty\n\tEOF\n'
+        trees = parser.parse(s)
+        copied = pickle.loads(pickle.dumps(trees))
+        self.assertEqual(copied, trees)
+        self.assertEqual(copied[1].parts[1].heredoc.value, 'y\nEOF')
+        self.assertEqual(parser.parse(s * 3, workers=2), parser.parse(s * 3))
+
+    def test_linear_scaling(self):
+        def best(f, repeat=3):
+            times = []
+            for i in range(repeat):
+                start = time.process_time()
+                result = f()
+                times.append(time.process_time() - start)
+            return min(times), result
+
+        # a list of pipelines with 100k operators, vs. one with 10k. it takes
+        # about 10 times longer when it's linear and 100 when it's quadratic
+        ops = ['|', '&&', '||', ';', '&', '|']
+        def operators(n):
+            s = ' '.join(['a %s' % ops[i % len(ops)] for i in range(n)]) + ' a'
+            return lambda: parser.parse(s)
+        small, trees = best(operators(10002), 1)
+        large, trees = best(operators(100002), 1)
+        self.assertEqual(len(trees), 1)
+        self.assertEqual(len(trees[0].parts), 2 * 100002 * 4 // 6 + 1)
+        self.assertLess(large / small, 30)
+
+        # 1k heredocs on a line, vs. 100
+        def heredocs(n):
+            s = ' '.join(['cat <<E%d;' % i for i in range(n)]) + '\n'
+            s += ''.join(['%d\nE%d\n' % (i, i) for i in range(n)])
+            return lambda: parser.parse(s)
+        small, trees = best(heredocs(100))
+        large, trees = best(heredocs(1000))
+        self.assertEqual(trees[0].parts[-2].parts[1].heredoc.value, '999\nE999')
+        self.assertLess(large / small, 30)
+
+    def test_dump(self):
+        # the example in the README
+        tree = parser.parse('true && cat <(echo $(echo foo))')[0]
+        self.assertEqual(tree.dump(), '''ListNode(pos=(0, 31), parts=[
+  CommandNode(pos=(0, 4), parts=[
+    WordNode(pos=(0, 4), word='true'),
+  ]),
+  OperatorNode(op='&&', pos=(5, 7)),
+  CommandNode(pos=(8, 31), parts=[
+    WordNode(pos=(8, 11), word='cat'),
+    WordNode(pos=(12, 31), word='<(echo $(echo foo))', parts=[
+      ProcesssubstitutionNode(command=
+        CommandNode(pos=(14, 30), parts=[
+          WordNode(pos=(14, 18), word='echo'),
+          WordNode(pos=(19, 30), word='$(echo foo)', parts=[
+            CommandsubstitutionNode(command=
+              CommandNode(pos=(21, 29), parts=[
+                WordNode(pos=(21, 25), word='echo'),
+                WordNode(pos=(26, 29), word='foo'),
+              ]), pos=(19, 30)),
+          ]),
+        ]), pos=(12, 31)),
+    ]),
+  ]),
+])''')
+
+        # trimmed trees keep their children in tuples, they're shown the same
+        s = '{ a; } >f'
+        self.assertEqual(parser.parse(s, keep=ast.noisekinds)[0].dump(),
+                         parser.parse(s)[0].dump())
+
+    def test_deep_nesting(self):
+        def stackdepth():
+            depth, frame = 0, sys._getframe()
+            while frame is not None:
+                depth, frame = depth + 1, frame.f_back
+            return depth
+
+        def check(s, innermost, text=None):
+            tree = parser.parse(s)[0]
+            found = []
+            class v(ast.nodevisitor):
+                def visitword(self, n, word):
+                    if word == innermost:
+                        found.append(n.pos)
+            v().visit(tree)
+            text = text or innermost
+            start = s.index(text)
+            self.assertEqual(found, [(start, start + len(text))])
+            ast.posconverter(s).visit(tree)
+            self.assertEqual(tree.s, s.rstrip())
+            return tree
+
+        # nothing recurses for each level, so these are parsed with a
+        # recursion limit a lot lower than how deep they're nested
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(stackdepth() + 100)
+        try:
+            d = 10000
+            tree = check('( ' * d + 'x' + ' )' * d, 'x')
+            self.assertEqual(tree.dump(indent='').count('CompoundNode'), d)
+            check('{ ' * d + 'x; ' + '} ' * d, 'x')
+            check('if a; then ' * d + 'x' + '; fi' * d, 'x')
+            check('echo ' + '${a:-' * d + 'x' + '}' * d, 'echo')
+            check('if a; then b; ' + 'elif c; then d; ' * d + 'fi', 'b')
+
+            # every level of these is read again when the one around it is
+            # parsed (as bash does), so they take time quadratic in depth
+            d = 150
+            check('echo ' + '$(echo <(echo ' * d + 'x' + '))' * d, 'x')
+            check('echo "' + '$(echo "' * d + 'x' + '")' * d + '"', 'x', '"x"')
+        finally:
+            sys.setrecursionlimit(limit)
@@ -0,0 +1,114 @@
+import json, os, sys, tempfile, unittest
+
+from bashlex import parser, profile
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+class test_profile(unittest.TestCase):
+    def test_same_trees(self):
+        for s in ['a b', 'a | b && c $(d "$(e)")', 'cat <<EOF\nx\nEOF\nb', 'a\nb <(c)\n']:
+            trees, stats = parser.parse(s, convertpos=True, profile=True)
+            self.assertEqual(trees, parser.parse(s, convertpos=True))
+            self.assertTrue(isinstance(stats, profile.stats))
+
+    def test_phases(self):
+        s = 'a $(b "$(c)") <<EOF\nx\nEOF\nd'
+        trees, stats = parser.parse(s, convertpos=True, profile=True)
+
+        calls = stats.calls
+        for key in [('tokenize', 0), ('parse', 0), ('expand', 0), ('heredoc', 0),
+                    ('convertpos', 0), ('other', 0), ('substitution', 0),
+                    ('tokenize', 1), ('parse', 1), ('substitution', 1),
+                    ('parse', 2)]:
+            self.assertTrue(calls[key], key)
+        self.assertEqual(calls['parse', 0], 2)
+        self.assertEqual(calls['substitution', 0], 1)
+        self.assertEqual(calls['heredoc', 0], 1)
+        self.assertEqual(stats.level, 0)
+        self.assertFalse(stats._stack)
+
+        # the phases exclude what they call into, so they add up to the total
+        self.assertAlmostEqual(sum(stats.seconds.values()), stats.total, places=6)
+        self.assertAlmostEqual(sum(stats.byphase().values()), stats.total, places=6)
+
+        d = stats.todict()
+        json.dumps(d)
+        self.assertEqual(d['levels'][1]['substitution']['calls'], 1)
+
+    def test_plain(self):
+        # plain commands are built without the parser
+        trees, stats = parser.parse('a', profile=True)
+        self.assertEqual(dict(stats.calls), {('other', 0) : 1})
+
+    def test_main(self):
+        fd, path = tempfile.mkstemp(suffix='.sh')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('a | b $(c)\nd\n')
+
+            stdout = sys.stdout
+            sys.stdout = StringIO()
+            try:
+                profile.main([path, '--repeat', '2', '--json'])
+                output = sys.stdout.getvalue()
+                sys.stdout = StringIO()
+                profile.main([path, '--convertpos'])
+                report = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+        finally:
+            os.remove(path)
+
+        d = json.loads(output)
+        self.assertEqual(d['levels']['1']['parse']['calls'], 2)
+        self.assertEqual(d['levels']['0']['parse']['calls'], 4)
+        self.assertIn('convertpos', report)
+        self.assertIn('total', report.splitlines()[-1])
+
+class test_counts(unittest.TestCase):
+    def tearDown(self):
+        profile.counting(False)
+
+    def test_counts(self):
+        from bashlex import tokenizer
+
+        getc = tokenizer.tokenizer.__dict__['_getc']
+        profile.resetcounts()
+        profile.counting()
+        profile.counting()
+        try:
+            s = 'a | b $(c)\nd e'
+            parser.parse(s)
+            parser.parse('plain words')
+        finally:
+            profile.counting(False)
+        self.assertTrue(tokenizer.tokenizer.__dict__['_getc'] is getc)
+
+        c = profile.counts()
+        json.dumps(c)
+        self.assertEqual(c['tokens']['WORD'], 6)
+        self.assertEqual(c['tokens']['BAR'], 1)
+        self.assertEqual(c['reductions']['p_simple_command_element'], 6)
+        self.assertEqual(c['reductions']['p_pipeline_command'], 3)
+        self.assertTrue(c['getc'] >= len(s))
+        self.assertTrue(c['ungetc'])
+        # a, d e and c
+        self.assertEqual(c['parsers'], 3)
+        self.assertEqual(c['yacccopies'], 3)
+        self.assertEqual(c['recursiveparsers'], 1)
+        self.assertEqual(c['bytessliced'], len('d e') + len('c)'))
+        self.assertEqual(c['fastpath'], {'hit' : 1, 'miss' : 1})
+
+        # these aren't counted when counting is off
+        parser.parse(s)
+        c2 = profile.counts()
+        self.assertEqual(c2['tokens'], c['tokens'])
+        self.assertEqual(c2['getc'], c['getc'])
+        self.assertEqual(c2['parsers'], 6)
+
+        profile.resetcounts()
+        c = profile.counts()
+        self.assertEqual((c['tokens'], c['parsers'], c['fastpath']['miss']), ({}, 0, 0))
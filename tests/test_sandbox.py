@@ -0,0 +1,80 @@
+import sys, unittest
+
+from bashlex import ast, parser, sandbox
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'sandbox requires Linux')
+class test_sandbox(unittest.TestCase):
+    def setUp(self):
+        self.pool = sandbox.pool(workers=2, timeout=10)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_parse(self):
+        s = 'a $(b) | c <<EOF\nfoo\nEOF\n'
+        result = self.pool.parse(s)
+        self.assertTrue(result['ok'])
+        self.assertEqual([ast.fromdict(d) for d in result['trees']],
+                         parser.parse(s))
+
+        result = self.pool.parse(s, convertpos=True)
+        self.assertEqual([ast.fromdict(d) for d in result['trees']],
+                         parser.parse(s, convertpos=True))
+
+    def test_errors(self):
+        result = self.pool.parse('a )')
+        self.assertEqual(result, {'ok' : False,
+                                  'error' : {'type' : 'ParsingError',
+                                             'message' : "unexpected token ')'",
+                                             'position' : 2}})
+
+        result = self.pool.parse('coproc a')
+        self.assertEqual(result['error']['type'], 'NotImplementedError')
+
+    def test_timeout(self):
+        result = self.pool.parse('a $(b)\n' * 20000, timeout=0.1)
+        self.assertEqual(result['error']['type'], 'timeout')
+        self.assertEqual(self.pool.stats['timeout'], 1)
+
+        # the worker was replaced
+        self.assertTrue(self.pool.parse('a')['ok'])
+
+    def test_memlimit(self):
+        # a spawned worker doesn't start with the free heap of this process,
+        # so how much it can grow by is all it has for the job
+        context = 'spawn' if hasattr(sandbox.multiprocessing, 'get_context') else None
+        with sandbox.pool(workers=1, memlimit=8 * 1024 * 1024, context=context) as p:
+            self.assertTrue(p.parse('a')['ok'])
+            result = p.parse('echo ' + 'a' * 16000000)
+            self.assertFalse(result['ok'])
+            self.assertIn(result['error']['type'], ('memory', 'crash'))
+            self.assertTrue(p.parse('a')['ok'])
+            self.assertEqual(p.stats['memory'] + p.stats['crash'], 1)
+
+        # the limit is on top of what the worker starts with, however big the
+        # process that made the pool is
+        hog = ' ' * (256 * 1024 * 1024)
+        with sandbox.pool(workers=1, memlimit=8 * 1024 * 1024) as p:
+            self.assertTrue(p.parse('a')['ok'])
+            self.assertEqual(p.stats['memory'] + p.stats['crash'], 0)
+        del hog
+
+    def test_map(self):
+        results = self.pool.map(['a', 'b |', 'c && d'])
+        self.assertEqual([r['ok'] for r in results], [True, False, True])
+
+    def test_closed(self):
+        self.pool.close()
+        self.assertRaises(ValueError, self.pool.parse, 'a')
+
+    def test_close_busy(self):
+        # a worker that's busy when the pool is closed is stopped when it's
+        # given back rather than put back
+        w = self.pool._idle.get()
+        self.pool.close()
+        self.assertEqual(self.pool._workers, set([w]))
+        self.assertTrue(w.process.is_alive())
+        self.pool._release(w)
+        self.assertEqual(self.pool._workers, set())
+        self.assertFalse(w.process.is_alive())
+        self.assertRaises(ValueError, self.pool.parse, 'a')
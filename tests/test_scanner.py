@@ -0,0 +1,106 @@
+import unittest
+
+from bashlex import parser, scanner
+
+def commands(s, separators=';&\n'):
+    '''split s at the boundaries the scanner finds'''
+    result = []
+    start = 0
+    for end in scanner.boundaries(s, separators):
+        result.append(s[start:end])
+        start = end
+    return result
+
+class test_scanner(unittest.TestCase):
+    def assertCommands(self, s, expected, separators=';&\n'):
+        self.assertEqual(commands(s, separators), expected)
+
+    def test_separators(self):
+        self.assertCommands('a; b & c\nd', ['a;', ' b &', ' c\n', 'd'])
+        self.assertCommands('a; b & c\nd', ['a; b & c\n', 'd'], '\n')
+        self.assertCommands('a && b || c | d', ['a && b || c | d'])
+        self.assertCommands('a;b;', ['a;', 'b;'], ';')
+
+    def test_blank_and_comments(self):
+        self.assertCommands('', [])
+        self.assertCommands('\n \n# foo\n', [])
+        self.assertCommands('a # b; c\nd', ['a # b; c\n', 'd'])
+        self.assertCommands('a#b; c', ['a#b;', ' c'])
+
+    def test_skippable(self):
+        s = 'a # b\n  \n# c\nd'
+        self.assertTrue(scanner.skippable(s, 2, s.index('d')))
+        self.assertTrue(scanner.skippable(s, 1, 1))
+        self.assertFalse(scanner.skippable(s, 0, 2))
+        self.assertFalse(scanner.skippable(s, 2, len(s)))
+
+    def test_continuation(self):
+        self.assertCommands('a &&\nb\nc', ['a &&\nb\n', 'c'])
+        self.assertCommands('a |\n\nb\nc', ['a |\n\nb\n', 'c'])
+        self.assertCommands('a \\\nb\nc', ['a \\\nb\n', 'c'])
+
+    def test_quotes(self):
+        self.assertCommands('echo "a\n;b" c\nd', ['echo "a\n;b" c\n', 'd'])
+        self.assertCommands("echo 'a\n;b'\nd", ["echo 'a\n;b'\n", 'd'])
+        self.assertCommands("echo $'a\\';b'\nd", ["echo $'a\\';b'\n", 'd'])
+        self.assertCommands('echo a\\;b\nd', ['echo a\\;b\n', 'd'])
+
+    def test_substitutions(self):
+        self.assertCommands('a $(b\nc; d) e\nf', ['a $(b\nc; d) e\n', 'f'])
+        self.assertCommands('a `b\nc`\nd', ['a `b\nc`\n', 'd'])
+        self.assertCommands('a ${b:-c\nd}\ne', ['a ${b:-c\nd}\n', 'e'])
+        self.assertCommands('a <(b\nc)\nd', ['a <(b\nc)\n', 'd'])
+        self.assertCommands('a $((1 +\n(2)))\nd', ['a $((1 +\n(2)))\n', 'd'])
+        self.assertCommands('a "$(b ")\n")"\nd', ['a "$(b ")\n")"\n', 'd'])
+
+    def test_compound(self):
+        self.assertCommands('if a\nthen b; c\nfi\nd', ['if a\nthen b; c\nfi\n', 'd'])
+        self.assertCommands('for i in a; do\nb\ndone; c', ['for i in a; do\nb\ndone;', ' c'])
+        self.assertCommands('while a; do b; done\nc', ['while a; do b; done\n', 'c'])
+        self.assertCommands('{ a\nb; }\nc', ['{ a\nb; }\n', 'c'])
+        self.assertCommands('(a\nb)\nc', ['(a\nb)\n', 'c'])
+        self.assertCommands('f() {\na\n}\nc', ['f() {\na\n}\n', 'c'])
+        self.assertCommands('echo if fi done\nc', ['echo if fi done\n', 'c'])
+
+    def test_case(self):
+        s = 'case $x in\na|b) c;;\n(d) e\n;;\nesac\nf'
+        self.assertCommands(s, [s[:-1], 'f'])
+        self.assertCommands('case x in esac) a;; esac; b',
+                            ['case x in esac) a;; esac;', ' b'])
+
+    def test_heredoc(self):
+        self.assertCommands('cat <<EOF; a\nb; c\nEOF\nd', ['cat <<EOF;', ' a\nb; c\nEOF\n', 'd'])
+        self.assertCommands('cat <<EOF\n(\nEOF\nd', ['cat <<EOF\n(\nEOF\n', 'd'], '\n')
+        self.assertCommands('cat <<-EOF\n\t(\n\tEOF\nd', ['cat <<-EOF\n\t(\n\tEOF\n', 'd'], '\n')
+        self.assertCommands("cat <<'EOF'\nEOF\n'EOF'\nd", ["cat <<'EOF'\nEOF\n'EOF'\n", 'd'], '\n')
+        self.assertCommands('a <<X; b <<Y\nx\nX\ny\nY\nc', ['a <<X; b <<Y\nx\nX\ny\nY\n', 'c'], '\n')
+        # an unterminated heredoc runs until the end of the input
+        self.assertCommands('cat <<EOF\na\n', ['cat <<EOF\na\n'])
+
+    def test_count(self):
+        self.assertEqual(scanner.count('a; b\nc'), 3)
+        self.assertEqual(scanner.count('a; b\nc', '\n'), 2)
+
+    def test_skipsubstitution(self):
+        s = 'a $(b ")" `c`) d'
+        self.assertEqual(s[:scanner.skipsubstitution(s, 2)], 'a $(b ")" `c`)')
+        s = 'a ${b:-}}'
+        self.assertEqual(scanner.skipsubstitution(s, 2), len(s) - 1)
+        s = 'a <(b) c'
+        self.assertEqual(scanner.skipsubstitution(s, 2), 6)
+        s = 'a `b \\` c` d'
+        self.assertEqual(scanner.skipsubstitution(s, 2), 10)
+
+    def test_matches_parser(self):
+        # with newlines as the only separators the boundaries should be
+        # where the parser starts each top level node
+        s = ('a; b\n'
+             'if x\nthen\n  y\nfi\n'
+             'cat <<EOF | c\n$(\nEOF\n'
+             'echo "$(d\ne)"\n'
+             'f() {\n  g\n}\n'
+             'h')
+        parts = parser.parse(s)
+        ends = scanner.boundaries(s, '\n')
+        self.assertEqual(len(ends), len(parts))
+        self.assertEqual(ends[-1], len(s))
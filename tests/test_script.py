@@ -0,0 +1,86 @@
+import os, shutil, tempfile, unittest
+
+import bashlex
+from bashlex import errors, parser, script
+
+s = ('# setup\n'
+     'a; b\n'
+     'cat <<EOF | c\n'
+     'body\n'
+     'EOF\n'
+     '\n'
+     'if x\n'
+     'then\n'
+     '  y\n'
+     'fi\n'
+     'd')
+
+class test_script(unittest.TestCase):
+    def test_same_as_parse(self):
+        sc = bashlex.Script(s)
+        expected = parser.parse(s)
+        self.assertEqual(len(sc), len(expected))
+        self.assertEqual(list(sc), expected)
+        self.assertEqual(sc[-1], expected[-1])
+        self.assertEqual(sc[1:], expected[1:])
+        self.assertRaises(IndexError, lambda: sc[len(expected)])
+
+    def test_lazy(self):
+        sc = script.Script('a\n' + 'b )\n' * 100)
+        self.assertEqual(sc[0].kind, 'command')
+        with self.assertRaises(errors.ParsingError) as e:
+            sc[1]
+        self.assertEqual(e.exception.position, 2)
+
+    def test_cache(self):
+        sc = script.Script(s, cachesize=1)
+        first = sc[0]
+        self.assertTrue(sc[0] is first)
+        sc[1]
+        self.assertEqual(list(sc._cache), [1])
+        self.assertFalse(sc[0] is first)
+        self.assertEqual(sc[0], first)
+
+    def test_positions(self):
+        sc = script.Script(s)
+        self.assertEqual(sc.span(0), (0, 13))
+        self.assertEqual(sc.indexat(s.index('body')), 1)
+        self.assertEqual(sc.at(s.index('  y')).kind, 'compound')
+        self.assertEqual(sc.indexat(len(s)), None)
+
+    def test_lines(self):
+        sc = script.Script(s)
+        self.assertEqual(sc.lines(1), [])
+        self.assertEqual(sc.lines(2), [sc[0]])
+        self.assertEqual(sc.lines(4), [sc[1]])
+        self.assertEqual(sc.lines(6, 7), [sc[2]])
+        self.assertEqual(sc.lines(10, 100), [sc[2], sc[3]])
+
+    def test_scanner_disagrees(self):
+        sc = script.Script(s)
+        # pretend the scanner cut the if in half
+        sc._ends[2] = s.index('then')
+        sc._ends.insert(3, s.index('  y'))
+        sc._starts = [0] + sc._ends[:-1]
+        self.assertEqual(list(sc), parser.parse(s))
+
+    def test_trailing_comments(self):
+        # parse stops after the last token of a command, the scanner after
+        # the comment and newline that follow it
+        s = 'a # c\nb   \nc; # d\n\n# e\nf # g\n'
+        sc = script.Script(s)
+        self.assertEqual(list(sc), parser.parse(s))
+        self.assertFalse(sc._exact)
+
+    def test_file(self):
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, 'script.sh')
+            with open(path, 'w') as f:
+                f.write(s)
+            self.assertEqual(list(script.Script.fromfile(path)), parser.parse(s))
+            if hasattr(os, 'PathLike'):
+                import pathlib
+                self.assertEqual(len(script.Script(pathlib.Path(path))), 4)
+        finally:
+            shutil.rmtree(d)
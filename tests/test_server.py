@@ -0,0 +1,184 @@
+import os, shutil, socket, stat, subprocess, sys, tempfile, threading, time, unittest
+
+from bashlex import errors, parser, server
+
+class test_import(unittest.TestCase):
+    @unittest.skipIf(sys.version_info < (3, 7), 'no module __getattr__, bashlex imports eagerly')
+    def test_lazy(self):
+        # importing bashlex doesn't build the tables, but its submodules are
+        # still there as attributes
+        code = '''if True:
+            import sys, bashlex
+            assert 'bashlex.parser' not in sys.modules
+            bashlex.ast.node, bashlex.errors.ParsingError, bashlex.flags.word
+            assert 'bashlex.parser' not in sys.modules
+            assert 'server' in dir(bashlex)
+            try:
+                bashlex.nosuchmodule
+            except AttributeError:
+                pass
+            else:
+                assert False
+            assert bashlex.parse('a')
+            '''
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+        subprocess.check_call([sys.executable, '-c', code], cwd=root)
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs unix domain sockets')
+class test_server(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'bashlex.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def start(self, idletimeout=60):
+        d = server.daemon(self.path, idletimeout=idletimeout)
+        t = threading.Thread(target=d.serve)
+        t.start()
+        while True:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                break
+            except socket.error:
+                time.sleep(0.01)
+            finally:
+                probe.close()
+        return d, t
+
+    def test_requests(self):
+        d, t = self.start()
+        try:
+            with server.client(self.path, fallback=False) as c:
+                s = 'a $(b) | c <<EOF\nfoo\nEOF\n'
+                self.assertEqual(c.parse(s), parser.parse(s))
+                self.assertEqual(c.parse(s, convertpos=True),
+                                 parser.parse(s, convertpos=True))
+                self.assertEqual(c.split('a "b c" $(d e)'), ['a', 'b c', '$(d e)'])
+                self.assertEqual(c.validate('a && b'), None)
+
+                e = c.validate('a )')
+                self.assertEqual((e.message, e.position), ("unexpected token ')'", 2))
+                self.assertRaises(errors.ParsingError, c.parse, 'a )')
+                self.assertRaises(NotImplementedError, c.parse, 'coproc a')
+                self.assertFalse(c._local)
+        finally:
+            d.stop()
+            t.join()
+
+    def test_concurrent_clients(self):
+        d, t = self.start()
+        results = []
+        def run():
+            with server.client(self.path, fallback=False) as c:
+                for i in range(5):
+                    results.append(len(c.parse('a\nb && c\nd')))
+        try:
+            threads = [threading.Thread(target=run) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            d.stop()
+            t.join()
+        self.assertEqual(results, [3] * 40)
+
+    def test_idle_timeout(self):
+        d, t = self.start(idletimeout=0.2)
+        t.join(10)
+        self.assertFalse(t.is_alive())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_idle_client(self):
+        # a client that keeps its connection open without sending requests
+        # doesn't keep the daemon around
+        d, t = self.start(idletimeout=0.3)
+        c = server.client(self.path)
+        try:
+            self.assertEqual(c.split('a'), ['a'])
+            t.join(10)
+            self.assertFalse(t.is_alive())
+            # the connection was closed as well, the client falls back
+            self.assertEqual(c.split('b'), ['b'])
+            self.assertTrue(c._local)
+        finally:
+            c.close()
+            d.stop()
+            t.join()
+
+    def test_fallback(self):
+        c = server.client(self.path)
+        self.assertEqual(c.parse('a b'), parser.parse('a b'))
+        self.assertTrue(c._local)
+
+        c = server.client(self.path, fallback=False)
+        self.assertRaises(socket.error, c.parse, 'a b')
+
+    def test_stale_socket(self):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.bind(self.path)
+        s.close()
+
+        d, t = self.start()
+        try:
+            self.assertEqual(server.client(self.path, fallback=False).split('a'), ['a'])
+            self.assertRaises(RuntimeError, server.daemon(self.path).serve)
+        finally:
+            d.stop()
+            t.join()
+
+    def test_not_a_socket(self):
+        # a regular file where the socket should be is left alone, and the
+        # client doesn't try to talk to it
+        with open(self.path, 'w') as f:
+            f.write('important')
+        self.assertRaises(RuntimeError, server.daemon(self.path).serve)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'important')
+
+        self.assertRaises(socket.error, server.client(self.path, fallback=False).split, 'a')
+        c = server.client(self.path)
+        self.assertEqual(c.split('a b'), ['a', 'b'])
+        self.assertTrue(c._local)
+
+    def test_private_directory(self):
+        environ = dict(os.environ)
+        tempdir = tempfile.tempdir
+        os.environ.pop('BASHLEX_SOCKET', None)
+        os.environ.pop('XDG_RUNTIME_DIR', None)
+        tempfile.tempdir = self.dir
+        try:
+            path = server.defaultpath()
+            directory = os.path.join(self.dir, 'bashlex-%d' % os.getuid())
+            self.assertEqual(path, os.path.join(directory, 'bashlex.sock'))
+
+            self.path = path
+            d, t = self.start()
+            try:
+                self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+                self.assertEqual(server.client(fallback=False).split('a'), ['a'])
+            finally:
+                d.stop()
+                t.join()
+
+            # a directory others can write to isn't ours
+            os.chmod(directory, 0o777)
+            self.assertRaises(RuntimeError, server.daemon().serve)
+            self.assertRaises(socket.error, server.client(fallback=False).split, 'a')
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+            tempfile.tempdir = tempdir
+
+    @unittest.skipUnless(hasattr(socket, 'SO_PEERCRED'), 'needs SO_PEERCRED')
+    def test_peeruid(self):
+        a, b = socket.socketpair()
+        try:
+            self.assertEqual(server._peeruid(a), os.getuid())
+        finally:
+            a.close()
+            b.close()
@@ -0,0 +1,53 @@
+import unittest
+
+from bashlex import errors, parser, stream
+
+def feedlines(s, p=None):
+    p = p or stream.lineparser()
+    result = []
+    for line in s.splitlines(True):
+        result.extend(p.feed(line))
+    return p, result
+
+class test_stream(unittest.TestCase):
+    def assertSameAsParse(self, s):
+        p, result = feedlines(s)
+        result.extend(p.close())
+        self.assertEqual(result, parser.parse(s))
+
+    def test_nodes(self):
+        self.assertSameAsParse('a\nb; c\nif x\nthen\n  y\nfi\n\n# d\ne &\n')
+        self.assertSameAsParse('echo "a\nb" \'c\nd\'\nf() {\n  g\n}\na \\\nb\n')
+        self.assertSameAsParse('cat <<EOF | x\nbody\n(\nEOF\ncat <<-A <<B\n\ta\n\tA\nb\nB\nc\n')
+        self.assertSameAsParse('x=$(a\nb) `c\nd`\ncase $x in\n a) b;;\nesac\nlast')
+
+    def test_complete(self):
+        p = stream.lineparser()
+        self.assertEqual(p.feed('a; b'), [])
+        self.assertEqual(p.buffered, 'a; b')
+        self.assertEqual([n.pos for n in p.feed('\nc\n')], [(0, 4), (5, 6)])
+        self.assertEqual(p.feed('if a\n'), [])
+        self.assertEqual(p.feed('then "b\n'), [])
+        self.assertEqual(p.feed('x"; y; fi'), [])
+        self.assertEqual([n.pos for n in p.feed('\n')], [(7, 29)])
+        self.assertEqual(p.buffered, '')
+
+    def test_heredoc(self):
+        p, result = feedlines('cat <<EOF\na\nb\n')
+        self.assertEqual(result, [])
+        self.assertEqual(p._waitheredocs, [('EOF', False)])
+        node, = p.feed('EOF\n')
+        self.assertEqual(node.parts[1].heredoc.value, 'a\nb\nEOF')
+
+    def test_error(self):
+        p = stream.lineparser()
+        p.feed('a\n')
+        self.assertRaises(errors.ParsingError, p.feed, 'b; ;\n')
+        self.assertEqual(p.buffered, '')
+        node, = p.feed('c\n')
+        self.assertEqual(node.pos, (7, 8))
+
+        p = stream.lineparser()
+        p.feed('if a; then\n')
+        self.assertRaises(errors.ParsingError, p.close)
+        self.assertRaises(ValueError, p.feed, 'fi\n')
@@ -352,3 +352,36 @@ class test_tokenizer(unittest.TestCase):
             t(tt.WORD, 'a', [0, 1]),
             t(tt.WORD, 'b', [4, 5])
         ])
+
+    def test_tokenrecords(self):
+        s = 'a "b $(c)" 2>&1 | d\n'
+        records = list(tokenizer.tokenize(s))
+        self.assertEqual(records, [tokenizer.tokenrecord(x.type, x.value, x.lexpos, x.endlexpos, x.flags)
+                                   for x in tokenize(s)])
+        self.assertEqual([r.type for r in records],
+                         ['WORD', 'WORD', 'NUMBER', 'GREATER_AND', 'NUMBER', 'BAR', 'WORD', 'NEWLINE'])
+
+        from bashlex import parser
+        self.assertEqual([r.value if r.type == 'WORD' else s[r.start:r.end]
+                          for r in tokenizer.tokenize(s, expand=True)],
+                         list(parser.split(s)))
+
+        records = list(tokenizer.tokenize(u'\xe9 "\xe9" >f'.encode('utf-8'), expand=True))
+        self.assertEqual([(r.value, r.start, r.end) for r in records],
+                         [(b'\xc3\xa9', 0, 2), (b'\xc3\xa9', 3, 7), (b'>', 8, 9), (b'f', 9, 10)])
+
+    def test_removecontinuations(self):
+        s = 'a \\\nb"c\\\nd" \\\\\ne \\\\\\\nf'
+        normalized, removed = tokenizer.removecontinuations(s)
+        self.assertEqual(normalized, 'a b"cd" \\\\\ne \\\\f')
+        self.assertEqual([t.value for t in tokenize(normalized)],
+                         [t.value for t in tokenize(s)])
+        f = tokenizer.positionmap(removed)
+        self.assertEqual([f(i) for i in (0, 2, 4, 5, 15, 16)], [0, 4, 6, 9, 21, 22])
+
+        self.assertEqual(tokenizer.removecontinuations('a b'), ('a b', []))
+        for s in ["a \\\n'b'", 'a # b \\\nc', 'cat <<EOF\na\\\nEOF', 'a\\\n']:
+            self.assertEqual(tokenizer.removecontinuations(s), None, s)
+        # a comment ends at the end of its line
+        self.assertEqual(tokenizer.removecontinuations('a # b\nc \\\nd'),
+                         ('a # b\nc d', [8]))